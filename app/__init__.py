@@ -24,6 +24,29 @@ def create_app(config_class=DevelopmentConfig):
         from app.models import horas_extras 
         from app.models import turnos
 
+        # Tablas propias del sistema: cola de trabajos y libro presupuestario
+        from app.models.trabajos import TrabajoSegundoPlano, VersionCache
+        from app.models.programas import MovimientoPresupuestario, CortePresupuestario
+        from app.models.contratos import ContratoDistribucionCuenta
+        from app.models.catalogos import CatUnidadClausura
+        from app.models.remuneraciones import EscalaRemuneracionesHistorial
+        for tabla in (TrabajoSegundoPlano.__table__, MovimientoPresupuestario.__table__,
+                      CortePresupuestario.__table__, ContratoDistribucionCuenta.__table__,
+                      CatUnidadClausura.__table__, EscalaRemuneracionesHistorial.__table__,
+                      VersionCache.__table__):
+            try:
+                tabla.create(db.engine, checkfirst=True)
+            except Exception as e:
+                print(f"Advertencia: no se pudo verificar la tabla {tabla.name}: {e}")
+
+        # Índices nuevos sobre tablas existentes
+        from app.models.nombramientos import Nombramiento
+        for indice in Nombramiento.__table__.indexes:
+            try:
+                indice.create(db.engine, checkfirst=True)
+            except Exception as e:
+                print(f"Advertencia: no se pudo verificar el índice {indice.name}: {e}")
+
     # 3. Registro de Blueprints (Rutas del Sistema)
     
     # --- HOME / DASHBOARD ---
@@ -66,4 +89,42 @@ def create_app(config_class=DevelopmentConfig):
     app.register_blueprint(programas_bp)
     app.register_blueprint(autoridades_bp)
 
+    # --- TRABAJOS EN SEGUNDO PLANO (ESTADO Y DESCARGAS) ---
+    from app.routes.trabajos_routes import trabajos_bp
+    app.register_blueprint(trabajos_bp)
+
+    # KPIs del dashboard: invalidación de la caché al confirmar cambios relevantes
+    from app.services.dashboard_service import DashboardService
+    DashboardService.registrar_eventos()
+
+    # Índice de búsqueda de personas: se reconstruye tras cambios en personas
+    from app.services.busqueda_personas_service import BusquedaPersonasService
+    BusquedaPersonasService.registrar_eventos()
+
+    # Organigrama en caché: nueva versión tras cambios en unidades o nombramientos
+    from app.services.organigrama_service import OrganigramaService
+    OrganigramaService.registrar_eventos()
+
+    # Reanudar la cola si el servidor se reinició con trabajos pendientes
+    with app.app_context():
+        from app.services.trabajos_service import TrabajosService
+        TrabajosService.recuperar_interrumpidos()
+
+        # Contratos con solo el JSON de distribución: se crean sus filas por cuenta
+        from app.services.contratos_service import ContratosService
+        ContratosService.normalizar_distribuciones_pendientes()
+
+        # Cuentas creadas antes del libro presupuestario: se reconstruye su historial
+        from app.services.libro_presupuestario_service import LibroPresupuestarioService
+        LibroPresupuestarioService.abrir_cuentas_pendientes()
+
+        # Clausura del organigrama: se reconstruye si no calza con cat_unidades
+        from app.services.organigrama_service import OrganigramaService
+        OrganigramaService.asegurar_clausura()
+        OrganigramaService.asegurar_version()
+
+        # Historial de escalas: se calculan los periodos que aún no tienen filas
+        from app.services.historial_escalas_service import HistorialEscalasService
+        HistorialEscalasService.asegurar_historial()
+
     return app
\ No newline at end of file
@@ -47,4 +47,22 @@ class CatUnidad(db.Model):
     padre = db.relationship('CatUnidad', remote_side=[id], backref='subunidades')
 
     def __repr__(self):
-        return f"<Unidad {self.nombre} ({self.tipo})>"
\ No newline at end of file
+        return f"<Unidad {self.nombre} ({self.tipo})>"
+
+class CatUnidadClausura(db.Model):
+    """
+    Tabla de clausura del organigrama: una fila por cada par (ancestro, descendiente),
+    incluida la unidad consigo misma con profundidad 0. El subárbol de una unidad
+    es una sola consulta por rango sobre la llave primaria (ancestro_id = X).
+    """
+    __tablename__ = 'cat_unidades_clausura'
+    __table_args__ = (
+        db.Index('ix_unidades_clausura_descendiente', 'descendiente_id', 'ancestro_id'),
+    )
+
+    ancestro_id = db.Column(db.Integer, db.ForeignKey('cat_unidades.id', ondelete='CASCADE'), primary_key=True)
+    descendiente_id = db.Column(db.Integer, db.ForeignKey('cat_unidades.id', ondelete='CASCADE'), primary_key=True)
+    profundidad = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<Clausura {self.ancestro_id} -> {self.descendiente_id} ({self.profundidad})>"
@@ -67,6 +67,29 @@ class ContratoCuotaDetalle(db.Model):
     def __repr__(self):
         return f'<Detalle Cuota {self.cuota_id}: {self.codigo_cuenta} - ${self.monto_parcial}>'
 
+class ContratoDistribucionCuenta(db.Model):
+    """
+    Imputación del contrato por cuenta (versión relacional de 'distribucion_cuentas_json').
+    Permite restituir saldos y agregar ejecución por cuenta/programa con GROUP BY.
+    """
+    __tablename__ = 'contratos_distribucion_cuentas'
+    __table_args__ = (
+        db.UniqueConstraint('contrato_id', 'cuenta_id', name='uq_distribucion_contrato_cuenta'),
+        db.Index('ix_distribucion_cuenta', 'cuenta_id', 'contrato_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    contrato_id = db.Column(db.Integer, db.ForeignKey('contratos_honorarios.id', ondelete='CASCADE'), nullable=False)
+    cuenta_id = db.Column(db.Integer, db.ForeignKey('cuentas_presupuestarias.id'), nullable=False)
+
+    codigo_cuenta = db.Column(db.String(50), nullable=False)
+    monto = db.Column(db.Integer, nullable=False)
+
+    cuenta = db.relationship('CuentaPresupuestaria')
+
+    def __repr__(self):
+        return f'<Distribucion Contrato {self.contrato_id}: {self.codigo_cuenta} - ${self.monto}>'
+
 class ContratoCuota(db.Model):
     """
     NIVEL 2: Calendario de pagos individuales.
@@ -141,6 +164,7 @@ class ContratoHonorario(db.Model):
 
     # Vínculo con niveles inferiores (Cuotas)
     cuotas = db.relationship('ContratoCuota', backref='contrato', cascade="all, delete-orphan")
+    distribucion = db.relationship('ContratoDistribucionCuenta', backref='contrato', cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Contrato {self.id} - Funcionario RUT: {self.persona_id} ({self.estado})>'
\ No newline at end of file
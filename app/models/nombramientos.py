@@ -3,6 +3,10 @@ from datetime import date
 
 class Nombramiento(db.Model):
     __tablename__ = 'nombramientos'
+    __table_args__ = (
+        # Resolución del nombramiento vigente de una persona a una fecha
+        db.Index('ix_nombramientos_persona_estado_inicio', 'persona_id', 'estado', 'fecha_inicio'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     persona_id = db.Column(db.String(12), db.ForeignKey('personas.rut'), nullable=False)
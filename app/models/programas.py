@@ -30,4 +30,66 @@ class CuentaPresupuestaria(db.Model):
     saldo_actual = db.Column(db.Integer, default=0)  # El monto que queda disponible (se descuenta con cada contrato)
 
     def __repr__(self):
-        return f'<{self.codigo}: ${self.saldo_actual}>'
\ No newline at end of file
+        return f'<{self.codigo}: ${self.saldo_actual}>'
+
+class MovimientoPresupuestario(db.Model):
+    """
+    Libro de movimientos de cada cuenta (solo inserción): toda variación de
+    'saldo_actual' queda registrada como un DEBITO (rebaja) o un CREDITO
+    (apertura/restitución/suplemento), con el saldo resultante.
+    El índice (cuenta_id, fecha, id) resuelve cartolas y saldos a una fecha
+    como rangos del índice.
+    """
+    __tablename__ = 'movimientos_presupuestarios'
+    __table_args__ = (
+        db.Index('ix_movpres_cuenta_fecha', 'cuenta_id', 'fecha', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cuenta_id = db.Column(db.Integer, db.ForeignKey('cuentas_presupuestarias.id', ondelete='CASCADE'), nullable=False)
+
+    tipo = db.Column(db.Enum('DEBITO', 'CREDITO'), nullable=False)
+    concepto = db.Column(db.String(50), nullable=False)  # APERTURA, CONTRATO, RESTITUCION, SUPLEMENTACION, CARGA_MASIVA, AJUSTE
+    monto = db.Column(db.Integer, nullable=False)
+    saldo_resultante = db.Column(db.Integer, nullable=False)  # Saldo de la cuenta después del movimiento
+
+    contrato_id = db.Column(db.Integer, db.ForeignKey('contratos_honorarios.id', ondelete='SET NULL'), nullable=True, index=True)
+    cuota_id = db.Column(db.Integer, db.ForeignKey('contratos_cuotas.id', ondelete='SET NULL'), nullable=True)
+    glosa = db.Column(db.String(255), nullable=True)
+    fecha = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    # passive_deletes: al borrar la cuenta (o su programa) el ON DELETE CASCADE de la BD
+    # elimina el libro; el ORM no intenta dejar cuenta_id en NULL
+    cuenta = db.relationship('CuentaPresupuestaria',
+                             backref=db.backref('movimientos', lazy='dynamic', passive_deletes=True))
+    contrato = db.relationship('ContratoHonorario')
+
+    def __repr__(self):
+        return f'<Mov {self.tipo} {self.cuenta_id}: ${self.monto} -> ${self.saldo_resultante}>'
+
+class CortePresupuestario(db.Model):
+    """
+    Foto del libro de una cuenta cada N movimientos: saldo y totales acumulados
+    hasta 'movimiento_id'. Los totales de un periodo se calculan desde el corte
+    más cercano sumando, como máximo, N movimientos.
+    """
+    __tablename__ = 'movimientos_presupuestarios_cortes'
+    __table_args__ = (
+        db.Index('ix_cortepres_cuenta_fecha', 'cuenta_id', 'fecha', 'movimiento_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cuenta_id = db.Column(db.Integer, db.ForeignKey('cuentas_presupuestarias.id', ondelete='CASCADE'), nullable=False)
+    movimiento_id = db.Column(db.Integer, db.ForeignKey('movimientos_presupuestarios.id', ondelete='CASCADE'), nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False)  # Fecha del último movimiento incluido
+
+    saldo = db.Column(db.Integer, nullable=False)
+    total_debitos = db.Column(db.BigInteger, nullable=False, default=0)
+    total_creditos = db.Column(db.BigInteger, nullable=False, default=0)
+    n_movimientos = db.Column(db.Integer, nullable=False, default=0)
+
+    cuenta = db.relationship('CuentaPresupuestaria',
+                             backref=db.backref('cortes', lazy='dynamic', passive_deletes=True))
+
+    def __repr__(self):
+        return f'<Corte {self.cuenta_id} @{self.movimiento_id}: ${self.saldo}>'
@@ -72,4 +72,33 @@ class EscalaRemuneracionesDetalle(db.Model):
     monto = db.Column(db.Integer, nullable=False, default=0)
 
     # Relación para acceder al nombre del haber desde el detalle
-    haber = db.relationship('ConfigTipoHaberes')
\ No newline at end of file
+    haber = db.relationship('ConfigTipoHaberes')
+
+class EscalaRemuneracionesHistorial(db.Model):
+    """
+    Historial desnormalizado de la escala ya calculada: una fila por
+    (fecha_vigencia, estamento, grado, haber) con el monto final (guardado para
+    manuales y sueldo base, resultado de la fórmula para calculados) y el total
+    fijo mensual bajo el código 'TOTAL_FIJO'. Se reescribe por periodo en la misma
+    transacción que guarda la escala; las series de varios años se leen sin evaluar fórmulas.
+    """
+    __tablename__ = 'escala_remuneraciones_historial'
+    __table_args__ = (
+        db.UniqueConstraint('fecha_vigencia', 'estamento_id', 'grado', 'codigo',
+                            name='uq_escala_historial_celda'),
+        db.Index('ix_escala_historial_serie', 'estamento_id', 'grado', 'codigo', 'fecha_vigencia'),
+        db.Index('ix_escala_historial_codigo', 'codigo', 'fecha_vigencia'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    fecha_vigencia = db.Column(db.Date, nullable=False)
+    estamento_id = db.Column(db.Integer, db.ForeignKey('cat_estamentos.id'), nullable=False)
+    grado = db.Column(db.Integer, nullable=False)
+    codigo = db.Column(db.String(50), nullable=False)
+    haber_id = db.Column(db.Integer, db.ForeignKey('config_tipo_haberes.id', ondelete='SET NULL'), nullable=True)
+    monto = db.Column(db.BigInteger, nullable=False, default=0)
+    es_calculado = db.Column(db.Boolean, default=False)
+    actualizado = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Historial {self.fecha_vigencia} {self.estamento_id}/{self.grado} {self.codigo}={self.monto}>"
@@ -0,0 +1,92 @@
+import json
+from app.extensions import db
+from datetime import datetime
+
+# =======================================================
+# TRABAJOS EN SEGUNDO PLANO (Cola persistida)
+# =======================================================
+class TrabajoSegundoPlano(db.Model):
+    """
+    Registro de un proceso largo (cargas masivas, clonado de periodos, decretos)
+    ejecutado fuera del request. La tabla actúa como cola: el worker toma el
+    trabajo cambiando su estado de PENDIENTE a EN_PROCESO.
+    """
+    __tablename__ = 'sys_trabajos'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tipo = db.Column(db.String(50), nullable=False)  # CARGA_PERSONAS, CLONAR_PERIODO, etc.
+    estado = db.Column(db.Enum('PENDIENTE', 'EN_PROCESO', 'COMPLETADO', 'FALLIDO'),
+                       default='PENDIENTE', nullable=False, index=True)
+
+    # Entrada y salida (JSON serializado)
+    parametros_json = db.Column(db.Text, nullable=True)
+    resultado_json = db.Column(db.Text, nullable=True)
+    archivo_resultado = db.Column(db.String(255), nullable=True)  # Ruta del documento generado
+    mensaje_error = db.Column(db.Text, nullable=True)
+
+    # Avance
+    progreso_actual = db.Column(db.Integer, default=0)
+    progreso_total = db.Column(db.Integer, default=0)
+
+    # Dueño de la ejecución ('host:pid') y último latido: permiten distinguir un
+    # trabajo vivo en otro proceso de uno que murió con su proceso
+    worker = db.Column(db.String(120), nullable=True)
+    fecha_latido = db.Column(db.DateTime, nullable=True)
+
+    # Auditoría
+    fecha_creacion = db.Column(db.DateTime, default=datetime.now)
+    fecha_inicio = db.Column(db.DateTime, nullable=True)
+    fecha_fin = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def parametros(self):
+        return json.loads(self.parametros_json) if self.parametros_json else {}
+
+    @property
+    def resultado(self):
+        return json.loads(self.resultado_json) if self.resultado_json else None
+
+    @property
+    def porcentaje(self):
+        if self.estado == 'COMPLETADO':
+            return 100
+        if not self.progreso_total:
+            return 0
+        return min(100, int(self.progreso_actual * 100 / self.progreso_total))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'progreso_actual': self.progreso_actual or 0,
+            'progreso_total': self.progreso_total or 0,
+            'porcentaje': self.porcentaje,
+            'resultado': self.resultado,
+            'tiene_archivo': bool(self.archivo_resultado),
+            'error': self.mensaje_error,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'fecha_inicio': self.fecha_inicio.isoformat() if self.fecha_inicio else None,
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None
+        }
+
+    def __repr__(self):
+        return f"<Trabajo {self.id} {self.tipo} - {self.estado}>"
+
+
+# =======================================================
+# VERSIONES DE CACHÉ (Compartidas entre procesos)
+# =======================================================
+class VersionCache(db.Model):
+    """
+    Contador por caché en memoria ('organigrama', ...). Se incrementa en la misma
+    transacción que modifica los datos de origen; cada proceso compara el valor
+    con el de su copia para saber si otro worker la dejó obsoleta.
+    """
+    __tablename__ = 'sys_versiones_cache'
+
+    clave = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<VersionCache {self.clave}={self.version}>"
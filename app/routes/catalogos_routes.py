@@ -1,5 +1,7 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from datetime import date
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response
 from app.services.catalogos_service import CatalogosService
+from app.services.organigrama_service import OrganigramaService
 
 # Prefijo /config para todas las rutas de este archivo.
 # El nombre catalogos_bp es indispensable para que app/__init__.py lo reconozca.
@@ -52,6 +54,68 @@ def editar_unidad():
         flash(f'Error al actualizar unidad: {str(e)}', 'danger')
     return redirect(url_for('catalogos_bp.index'))
 
+@catalogos_bp.route('/api/unidades/analitica')
+def api_analitica_unidades():
+    """
+    Dotación, planilla base, horas extras y viáticos por unidad (directo y
+    acumulado por el organigrama) para ?anio=&mes= (por defecto, el mes actual).
+    """
+    try:
+        hoy = date.today()
+        anio = request.args.get('anio', hoy.year, type=int)
+        mes = request.args.get('mes', hoy.month, type=int)
+        if not 1 <= mes <= 12:
+            return jsonify({'error': 'Mes inválido'}), 400
+        return jsonify({
+            'anio': anio,
+            'mes': mes,
+            'unidades': OrganigramaService.analitica(anio, mes)
+        }), 200
+    except Exception as e:
+        print(f"Error analítica de unidades: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@catalogos_bp.route('/api/organigrama')
+def api_organigrama():
+    """
+    Organigrama completo anidado con dotación directa y total por unidad.
+    Responde 304 si el cliente ya tiene la versión vigente (If-None-Match).
+    """
+    try:
+        cuerpo, etag = OrganigramaService.organigrama()
+        if request.if_none_match.contains(etag):
+            respuesta = Response(status=304)
+        else:
+            respuesta = Response(cuerpo, mimetype='application/json')
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = 'no-cache'
+        return respuesta
+    except Exception as e:
+        print(f"Error organigrama: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@catalogos_bp.route('/api/unidades/<int:id>/subarbol')
+def api_subarbol_unidad(id):
+    """La unidad y todas sus dependencias, con la profundidad relativa a ella."""
+    return jsonify([{
+        'id': u.id,
+        'nombre': u.nombre,
+        'sigla': u.sigla,
+        'tipo': u.tipo,
+        'padre_id': u.padre_id,
+        'profundidad': profundidad
+    } for u, profundidad in OrganigramaService.subarbol(id)]), 200
+
+@catalogos_bp.route('/api/unidades/<int:id>/ancestros')
+def api_ancestros_unidad(id):
+    """Ruta desde la raíz (Alcaldía) hasta la unidad."""
+    return jsonify([{
+        'id': u.id,
+        'nombre': u.nombre,
+        'sigla': u.sigla,
+        'tipo': u.tipo
+    } for u in OrganigramaService.ruta(id)]), 200
+
 # =======================================================
 # RUTAS PARA ESTAMENTOS
 # =======================================================
@@ -150,6 +214,8 @@ def eliminar(tipo, id):
             CatalogosService.eliminar_sexo(id)
             
         flash(f'Registro de {tipo} eliminado correctamente.', 'warning')
+    except ValueError as ve:
+        flash(str(ve), 'danger')
     except Exception:
         # Se activa si el dato está siendo usado por algún funcionario o repartición.
         flash('No se puede eliminar: El dato está vinculado a otros registros activos.', 'danger')
@@ -1,13 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, current_app, jsonify
 from werkzeug.utils import secure_filename
 from app.services.contratos_service import ContratosService
+from app.services.programas_service import ProgramasService
+from app.services.trabajos_service import TrabajosService
+from app.routes.trabajos_routes import respuesta_trabajo
 from app.models.contratos import ContratoHonorario, TipoContratoHonorario, AutoridadFirmante
 from app.models.programas import Programa
 from app.models.personas import Persona
 from app.extensions import db
 import os
-import csv
-import io
+from datetime import date, datetime
 
 # Definimos el Blueprint
 contratos_bp = Blueprint('contratos_bp', __name__, url_prefix='/contratos')
@@ -306,6 +308,29 @@ def obtener_cuentas_programa(programa_id):
         print(f"Error API Cuentas: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@contratos_bp.route('/api/distribucion_automatica/<int:programa_id>', methods=['GET'])
+def distribucion_automatica(programa_id):
+    """
+    Simulación ("qué pasa si"): matriz cuota x cuenta para ?monto=&cuotas=&inicio=YYYY-MM-DD,
+    repartida por mayor resto según el saldo de cada cuenta. No modifica datos.
+    """
+    try:
+        monto = request.args.get('monto', type=int) or 0
+        num_cuotas = request.args.get('cuotas', type=int) or 1
+        inicio = request.args.get('inicio')
+        f_inicio = datetime.strptime(inicio, '%Y-%m-%d').date() if inicio else date.today()
+
+        if monto <= 0 or num_cuotas <= 0:
+            return jsonify({'error': 'Monto y número de cuotas deben ser mayores a cero.'}), 400
+
+        cuotas = ProgramasService.calcular_matriz_cuotas(programa_id, monto, num_cuotas, f_inicio)
+        return jsonify({'cuotas': cuotas})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error API Distribución: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @contratos_bp.route('/carga-masiva', methods=['GET', 'POST'])
 def carga_masiva():
     """
@@ -316,25 +341,20 @@ def carga_masiva():
         archivo = request.files.get('archivo_csv')
         
         # Validaciones iniciales del archivo
-        if not archivo or not archivo.filename.endswith('.csv'):
-            flash('Por favor, sube un archivo CSV válido (.csv).', 'danger')
+        if not archivo or not archivo.filename.lower().endswith(('.csv', '.xlsx')):
+            flash('Por favor, sube un archivo CSV (.csv) o Excel (.xlsx) válido.', 'danger')
             return redirect(request.url)
 
         try:
-            # 1. Lectura del flujo de datos con codificación UTF-8
-            # Usamos 'utf-8-sig' por si el archivo viene de Excel con BOM (marca de orden de bytes)
-            contenido = archivo.stream.read().decode("utf-8-sig")
-            stream = io.StringIO(contenido, newline=None)
-            
-            # 2. Configuración del Lector CSV
-            # Delimitador ';' es el estándar en Excel configurado para Chile
-            lector = csv.DictReader(stream, delimiter=';') 
-            
-            # 3. Ejecución del proceso en el Service
-            # Este método ahora busca a los firmantes por RUT de forma exacta
-            resultado = ContratosService.procesar_carga_masiva(lector)
+            if request.form.get('segundo_plano'):
+                ruta = TrabajosService.guardar_archivo_subido(archivo)
+                return respuesta_trabajo(TrabajosService.encolar('CARGA_CONTRATOS', {'ruta_archivo': ruta}))
+
+            # 1. Ejecución del proceso en el Service
+            # El lector detecta codificación (UTF-8/BOM/Latin-1) y separador, y lee por lotes
+            resultado = ContratosService.procesar_carga_masiva(archivo)
             
-            # 4. Notificación de resultados al usuario
+            # 2. Notificación de resultados al usuario
             if resultado['errores'] == 0:
                 flash(f"Éxito: Se han cargado {resultado['exitos']} contratos correctamente.", 'success')
             else:
@@ -344,8 +364,6 @@ def carga_masiva():
                     'warning'
                 )
                 
-        except UnicodeDecodeError:
-            flash('Error de codificación: Asegúrate de guardar el CSV como UTF-8.', 'danger')
         except Exception as e:
             db.session.rollback() # Seguridad ante fallos inesperados
             flash(f'Error crítico procesando el archivo: {str(e)}', 'danger')
@@ -1,14 +1,17 @@
 import os
 import json
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, current_app, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from sqlalchemy import extract, or_
 from app.extensions import db
 from app.services.horas_extras_service import HorasExtrasService
 from app.services.report_service import ReportService 
+from app.services.nomina_pago_service import NominaPagoService
+from app.services.trabajos_service import TrabajosService
+from app.routes.trabajos_routes import respuesta_trabajo
 from app.models.contratos import AutoridadFirmante
 from app.models.personas import Persona
-from app.models.nombramientos import Nombramiento
+from app.services.nombramientos_service import NombramientosService
 from app.models.horas_extras import HeOrdenServicio, HeConsolidadoMensual, HeDecreto, HePlanificacionDiaria
 from datetime import datetime
 
@@ -29,7 +32,7 @@ def api_get_funcionario(rut):
     if not persona:
         return jsonify({'found': False, 'msg': f'RUT {rut} no encontrado.'})
     
-    nombramiento = Nombramiento.query.filter_by(persona_id=rut, estado='VIGENTE').first()
+    nombramiento = NombramientosService.nombramiento_vigente(rut)
     if not nombramiento:
         return jsonify({'found': False, 'msg': 'Sin nombramiento vigente.'})
 
@@ -384,50 +387,52 @@ def generar_decreto_pago():
             flash("Error: Faltan datos para generar el decreto.", "danger")
             return redirect(url_for('he_bp.gestion_mensual', mes=mes, anio=anio))
 
-        fec_decreto_obj = datetime.strptime(fec_decreto_str, '%Y-%m-%d').date()
-
-        # Buscar items a pagar
-        consolidados = HeConsolidadoMensual.query.filter(
-            HeConsolidadoMensual.anio == anio,
-            HeConsolidadoMensual.mes == mes,
-            HeConsolidadoMensual.monto_total_pagar > 0,
-            HeConsolidadoMensual.estado.in_(['CALCULADO', 'REVISADO', 'EN_DECRETO']) 
-        ).all()
+        if request.form.get('segundo_plano'):
+            return respuesta_trabajo(TrabajosService.encolar('DECRETO_PAGO_HE', {
+                'anio': anio, 'mes': mes, 'numero_decreto': num_decreto,
+                'fecha_decreto': fec_decreto_str, 'id_alcalde': id_alcalde, 'id_secretario': id_secretario
+            }))
 
-        if not consolidados:
-            flash("No hay registros calculados con monto a pagar.", "warning")
-            return redirect(url_for('he_bp.gestion_mensual', mes=mes, anio=anio))
+        fec_decreto_obj = datetime.strptime(fec_decreto_str, '%Y-%m-%d').date()
 
-        # Crear Decreto (PAGO)
-        nuevo_decreto = HeDecreto(
-            tipo_decreto='PAGO',
-            numero_decreto=num_decreto, 
-            fecha_decreto=fec_decreto_obj, 
-            descripcion=f"PAGO HORAS EXTRAS {mes}/{anio}",
-            id_firmante_alcalde=id_alcalde, 
-            id_firmante_secretario=id_secretario, 
-            estado='BORRADOR'
+        # Crea el decreto, vincula los consolidados y genera el Word
+        nuevo_decreto, path_archivo = HorasExtrasService.generar_decreto_pago(
+            anio, mes, num_decreto, fec_decreto_obj, id_alcalde, id_secretario
         )
-        db.session.add(nuevo_decreto)
-        db.session.flush()
-
-        for item in consolidados:
-            item.id_decreto_pago = nuevo_decreto.id
-            item.estado = 'EN_DECRETO'
-        
-        # Generar Word Físico
-        path_archivo = ReportService.generar_nomina_pago_word(anio, mes, consolidados, nuevo_decreto)
-        
-        # Guardar nombre de archivo en BD para el historial
-        nombre_archivo = os.path.basename(path_archivo)
-        nuevo_decreto.archivo_digital = nombre_archivo
-        
-        db.session.commit()
 
         # Descargar
-        return send_file(path_archivo, as_attachment=True, download_name=nombre_archivo)
+        return send_file(path_archivo, as_attachment=True, download_name=nuevo_decreto.archivo_digital)
 
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for('he_bp.gestion_mensual', mes=mes, anio=anio))
     except Exception as e:
         db.session.rollback()
         flash(f"Error al generar el decreto: {str(e)}", "danger")
-        return redirect(url_for('he_bp.gestion_mensual', mes=mes, anio=anio))
\ No newline at end of file
+        return redirect(url_for('he_bp.gestion_mensual', mes=mes, anio=anio))
+
+# ==============================================================================
+# 10. EXPORTACIÓN DE NÓMINA (CSV / XLSX)
+# ==============================================================================
+@he_bp.route('/gestion-mensual/exportar-nomina/<int:anio>/<int:mes>/<formato>')
+def exportar_nomina(anio, mes, formato):
+    """Exporta la nómina del mes (o de un decreto con ?decreto_id=) leyendo la BD fila a fila."""
+    decreto_id = request.args.get('decreto_id', type=int)
+    try:
+        if formato == 'csv':
+            nombre = f"Nomina_Pago_HE_{mes}_{anio}.csv"
+            return Response(
+                stream_with_context(NominaPagoService.exportar_csv(anio, mes, decreto_id)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename={nombre}'}
+            )
+
+        if formato == 'xlsx':
+            # send_file cierra el temporal al terminar la respuesta
+            archivo, nombre = NominaPagoService.exportar_xlsx(anio, mes, decreto_id)
+            return send_file(archivo, as_attachment=True, download_name=nombre)
+
+        flash("Formato de exportación no soportado.", "warning")
+    except Exception as e:
+        flash(f"Error al exportar la nómina: {str(e)}", "danger")
+    return redirect(url_for('he_bp.gestion_mensual', mes=mes, anio=anio))
@@ -1,10 +1,15 @@
 # app/routes/personas_routes.py
-from flask import Blueprint, request, jsonify, render_template, flash, redirect, url_for, send_file
+from flask import Blueprint, request, jsonify, render_template, flash, redirect, url_for, send_file, Response, stream_with_context
 from app.services.persona_service import PersonaService
-from app.schemas.personas_schema import PersonaSchema
+from app.services.busqueda_personas_service import BusquedaPersonasService
+from app.services.perfil_persona_service import PerfilPersonaService
+from app.services.trabajos_service import TrabajosService
+from app.routes.trabajos_routes import respuesta_trabajo
+from app.schemas.personas_schema import PersonaSchema, persona_schema_campos
 from marshmallow import ValidationError
 import pandas as pd
 import io
+import json
 
 # 1. Ajuste de Prefijo para compatibilidad con AJAX: /personas/api/<rut>
 personas_bp = Blueprint('personas_bp', __name__, url_prefix='/personas')
@@ -13,15 +18,54 @@ personas_bp = Blueprint('personas_bp', __name__, url_prefix='/personas')
 persona_schema = PersonaSchema()
 personas_schema = PersonaSchema(many=True)
 
+# Tamaño máximo de página de la API de listado
+LIMITE_MAXIMO_API = 500
+
 # =======================================================
 # RUTAS API (JSON - Para sistemas externos o AJAX)
 # =======================================================
 
 @personas_bp.route('/api/', methods=['GET'])
 def get_personas():
-    """Retorna listado de personas en formato JSON."""
-    personas = PersonaService.get_all()
-    return jsonify(personas_schema.dump(personas)), 200
+    """
+    Listado de personas en JSON, paginado por cursor (RUT).
+    Parámetros: cursor, limite (máx. 500), campos=rut,nombres,...,
+    unidad_id, estamento_id, vigente=1|0 (nombramiento vigente) y
+    formato=ndjson para recibir el conjunto completo en streaming (una persona por línea).
+    """
+    filtros = {
+        'unidad_id': request.args.get('unidad_id', type=int),
+        'estamento_id': request.args.get('estamento_id', type=int),
+        'vigente': {'1': True, '0': False}.get(request.args.get('vigente'))
+    }
+    campos = [c.strip() for c in request.args.get('campos', '').split(',') if c.strip()]
+    try:
+        schema = persona_schema_campos(campos)
+    except ValueError as e:
+        return jsonify({"error": f"Campos inválidos: {e}"}), 400
+
+    if request.args.get('formato') == 'ndjson':
+        def generar():
+            for persona in PersonaService.iterar_api(**filtros):
+                yield json.dumps(schema.dump(persona), default=str, ensure_ascii=False) + '\n'
+        return Response(stream_with_context(generar()), mimetype='application/x-ndjson')
+
+    limite = min(max(request.args.get('limite', 100, type=int), 1), LIMITE_MAXIMO_API)
+    personas, siguiente = PersonaService.pagina_api(request.args.get('cursor'), limite, **filtros)
+    return jsonify({
+        "datos": schema.dump(personas, many=True),
+        "siguiente_cursor": siguiente,
+        "limite": limite
+    }), 200
+
+@personas_bp.route('/api/buscar', methods=['GET'])
+def buscar_personas():
+    """
+    Typeahead: ?q=texto (nombre, apellidos, RUT o email; sin tildes, por prefijo).
+    Retorna hasta ?limite= (máx. 50) fichas {rut, nombre, email}.
+    """
+    limite = min(max(request.args.get('limite', 10, type=int), 1), 50)
+    return jsonify(BusquedaPersonasService.buscar(request.args.get('q', ''), limite)), 200
 
 @personas_bp.route('/api/<rut>', methods=['GET'])
 def get_persona(rut):
@@ -40,6 +84,21 @@ def get_persona(rut):
         **data # Desempaqueta nombres, apellidos y título profesional
     }), 200
 
+@personas_bp.route('/api/<rut>/perfil', methods=['GET'])
+def get_perfil_persona(rut):
+    """
+    Ficha 360: nombramiento actual, sueldo del grado, totales del año y
+    registros recientes de viáticos y horas extras.
+    """
+    try:
+        persona, ficha = PerfilPersonaService.obtener_perfil(rut)
+        if not persona:
+            return jsonify({"error": "Persona no encontrada"}), 404
+        return jsonify(ficha), 200
+    except Exception as e:
+        print(f"Error ficha persona: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @personas_bp.route('/api/', methods=['POST'])
 def create_persona():
     """Crea una nueva persona vía API JSON."""
@@ -101,6 +160,11 @@ def carga_masiva():
 
         if file:
             try:
+                # Modo segundo plano: se encola y la UI consulta el avance por JSON
+                if request.form.get('segundo_plano'):
+                    ruta = TrabajosService.guardar_archivo_subido(file)
+                    return respuesta_trabajo(TrabajosService.encolar('CARGA_PERSONAS', {'ruta_archivo': ruta}))
+
                 procesados, n_errores, lista_errores = PersonaService.procesar_carga_masiva(file)
                 
                 if procesados > 0:
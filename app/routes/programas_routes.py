@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.extensions import db
 from app.services.programas_service import ProgramasService
+from app.services.libro_presupuestario_service import LibroPresupuestarioService
+from app.services.proyeccion_presupuestaria_service import ProyeccionPresupuestariaService
 from app.models.programas import Programa, CuentaPresupuestaria
 from app.models.contratos import ContratoHonorario
+from datetime import datetime
 
 # Definimos el Blueprint
 programas_bp = Blueprint('programas_bp', __name__, url_prefix='/programas')
@@ -77,13 +80,25 @@ def nuevo_programa():
 def ver_programa(id):
     """
     Muestra el detalle financiero del programa (La Cartola) y su historial.
+    El historial sale del libro de movimientos (rango del índice cuenta/fecha);
+    con ?desde=&hasta= se agrega el resumen de saldos del periodo.
     """
     try:
         programa = Programa.query.get_or_404(id)
-        # Buscamos los contratos asociados para mostrar el historial de gastos
-        contratos = ContratoHonorario.query.filter_by(programa_id=id).order_by(ContratoHonorario.fecha_inicio.desc()).all()
-        
-        return render_template('programas/show.html', programa=programa, contratos=contratos)
+        cuenta_ids = [c.id for c in programa.cuentas]
+
+        desde = request.args.get('desde')
+        hasta = request.args.get('hasta')
+        desde = datetime.strptime(desde, '%Y-%m-%d').date() if desde else None
+        hasta = datetime.strptime(hasta, '%Y-%m-%d').date() if hasta else None
+
+        movimientos = LibroPresupuestarioService.cartola(cuenta_ids, desde, hasta)
+        resumen = None
+        if desde and hasta:
+            resumen = LibroPresupuestarioService.resumen_periodo(cuenta_ids, desde, hasta)
+
+        return render_template('programas/show.html', programa=programa, movimientos=movimientos,
+                               resumen=resumen, desde=desde, hasta=hasta)
     except Exception as e:
         flash(f'Error al cargar el programa: {str(e)}', 'danger')
         return redirect(url_for('programas_bp.listar'))
@@ -128,8 +143,11 @@ def editar_programa(id):
                     if cuenta_existente:
                         # CASO A: SUPLEMENTACIÓN (El código ya existía)
                         # Le sumamos la plata a lo que ya tenía
+                        # El saldo se abona en el libro (fila bloqueada + movimiento)
                         cuenta_existente.monto_inicial += monto_int
-                        cuenta_existente.saldo_actual += monto_int
+                        LibroPresupuestarioService.acreditar(
+                            [(cuenta_existente.id, monto_int)], concepto='SUPLEMENTACION'
+                        )
                         flash(f'Se suplementó la cuenta {codigo_limpio} con ${monto_int:,.0f}', 'info')
                     else:
                         # CASO B: CUENTA NUEVA (El código no existía)
@@ -137,9 +155,13 @@ def editar_programa(id):
                             programa_id=programa.id,
                             codigo=codigo_limpio,
                             monto_inicial=monto_int,
-                            saldo_actual=monto_int
+                            saldo_actual=0
                         )
                         db.session.add(nueva_cuenta)
+                        db.session.flush()
+                        LibroPresupuestarioService.acreditar(
+                            [(nueva_cuenta.id, monto_int)], concepto='APERTURA'
+                        )
                         flash(f'Se creó la nueva cuenta {codigo_limpio}', 'success')
                     
                     cuentas_procesadas += 1
@@ -182,4 +204,50 @@ def eliminar_programa(id):
         db.session.rollback()
         flash(f'Error al eliminar: {str(e)}', 'danger')
         
-    return redirect(url_for('programas_bp.listar'))
\ No newline at end of file
+    return redirect(url_for('programas_bp.listar'))
+
+# --------------------------------------------------------------------------
+# 6. API DE EJECUCIÓN PRESUPUESTARIA
+# --------------------------------------------------------------------------
+@programas_bp.route('/api/ejecucion')
+def api_ejecucion():
+    """
+    Ejecución por cuenta (?programa_id=) o, con ?agrupar=programa, por programa.
+    """
+    try:
+        if request.args.get('agrupar') == 'programa':
+            return jsonify(ProgramasService.ejecucion_por_programa())
+        return jsonify(ProgramasService.ejecucion_por_cuenta(request.args.get('programa_id', type=int)))
+    except Exception as e:
+        print(f"Error API Ejecución: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@programas_bp.route('/api/ejecucion-mensual/<int:anio>')
+def api_ejecucion_mensual(anio):
+    """Devengo mensual por programa y cuenta del año (?programa_id= opcional)."""
+    try:
+        return jsonify(ProgramasService.ejecucion_mensual(anio, request.args.get('programa_id', type=int)))
+    except Exception as e:
+        print(f"Error API Ejecución mensual: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# --------------------------------------------------------------------------
+# 7. PROYECCIÓN DE COBERTURA (CUOTAS PENDIENTES)
+# --------------------------------------------------------------------------
+@programas_bp.route('/proyeccion')
+def proyeccion():
+    """Matriz programa x mes: saldo libre menos las cuotas pendientes sin reserva."""
+    try:
+        datos = ProyeccionPresupuestariaService.proyectar(programa_id=request.args.get('programa_id', type=int))
+        return render_template('programas/proyeccion.html', datos=datos)
+    except Exception as e:
+        flash(f'Error al calcular la proyección: {str(e)}', 'danger')
+        return redirect(url_for('programas_bp.listar'))
+
+@programas_bp.route('/api/proyeccion')
+def api_proyeccion():
+    try:
+        return jsonify(ProyeccionPresupuestariaService.proyectar(programa_id=request.args.get('programa_id', type=int)))
+    except Exception as e:
+        print(f"Error API Proyección: {str(e)}")
+        return jsonify({'error': str(e)}), 500
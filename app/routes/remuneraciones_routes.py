@@ -1,6 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+import os
 from app.extensions import db
 from app.services.remuneraciones_service import RemuneracionesService
+from app.services.simulacion_remuneraciones_service import SimulacionRemuneracionesService
+from app.services.proyeccion_remuneraciones_service import ProyeccionRemuneracionesService
+from app.services.comparacion_escalas_service import ComparacionEscalasService
+from app.services.historial_escalas_service import HistorialEscalasService
+from app.services.trabajos_service import TrabajosService
+from app.routes.trabajos_routes import respuesta_trabajo
 from app.services.catalogos_service import CatalogosService
 from app.models.remuneraciones import ConfigTipoHaberes
 # CORRECCIÓN: Importar CatEstamento (Singular)
@@ -57,6 +64,12 @@ def clonar_periodo():
             flash('Debe seleccionar fecha de origen y destino.', 'warning')
             return redirect(url_for('remuneraciones_bp.index'))
 
+        if request.form.get('segundo_plano'):
+            return respuesta_trabajo(TrabajosService.encolar('CLONAR_PERIODO', {
+                'fecha_origen': origen, 'fecha_destino': destino, 'porcentaje': float(pct),
+                'grado_min': int(g_min), 'grado_max': int(g_max)
+            }))
+
         cnt = RemuneracionesService.clonar_periodo(
             origen, 
             destino, 
@@ -181,6 +194,8 @@ def gestionar_haberes():
                 if est:
                     haber.estamentos_habilitados.append(est)
             
+            # Fórmulas y habilitaciones afectan a todos los periodos ya calculados
+            HistorialEscalasService.escribir_todo()
             db.session.commit()
             flash(f'Haber "{nombre}" guardado correctamente.', 'success')
             
@@ -271,6 +286,119 @@ def api_valores_grado():
     except Exception as e:
         return {'error': str(e)}, 500
 
+@remuneraciones_bp.route('/api/simulacion_lote', methods=['POST'])
+def api_simulacion_lote():
+    """
+    Simula muchos escenarios en una pasada. JSON:
+    {fecha, grados, estamentos, reajustes, adicionales} (producto cruzado) o
+    {fecha, escenarios: [{grado, estamento_id, reajuste, adicionales}]}.
+    """
+    try:
+        data = request.get_json() or {}
+        fecha = data.get('fecha')
+        if not fecha:
+            return {'error': 'Falta la fecha de la escala'}, 400
+
+        escenarios = SimulacionRemuneracionesService.expandir_escenarios(data)
+        if not escenarios:
+            return {'error': 'No hay escenarios para simular'}, 400
+
+        resultados = SimulacionRemuneracionesService.simular_lote(fecha, escenarios)
+        return jsonify({'fecha': fecha, 'escenarios': resultados}), 200
+    except (ValueError, TypeError, KeyError) as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@remuneraciones_bp.route('/api/reajuste/previsualizar', methods=['POST'])
+def api_previsualizar_reajuste():
+    """
+    Reajuste en memoria: {fecha, tramos: [{porcentaje, grado_min, grado_max, haberes}]}.
+    Retorna el diff de la matriz y el costo sobre la dotación vigente; no guarda nada.
+    """
+    try:
+        data = request.get_json() or {}
+        if not data.get('fecha'):
+            return {'error': 'Falta la fecha de la escala'}, 400
+        resultado = SimulacionRemuneracionesService.previsualizar_reajuste(data['fecha'], data.get('tramos'))
+        return jsonify(resultado), 200
+    except (ValueError, TypeError) as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@remuneraciones_bp.route('/api/reajuste/confirmar', methods=['POST'])
+def api_confirmar_reajuste():
+    """Persiste un reajuste previsualizado: {fecha, tramos, firma}."""
+    try:
+        data = request.get_json() or {}
+        if not data.get('fecha'):
+            return {'error': 'Falta la fecha de la escala'}, 400
+        cnt = RemuneracionesService.confirmar_reajuste(data['fecha'], data.get('tramos'), data.get('firma'))
+        return {'status': 'ok', 'registros': cnt}, 200
+    except (ValueError, TypeError) as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@remuneraciones_bp.route('/api/proyeccion_anual/<int:anio>')
+def api_proyeccion_anual(anio):
+    """Costo mensual proyectado de la planilla base del año (total, por unidad, estamento y calidad)."""
+    try:
+        return jsonify(ProyeccionRemuneracionesService.proyectar(anio)), 200
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+# --- COMPARACIÓN DE PERIODOS ---
+def _fechas_comparacion():
+    """(anterior, nueva) desde ?desde=&hasta=; si falta 'desde', el periodo previo a 'hasta'."""
+    nueva = request.args.get('hasta')
+    anterior = request.args.get('desde') or (ComparacionEscalasService.periodo_anterior(nueva) if nueva else None)
+    return anterior, nueva
+
+@remuneraciones_bp.route('/api/comparar')
+def api_comparar_periodos():
+    """Diferencias por (estamento, grado, haber) entre dos periodos, con alertas."""
+    try:
+        anterior, nueva = _fechas_comparacion()
+        if not anterior or not nueva:
+            return {'error': 'Indique ?hasta= (y opcionalmente ?desde=) con periodos existentes'}, 400
+        return jsonify(ComparacionEscalasService.comparar(anterior, nueva)), 200
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@remuneraciones_bp.route('/comparar/exportar')
+def exportar_comparacion():
+    """Descarga la comparación de periodos en XLSX."""
+    try:
+        anterior, nueva = _fechas_comparacion()
+        if not anterior or not nueva:
+            flash('Seleccione los periodos a comparar.', 'warning')
+            return redirect(url_for('remuneraciones_bp.index'))
+        path_archivo = ComparacionEscalasService.exportar_xlsx(anterior, nueva)
+        return send_file(path_archivo, as_attachment=True, download_name=os.path.basename(path_archivo))
+    except Exception as e:
+        flash(f'Error al exportar la comparación: {str(e)}', 'danger')
+        return redirect(url_for('remuneraciones_bp.index'))
+
+@remuneraciones_bp.route('/api/historial')
+def api_historial_escalas():
+    """Serie de un haber (o TOTAL_FIJO) por (estamento, grado) desde el historial calculado."""
+    try:
+        codigo = (request.args.get('codigo') or 'SUELDO_BASE').upper().strip()
+        series = HistorialEscalasService.serie(
+            codigo,
+            estamento_id=request.args.get('estamento_id', type=int),
+            grado=request.args.get('grado', type=int),
+            desde=request.args.get('desde') or None,
+            hasta=request.args.get('hasta') or None
+        )
+        return jsonify({'codigo': codigo, 'series': series}), 200
+    except Exception as e:
+        return {'error': str(e)}, 500
+
 # --- ACTUALIZAR FECHA VIGENCIA (NUEVO) ---
 @remuneraciones_bp.route('/actualizar_fecha_vigencia', methods=['POST'])
 def actualizar_fecha_vigencia():
@@ -0,0 +1,51 @@
+import os
+from flask import Blueprint, jsonify, send_file, url_for
+from app.services.trabajos_service import TrabajosService
+from app.models.trabajos import TrabajoSegundoPlano
+
+trabajos_bp = Blueprint('trabajos_bp', __name__, url_prefix='/trabajos')
+
+
+def respuesta_trabajo(trabajo, codigo=202):
+    """Respuesta JSON estándar al encolar un trabajo (incluye la URL de consulta)."""
+    datos = trabajo.to_dict()
+    datos['url_estado'] = url_for('trabajos_bp.estado', trabajo_id=trabajo.id)
+    return jsonify(datos), codigo
+
+# ==============================================================================
+# API DE CONSULTA (POLLING DESDE LA UI)
+# ==============================================================================
+
+@trabajos_bp.route('/api/<int:trabajo_id>')
+def estado(trabajo_id):
+    """Estado, avance y resultado de un trabajo."""
+    trabajo = TrabajosService.obtener(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    datos = trabajo.to_dict()
+    if trabajo.archivo_resultado:
+        datos['url_descarga'] = url_for('trabajos_bp.descargar', trabajo_id=trabajo.id)
+    return jsonify(datos)
+
+@trabajos_bp.route('/api/recientes')
+def recientes():
+    """Últimos 20 trabajos registrados."""
+    trabajos = TrabajoSegundoPlano.query.order_by(TrabajoSegundoPlano.id.desc()).limit(20).all()
+    return jsonify([t.to_dict() for t in trabajos])
+
+# ==============================================================================
+# DESCARGA DEL ARTEFACTO GENERADO
+# ==============================================================================
+
+@trabajos_bp.route('/descargar/<int:trabajo_id>')
+def descargar(trabajo_id):
+    trabajo = TrabajosService.obtener(trabajo_id)
+    if not trabajo or trabajo.estado != 'COMPLETADO' or not trabajo.archivo_resultado:
+        return jsonify({'error': 'El trabajo no tiene archivo disponible'}), 404
+
+    if not os.path.exists(trabajo.archivo_resultado):
+        return jsonify({'error': 'El archivo ya no existe en el servidor'}), 410
+
+    return send_file(trabajo.archivo_resultado, as_attachment=True,
+                     download_name=os.path.basename(trabajo.archivo_resultado))
@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, current_app, Response, make_response
 from app.services.viaticos_service import ViaticosService
+from app.services.trabajos_service import TrabajosService
+from app.routes.trabajos_routes import respuesta_trabajo
 from app.models.contratos import AutoridadFirmante
 from app.models.personas import Persona
-from app.models.nombramientos import Nombramiento
+from app.services.nombramientos_service import NombramientosService
 import os
 
 viaticos_bp = Blueprint('viaticos_bp', __name__, url_prefix='/viaticos')
@@ -165,11 +167,17 @@ def carga_masiva():
             flash('Debe seleccionar un archivo y ambas autoridades firmantes.', 'warning')
             return redirect(url_for('viaticos_bp.carga_masiva'))
 
-        if not archivo.filename.endswith('.csv'):
-            flash('Solo se permiten archivos CSV (.csv).', 'warning')
+        if not archivo.filename.lower().endswith(('.csv', '.xlsx')):
+            flash('Solo se permiten archivos CSV (.csv) o Excel (.xlsx).', 'warning')
             return redirect(url_for('viaticos_bp.carga_masiva'))
 
         try:
+            if request.form.get('segundo_plano'):
+                ruta = TrabajosService.guardar_archivo_subido(archivo)
+                return respuesta_trabajo(TrabajosService.encolar('CARGA_VIATICOS', {
+                    'ruta_archivo': ruta, 'admin_id': admin_id, 'secretario_id': secretario_id
+                }))
+
             exitos, errores = ViaticosService.procesar_carga_masiva(archivo, admin_id, secretario_id)
             
             if exitos > 0:
@@ -229,10 +237,7 @@ def buscar_funcionario_api(rut):
             return jsonify({'encontrado': False})
 
         datos_contractuales = None
-        nombramiento = Nombramiento.query.filter_by(
-            persona_id=persona.rut, 
-            estado='VIGENTE'
-        ).order_by(Nombramiento.fecha_inicio.desc()).first()
+        nombramiento = NombramientosService.nombramiento_vigente(persona.rut)
 
         if nombramiento:
             estamento_bd = nombramiento.estamento.estamento.upper()
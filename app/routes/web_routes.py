@@ -1,11 +1,16 @@
 # app/routes/web_routes.py
 from flask import Blueprint, render_template, flash, redirect, url_for, request
 from app.services.persona_service import PersonaService
+from app.services.busqueda_personas_service import BusquedaPersonasService
+from app.services.perfil_persona_service import PerfilPersonaService
 from app.services.catalogos_service import CatalogosService # <--- Centralizamos catálogos
 from app.services.historial_service import HistorialService
 
 web_bp = Blueprint('web_bp', __name__)
 
+# Personas por página en el listado
+TAMANO_PAGINA = 100
+
 # --- RUTA RAÍZ ---
 @web_bp.route('/')
 def index():
@@ -14,8 +19,18 @@ def index():
 # --- LISTAR (READ) ---
 @web_bp.route('/personas')
 def listar_personas():
-    personas = PersonaService.get_all()
-    return render_template('personas/index.html', personas=personas)
+    """
+    Listado paginado por RUT (?cursor=). Con ?q= muestra los resultados del
+    buscador (nombre, RUT o email) en vez de la página.
+    """
+    q = request.args.get('q', '').strip()
+    siguiente = None
+    if q:
+        ruts = [f['rut'] for f in BusquedaPersonasService.buscar(q, limite=TAMANO_PAGINA)]
+        personas = PersonaService.get_by_ruts(ruts)
+    else:
+        personas, siguiente = PersonaService.pagina_api(request.args.get('cursor'), TAMANO_PAGINA)
+    return render_template('personas/index.html', personas=personas, q=q, siguiente=siguiente)
 
 # --- CREAR (CREATE) ---
 @web_bp.route('/personas/nueva', methods=['GET', 'POST'])
@@ -94,14 +109,14 @@ def eliminar_persona(rut):
 # --- PERFIL DETALLADO ---
 @web_bp.route('/personas/perfil/<rut>')
 def ver_perfil(rut):
-    persona = PersonaService.get_by_rut(rut)
+    persona, perfil = PerfilPersonaService.obtener_perfil(rut)
     if not persona:
         flash('Persona no encontrada', 'danger')
         return redirect(url_for('web_bp.listar_personas'))
     
     niveles = CatalogosService.get_niveles_estudios()
 
-    return render_template('personas/profile.html', persona=persona, niveles=niveles)
+    return render_template('personas/profile.html', persona=persona, niveles=niveles, perfil=perfil)
 
 # --- HISTORIAL ACADÉMICO ---
 @web_bp.route('/historial/agregar', methods=['POST'])
@@ -45,4 +45,21 @@ class PersonaSchema(ma.SQLAlchemyAutoSchema):
 # Instancias para uso global
 persona_schema = PersonaSchema()
 personas_schema = PersonaSchema(many=True)
-historial_schema = HistorialAcademicoSchema()
\ No newline at end of file
+historial_schema = HistorialAcademicoSchema()
+
+# Esquemas con proyección de campos (?campos=rut,nombres): uno por combinación, creado una sola vez
+_schemas_proyectados = {}
+
+def persona_schema_campos(campos=None):
+    """
+    Retorna un PersonaSchema reutilizable limitado a 'campos' (iterable de nombres).
+    Lanza ValueError si algún campo no existe en el esquema.
+    """
+    if not campos:
+        return persona_schema
+    clave = tuple(sorted(set(campos)))
+    schema = _schemas_proyectados.get(clave)
+    if schema is None:
+        schema = PersonaSchema(only=clave)
+        _schemas_proyectados[clave] = schema
+    return schema
\ No newline at end of file
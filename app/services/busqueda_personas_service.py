@@ -0,0 +1,184 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models.personas import Persona
+
+RE_RUT = re.compile(r'^[0-9][0-9.]*(-[0-9kK]?)?$')
+
+
+class BusquedaPersonasService:
+    """
+    Índice en memoria para buscar funcionarios por nombre, apellidos, RUT o email,
+    sin distinguir tildes ni mayúsculas, por prefijo de palabra.
+
+    - Cada persona se descompone en palabras normalizadas ('Muñoz' -> 'munoz',
+      '12.345.678-9' -> '123456789'); el índice es una lista ordenada de
+      (palabra, rut), y un prefijo se resuelve con bisect en O(log n).
+    - Una consulta de varias palabras exige que TODAS calcen con alguna palabra
+      de la persona ("juan per" encuentra a "Juan Pérez").
+    - El índice se marca obsoleto al confirmar cambios en personas y se
+      reconstruye (una consulta de columnas) en la siguiente búsqueda.
+    - Los eventos solo ven las escrituras de este proceso: cada
+      BUSQUEDA_VERIFICAR_SEGUNDOS se compara además el sello de la BD
+      (COUNT y MAX(updated_at) de personas) con el del índice, para recoger
+      los cambios hechos por otros workers.
+    """
+
+    _palabras = []      # [(palabra, rut)] ordenada
+    _fichas = {}        # rut -> {'rut', 'nombre', 'email'}
+    _vigente = False
+    _sello = None       # (cantidad, max updated_at) con que se construyó el índice
+    _verificado = 0.0   # time.monotonic() de la última comparación de sello
+    _lock = threading.Lock()
+
+    # =======================================================
+    # NORMALIZACIÓN
+    # =======================================================
+
+    @staticmethod
+    def normalizar(texto):
+        """Minúsculas, sin tildes y con solo letras/dígitos separados por espacio."""
+        if not texto:
+            return ''
+        sin_tildes = unicodedata.normalize('NFKD', str(texto))
+        sin_tildes = ''.join(c for c in sin_tildes if not unicodedata.combining(c))
+        return re.sub(r'[^a-z0-9]+', ' ', sin_tildes.lower()).strip()
+
+    @staticmethod
+    def _palabras_persona(rut, nombres, paterno, materno, email):
+        palabras = set(BusquedaPersonasService.normalizar(f"{nombres} {paterno} {materno}").split())
+        palabras.add(re.sub(r'[^0-9kK]', '', rut or '').lower())  # RUT sin puntos ni guion
+        if email:
+            # Solo la parte local: el dominio es común a todos y no discrimina
+            palabras.update(BusquedaPersonasService.normalizar(email.split('@')[0]).split())
+        palabras.discard('')
+        return palabras
+
+    # =======================================================
+    # CONSTRUCCIÓN DEL ÍNDICE
+    # =======================================================
+
+    @staticmethod
+    def _sello_bd():
+        return tuple(db.session.query(func.count(Persona.rut), func.max(Persona.updated_at)).one())
+
+    @staticmethod
+    def _reconstruir(sello):
+        filas = db.session.query(
+            Persona.rut, Persona.nombres, Persona.apellido_paterno,
+            Persona.apellido_materno, Persona.email
+        ).all()
+
+        palabras, fichas = [], {}
+        for rut, nombres, paterno, materno, email in filas:
+            for palabra in BusquedaPersonasService._palabras_persona(rut, nombres, paterno, materno, email):
+                palabras.append((palabra, rut))
+            fichas[rut] = {
+                'rut': rut,
+                'nombre': f"{nombres} {paterno} {materno or ''}".strip(),
+                'email': email
+            }
+        palabras.sort()
+
+        BusquedaPersonasService._palabras = palabras
+        BusquedaPersonasService._fichas = fichas
+        BusquedaPersonasService._sello = sello
+        BusquedaPersonasService._vigente = True
+
+    @staticmethod
+    def _asegurar_indice():
+        intervalo = float(current_app.config.get('BUSQUEDA_VERIFICAR_SEGUNDOS', 5))
+        if BusquedaPersonasService._vigente and time.monotonic() - BusquedaPersonasService._verificado < intervalo:
+            return
+        with BusquedaPersonasService._lock:
+            if BusquedaPersonasService._vigente and time.monotonic() - BusquedaPersonasService._verificado < intervalo:
+                return
+            # El sello se lee antes que las filas: un cambio concurrente forzará otra reconstrucción
+            sello = BusquedaPersonasService._sello_bd()
+            if not BusquedaPersonasService._vigente or sello != BusquedaPersonasService._sello:
+                BusquedaPersonasService._reconstruir(sello)
+            BusquedaPersonasService._verificado = time.monotonic()
+
+    @staticmethod
+    def invalidar():
+        BusquedaPersonasService._vigente = False
+
+    # =======================================================
+    # BÚSQUEDA
+    # =======================================================
+
+    @staticmethod
+    def _ruts_con_prefijo(palabras, prefijo):
+        inicio = bisect.bisect_left(palabras, (prefijo,))
+        ruts = set()
+        for i in range(inicio, len(palabras)):
+            palabra, rut = palabras[i]
+            if not palabra.startswith(prefijo):
+                break
+            ruts.add(rut)
+        return ruts
+
+    @staticmethod
+    def buscar(texto, limite=10):
+        """
+        Retorna hasta 'limite' fichas {'rut', 'nombre', 'email'} cuyas palabras
+        comienzan con cada término buscado, ordenadas por nombre.
+        """
+        texto = (texto or '').strip()
+        if RE_RUT.match(texto):
+            # RUT escrito con puntos y guion: se busca compactado
+            terminos = [re.sub(r'[^0-9kK]', '', texto).lower()]
+        else:
+            terminos = BusquedaPersonasService.normalizar(texto.split('@')[0]).split()
+        if not terminos:
+            return []
+
+        BusquedaPersonasService._asegurar_indice()
+        palabras = BusquedaPersonasService._palabras
+        fichas = BusquedaPersonasService._fichas
+
+        resultado = None
+        for termino in sorted(terminos, key=len, reverse=True):
+            ruts = BusquedaPersonasService._ruts_con_prefijo(palabras, termino)
+            resultado = ruts if resultado is None else resultado & ruts
+            if not resultado:
+                break
+        resultado = resultado or set()
+
+        encontrados = [fichas[rut] for rut in resultado if rut in fichas]
+        encontrados.sort(key=lambda f: BusquedaPersonasService.normalizar(f['nombre']))
+        return encontrados[:limite]
+
+    # =======================================================
+    # INVALIDACIÓN POR EVENTOS DE SESIÓN
+    # =======================================================
+
+    @staticmethod
+    def _marcar_cambios(session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Persona):
+                session.info['personas_modificadas'] = True
+                return
+
+    @staticmethod
+    def _al_confirmar(session):
+        if session.info.pop('personas_modificadas', False):
+            BusquedaPersonasService.invalidar()
+
+    @staticmethod
+    def _al_revertir(session, transaccion_previa):
+        session.info.pop('personas_modificadas', None)
+
+    @staticmethod
+    def registrar_eventos():
+        """Conecta la invalidación a todas las sesiones (se llama una vez en create_app)."""
+        if not event.contains(Session, 'after_flush', BusquedaPersonasService._marcar_cambios):
+            event.listen(Session, 'after_flush', BusquedaPersonasService._marcar_cambios)
+            event.listen(Session, 'after_commit', BusquedaPersonasService._al_confirmar)
+            event.listen(Session, 'after_soft_rollback', BusquedaPersonasService._al_revertir)
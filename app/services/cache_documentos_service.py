@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from docxtpl import DocxTemplate
+from flask import current_app
+
+
+class CacheDocumentosService:
+    """
+    Caché en disco, direccionada por contenido, para los documentos Word generados.
+
+    La clave de cada documento es el SHA-256 de los bytes de la plantilla más el
+    contexto de renderizado. Si cambia el registro (contrato, decreto, etc.) cambia
+    el contexto, y si se reemplaza la plantilla cambian sus bytes: en ambos casos
+    la clave es otra y el documento se vuelve a generar sin invalidación manual.
+
+    Las fechas de emisión (fecha_actual, fecha_emision) se imprimen en el
+    documento, así que forman parte de la clave: la reutilización es como máximo
+    dentro del mismo día y nunca entrega un documento con una fecha antigua.
+    La caché vive fuera de 'static' (no se sirve por HTTP).
+    """
+
+    # Memo de huellas de plantillas: ruta -> (mtime, tamaño, sha256)
+    _huellas_plantillas = {}
+    _lock = threading.Lock()
+
+    # =======================================================
+    # CLAVES DE CONTENIDO
+    # =======================================================
+
+    @staticmethod
+    def huella_plantilla(ruta_plantilla):
+        """
+        Retorna el SHA-256 de los bytes de la plantilla.
+        Solo se relee el archivo si cambió su fecha de modificación o su tamaño.
+        """
+        stat = os.stat(ruta_plantilla)
+        firma = (stat.st_mtime_ns, stat.st_size)
+
+        memo = CacheDocumentosService._huellas_plantillas.get(ruta_plantilla)
+        if memo and memo[:2] == firma:
+            return memo[2]
+
+        sha = hashlib.sha256()
+        with open(ruta_plantilla, 'rb') as f:
+            for bloque in iter(lambda: f.read(65536), b''):
+                sha.update(bloque)
+
+        huella = sha.hexdigest()
+        with CacheDocumentosService._lock:
+            CacheDocumentosService._huellas_plantillas[ruta_plantilla] = (firma[0], firma[1], huella)
+        return huella
+
+    @staticmethod
+    def calcular_clave(ruta_plantilla, contexto):
+        """Clave = hash(bytes de plantilla + contexto serializado de forma canónica)."""
+        contexto_serializado = json.dumps(contexto, sort_keys=True, default=str, ensure_ascii=False)
+
+        sha = hashlib.sha256()
+        sha.update(CacheDocumentosService.huella_plantilla(ruta_plantilla).encode('ascii'))
+        sha.update(b'\x00')
+        sha.update(contexto_serializado.encode('utf-8'))
+        return sha.hexdigest()
+
+    # =======================================================
+    # RENDERIZADO CON CACHÉ
+    # =======================================================
+
+    @staticmethod
+    def renderizar(ruta_plantilla, contexto, ruta_salida):
+        """
+        Deja en 'ruta_salida' el documento renderizado.
+        Si el mismo contenido ya fue generado antes, se copia desde la caché
+        sin volver a renderizar. Retorna True si hubo acierto de caché.
+        """
+        directorio = CacheDocumentosService._directorio()
+        clave = CacheDocumentosService.calcular_clave(ruta_plantilla, contexto)
+        ruta_cache = os.path.join(directorio, f"{clave}.docx")
+
+        os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
+
+        if os.path.exists(ruta_cache):
+            try:
+                # Marcamos el uso reciente (la poda LRU se basa en la fecha de modificación)
+                os.utime(ruta_cache, None)
+                shutil.copyfile(ruta_cache, ruta_salida)
+                return True
+            except FileNotFoundError:
+                pass  # Otro proceso la podó justo ahora: se regenera abajo
+
+        doc = DocxTemplate(ruta_plantilla)
+        doc.render(contexto)
+        doc.save(ruta_salida)
+
+        # Escritura atómica en la caché (evita que otra petición lea un archivo a medias)
+        temporal = f"{ruta_cache}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(ruta_salida, temporal)
+        os.replace(temporal, ruta_cache)
+
+        CacheDocumentosService.podar()
+        return False
+
+    # =======================================================
+    # MANTENCIÓN (LRU POR TAMAÑO)
+    # =======================================================
+
+    @staticmethod
+    def podar(max_bytes=None):
+        """
+        Elimina los documentos usados hace más tiempo hasta que la caché
+        quede bajo el límite configurado (DOC_CACHE_MAX_MB).
+        Retorna la cantidad de archivos eliminados.
+        """
+        directorio = CacheDocumentosService._directorio()
+        if max_bytes is None:
+            max_bytes = int(current_app.config.get('DOC_CACHE_MAX_MB', 200)) * 1024 * 1024
+
+        entradas = []
+        total = 0
+        with os.scandir(directorio) as it:
+            for entrada in it:
+                if entrada.is_file() and entrada.name.endswith('.docx'):
+                    stat = entrada.stat()
+                    entradas.append((stat.st_mtime, stat.st_size, entrada.path))
+                    total += stat.st_size
+
+        if total <= max_bytes:
+            return 0
+
+        eliminados = 0
+        for _, tamano, ruta in sorted(entradas):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                continue
+            total -= tamano
+            eliminados += 1
+            if total <= max_bytes:
+                break
+        return eliminados
+
+    @staticmethod
+    def vaciar():
+        """Borra completamente la caché de documentos."""
+        return CacheDocumentosService.podar(max_bytes=0)
+
+    @staticmethod
+    def _directorio():
+        directorio = current_app.config.get('DOC_CACHE_DIR') or \
+            os.path.join(current_app.instance_path, 'cache_docs')
+        os.makedirs(directorio, exist_ok=True)
+        return directorio
@@ -1,5 +1,6 @@
 from app.extensions import db
 from app.models.catalogos import CatSexo, CatEstamento, CatNivelEstudios, CatUnidad
+from app.services.organigrama_service import OrganigramaService
 
 class CatalogosService:
     
@@ -114,36 +115,63 @@ class CatalogosService:
 
     @staticmethod
     def crear_unidad(data):
-        """Crea una unidad organizacional (Dirección, Depto, etc.)."""
-        nueva = CatUnidad(
-            nombre=data.get('nombre').upper(),
-            sigla=data.get('sigla').upper() if data.get('sigla') else None,
-            tipo=data.get('tipo'),
-            padre_id=data.get('padre_id') if data.get('padre_id') else None
-        )
-        db.session.add(nueva)
-        db.session.commit()
-        return nueva
+        """Crea una unidad organizacional (Dirección, Depto, etc.) y su clausura."""
+        try:
+            padre_id = int(data.get('padre_id')) if data.get('padre_id') else None
+            nueva = CatUnidad(
+                nombre=data.get('nombre').upper(),
+                sigla=data.get('sigla').upper() if data.get('sigla') else None,
+                tipo=data.get('tipo'),
+                padre_id=padre_id
+            )
+            db.session.add(nueva)
+            db.session.flush()
+            OrganigramaService.agregar_unidad(nueva.id, padre_id)
+            db.session.commit()
+            return nueva
+        except Exception as e:
+            db.session.rollback()
+            raise e
 
     @staticmethod
     def actualizar_unidad(id, data):
-        """Actualiza una unidad organizacional existente."""
-        reg = CatUnidad.query.get(id)
-        if reg:
+        """
+        Actualiza una unidad organizacional existente. Si cambia de unidad superior,
+        se valida que no se forme un ciclo y se reubica su subárbol en la clausura.
+        """
+        try:
+            reg = CatUnidad.query.get(id)
+            if not reg:
+                return False
+
+            padre_id = int(data.get('padre_id')) if data.get('padre_id') else None
             reg.nombre = data.get('nombre').upper()
             reg.sigla = data.get('sigla').upper() if data.get('sigla') else None
             reg.tipo = data.get('tipo')
-            reg.padre_id = data.get('padre_id') if data.get('padre_id') else None
+
+            if padre_id != reg.padre_id:
+                OrganigramaService.validar_padre(reg.id, padre_id)
+                reg.padre_id = padre_id
+                db.session.flush()
+                OrganigramaService.mover_unidad(reg.id, padre_id)
+
             db.session.commit()
             return True
-        return False
+        except Exception as e:
+            db.session.rollback()
+            raise e
 
     @staticmethod
     def eliminar_unidad(id):
-        """Elimina una unidad del organigrama municipal."""
-        reg = CatUnidad.query.get(id)
-        if reg:
+        """Elimina una unidad del organigrama municipal (solo si no tiene subunidades)."""
+        try:
+            reg = CatUnidad.query.get(id)
+            if not reg:
+                return False
+            OrganigramaService.quitar_unidad(reg.id)
             db.session.delete(reg)
             db.session.commit()
             return True
-        return False
\ No newline at end of file
+        except Exception as e:
+            db.session.rollback()
+            raise e
\ No newline at end of file
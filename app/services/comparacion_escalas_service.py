@@ -0,0 +1,186 @@
+import os
+import numpy as np
+from datetime import datetime
+from flask import current_app
+from openpyxl import Workbook
+from app.extensions import db
+from app.models.remuneraciones import EscalaRemuneraciones
+from app.services.simulacion_remuneraciones_service import SimulacionRemuneracionesService
+
+
+class ComparacionEscalasService:
+    """
+    Diferencias entre dos periodos de la escala de remuneraciones, alineadas por
+    (estamento, grado, haber), con alertas para auditar clonaciones y reajustes.
+
+    Los haberes manuales y el sueldo base se comparan con el monto guardado en
+    cada fila; los calculados, con el resultado de sus fórmulas en cada periodo.
+
+    Alertas por celda:
+    - SIN_REAJUSTE: haber manual que no cambió aunque el sueldo base de la fila sí.
+    - REAJUSTE_DISTINTO: haber manual reajustado con un % distinto al del sueldo base.
+    - DISMINUYE: el monto bajó.
+    - NUEVO / ELIMINADO: el haber aparece o desaparece (monto 0 en un periodo).
+    - FILA_NUEVA / FILA_ELIMINADA: el (estamento, grado) existe en un solo periodo.
+    """
+
+    TOLERANCIA_PCT = 0.1    # puntos porcentuales aceptados por redondeo
+    TOLERANCIA_PESOS = 1
+
+    ENCABEZADOS = ['Estamento', 'Grado', 'Código', 'Haber', 'Tipo', 'Monto anterior',
+                   'Monto nuevo', 'Diferencia', 'Variación %', 'Alertas']
+
+    # =======================================================
+    # PERIODOS
+    # =======================================================
+
+    @staticmethod
+    def periodo_anterior(fecha_vigencia):
+        """fecha_vigencia inmediatamente anterior a la dada, o None."""
+        fila = db.session.query(EscalaRemuneraciones.fecha_vigencia) \
+            .filter(EscalaRemuneraciones.fecha_vigencia < fecha_vigencia) \
+            .order_by(EscalaRemuneraciones.fecha_vigencia.desc()).first()
+        return fila[0] if fila else None
+
+    @staticmethod
+    def _matriz(periodo, claves, codigos, calculados):
+        """Montos (K x C) del periodo: guardados para manuales, por fórmula para calculados."""
+        matriz = np.zeros((len(claves), len(codigos)), dtype=np.int64)
+        presentes = [i for i, k in enumerate(claves) if k in periodo['base']]
+        if not presentes:
+            return matriz
+
+        claves_p = [claves[i] for i in presentes]
+        variables = SimulacionRemuneracionesService.evaluar(
+            periodo, [g for _, g in claves_p], [e for e, _ in claves_p], {}
+        )
+        for j, codigo in enumerate(codigos):
+            if codigo == 'SUELDO_BASE':
+                columna = [periodo['base'][k] for k in claves_p]
+            elif codigo in calculados:
+                columna = variables.get(codigo, np.zeros(len(claves_p), dtype=np.int64))
+            else:
+                columna = [periodo['filas'].get(k, {}).get(codigo, 0) for k in claves_p]
+            matriz[presentes, j] = columna
+        return matriz
+
+    # =======================================================
+    # COMPARACIÓN
+    # =======================================================
+
+    @staticmethod
+    def comparar(fecha_anterior, fecha_nueva):
+        """
+        Carga ambos periodos con el cargador masivo y retorna {'resumen', 'celdas'}
+        con una celda por (estamento, grado, haber) con monto en algún periodo.
+        """
+        anterior = SimulacionRemuneracionesService.cargar_periodo(fecha_anterior)
+        nuevo = SimulacionRemuneracionesService.cargar_periodo(fecha_nueva)
+        if not anterior['base'] or not nuevo['base']:
+            raise ValueError("Ambas fechas deben tener una escala registrada.")
+
+        haberes = nuevo['haberes']
+        calculados = {h.codigo for h in haberes if not h.es_manual}
+        nombres = {h.codigo: h.nombre for h in haberes}
+        codigos = ['SUELDO_BASE'] + [h.codigo for h in haberes if h.codigo != 'SUELDO_BASE']
+        claves = sorted(set(anterior['base']) | set(nuevo['base']))
+
+        a = ComparacionEscalasService._matriz(anterior, claves, codigos, calculados)
+        b = ComparacionEscalasService._matriz(nuevo, claves, codigos, calculados)
+        delta = b - a
+        with np.errstate(all='ignore'):
+            pct = np.where(a > 0, delta * 100.0 / a, np.nan)
+
+        # % del sueldo base de cada fila: referencia para los haberes manuales
+        pct_base = pct[:, [0]]
+        base_cambio = np.nan_to_num(np.abs(pct_base)) > ComparacionEscalasService.TOLERANCIA_PCT
+        manual = np.array([c not in calculados and c != 'SUELDO_BASE' for c in codigos], dtype=bool)[None, :]
+
+        en_anterior = np.array([k in anterior['base'] for k in claves], dtype=bool)[:, None]
+        en_nuevo = np.array([k in nuevo['base'] for k in claves], dtype=bool)[:, None]
+        ambos = en_anterior & en_nuevo
+
+        alertas = {
+            'SIN_REAJUSTE': ambos & manual & (a > 0) & (delta == 0) & base_cambio,
+            'REAJUSTE_DISTINTO': ambos & manual & (a > 0) & (delta != 0)
+                                 & (np.abs(delta) > ComparacionEscalasService.TOLERANCIA_PESOS)
+                                 & (np.abs(np.nan_to_num(pct - pct_base)) > ComparacionEscalasService.TOLERANCIA_PCT),
+            'DISMINUYE': ambos & (delta < 0) & (b > 0),
+            'NUEVO': ambos & (a == 0) & (b > 0),
+            'ELIMINADO': ambos & (a > 0) & (b == 0),
+            'FILA_NUEVA': ~en_anterior & en_nuevo & (b > 0),
+            'FILA_ELIMINADA': en_anterior & ~en_nuevo & (a > 0)
+        }
+
+        estamentos = nuevo['estamentos']
+        celdas = []
+        filas_i, cols_j = np.nonzero((a != 0) | (b != 0))
+        for i, j in zip(filas_i.tolist(), cols_j.tolist()):
+            estamento_id, grado = claves[i]
+            codigo = codigos[j]
+            est = estamentos.get(estamento_id)
+            celdas.append({
+                'estamento_id': estamento_id,
+                'estamento': est.estamento if est else str(estamento_id),
+                'grado': grado,
+                'codigo': codigo,
+                'haber': nombres.get(codigo, 'Sueldo Base' if codigo == 'SUELDO_BASE' else codigo),
+                'tipo': 'CALCULADO' if codigo in calculados else 'MANUAL',
+                'anterior': int(a[i, j]),
+                'nuevo': int(b[i, j]),
+                'diferencia': int(delta[i, j]),
+                'variacion_pct': None if np.isnan(pct[i, j]) else round(float(pct[i, j]), 2),
+                'alertas': [nombre for nombre, mascara in alertas.items() if mascara[i, j]]
+            })
+
+        base_valida = pct_base[ambos[:, 0] & ~np.isnan(pct_base[:, 0])]
+        resumen = {
+            'fecha_anterior': str(fecha_anterior),
+            'fecha_nueva': str(fecha_nueva),
+            'filas': len(claves),
+            'celdas': len(celdas),
+            'celdas_con_cambio': int(np.count_nonzero(delta)),
+            'variacion_base_mediana': round(float(np.median(base_valida)), 2) if base_valida.size else None,
+            'alertas': {nombre: int(mascara.sum()) for nombre, mascara in alertas.items()}
+        }
+        return {'resumen': resumen, 'celdas': celdas}
+
+    # =======================================================
+    # EXPORTACIÓN
+    # =======================================================
+
+    @staticmethod
+    def exportar_xlsx(fecha_anterior, fecha_nueva):
+        """
+        Escribe la comparación en un XLSX en modo 'write_only' (fila a fila, sin
+        mantener la hoja en memoria). Retorna la ruta del archivo generado.
+        """
+        resultado = ComparacionEscalasService.comparar(fecha_anterior, fecha_nueva)
+        resumen = resultado['resumen']
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="Resumen")
+        ws.append(['Periodo anterior', resumen['fecha_anterior']])
+        ws.append(['Periodo nuevo', resumen['fecha_nueva']])
+        ws.append(['Filas (estamento, grado)', resumen['filas']])
+        ws.append(['Celdas con cambio', resumen['celdas_con_cambio']])
+        ws.append(['Variación mediana sueldo base %', resumen['variacion_base_mediana']])
+        for nombre, cantidad in resumen['alertas'].items():
+            ws.append([f'Alertas {nombre}', cantidad])
+
+        ws = wb.create_sheet(title="Diferencias")
+        ws.append(ComparacionEscalasService.ENCABEZADOS)
+        for c in resultado['celdas']:
+            ws.append([
+                c['estamento'], c['grado'], c['codigo'], c['haber'], c['tipo'],
+                c['anterior'], c['nuevo'], c['diferencia'], c['variacion_pct'],
+                ', '.join(c['alertas'])
+            ])
+
+        output_folder = os.path.join(current_app.root_path, 'static', 'generated')
+        if not os.path.exists(output_folder): os.makedirs(output_folder)
+
+        filename = f"Comparacion_Escalas_{fecha_anterior}_{fecha_nueva}_{datetime.now().strftime('%H%M%S')}.xlsx"
+        output_path = os.path.join(output_folder, filename)
+        wb.save(output_path)
+        return output_path
@@ -1,9 +1,14 @@
 from app.extensions import db
+from app.services.lector_archivos_service import LectorTabular
 from app.models.programas import Programa, CuentaPresupuestaria
-from app.models.contratos import ContratoHonorario, ContratoCuota, ContratoCuotaDetalle, AutoridadFirmante
+from app.models.contratos import ContratoHonorario, ContratoCuota, ContratoCuotaDetalle, ContratoDistribucionCuenta, AutoridadFirmante, TipoContratoHonorario
+from app.models.personas import Persona
+from app.services.libro_presupuestario_service import LibroPresupuestarioService
 from app.services.programas_service import ProgramasService
-from docxtpl import DocxTemplate
+from app.services.cache_documentos_service import CacheDocumentosService
+from app.services.dashboard_service import DashboardService
 from flask import current_app
+from collections import defaultdict
 from datetime import datetime
 import json
 import os
@@ -21,14 +26,20 @@ class ContratosService:
             programa_id = int(data['programa_id'])
             
             # --- 1. PARSEO Y VALIDACIÓN DEL JSON FINANCIERO ---
+            # Sin JSON, la matriz cuota x cuenta se genera con el motor de asignación
             json_str = data.get('json_detalle_completo')
-            if not json_str:
+            if json_str:
+                try:
+                    cuotas_data = json.loads(json_str)
+                except json.JSONDecodeError:
+                    raise ValueError("Error de formato en los datos financieros.")
+            elif data.get('numero_cuotas'):
+                cuotas_data = ProgramasService.calcular_matriz_cuotas(
+                    programa_id, monto_total, int(data['numero_cuotas']),
+                    datetime.strptime(data['fecha_inicio'], '%Y-%m-%d').date()
+                )
+            else:
                 raise ValueError("No se recibieron los datos de distribución financiera.")
-            
-            try:
-                cuotas_data = json.loads(json_str)
-            except json.JSONDecodeError:
-                raise ValueError("Error de formato en los datos financieros.")
 
             # --- 1.1 PRE-CARGA DE CUENTAS DEL PROGRAMA (Para evitar KeyError: 'cuenta_id') ---
             # Si el JSON no trae el ID de la cuenta (ej: carga masiva), lo buscamos aquí.
@@ -108,8 +119,10 @@ class ContratosService:
             
             db.session.add(nuevo_contrato)
             db.session.flush()
+            ContratosService._sincronizar_distribucion(nuevo_contrato.id, distribucion_global_list)
 
             # --- 4. CREACIÓN DE CUOTAS (NIVEL 2) Y DETALLES (NIVEL 3) ---
+            movimientos = []  # Rebaja por cuota y cuenta (el libro agrupa la actualización por cuenta)
             for index, c_data in enumerate(cuotas_data):
                 nueva_cuota = ContratoCuota(
                     contrato_id=nuevo_contrato.id,
@@ -131,10 +144,15 @@ class ContratosService:
                             monto_parcial=monto_imputado
                         )
                         db.session.add(detalle)
+                        movimientos.append({
+                            'cuenta_id': d_data.get('cuenta_id') or mapa_cuentas_programa[d_data['codigo']],
+                            'monto': monto_imputado,
+                            'cuota_id': nueva_cuota.id
+                        })
 
             # --- 5. REBAJA PRESUPUESTARIA GLOBAL ---
-            # Ahora distribucion_global_list tiene 'cuenta_id', evitando el error
-            ProgramasService.rebajar_saldo(distribucion_global_list)
+            # Cuentas bloqueadas (FOR UPDATE) hasta el commit: sin sobregiro concurrente
+            LibroPresupuestarioService.debitar(movimientos, contrato_id=nuevo_contrato.id)
             
             db.session.commit()
             return nuevo_contrato
@@ -186,16 +204,13 @@ class ContratosService:
                     raise ValueError("Error en formato JSON financiero.")
 
                 # A. RESTITUCIÓN DE FONDOS (Devolver lo que se gastó antes)
-                # Iteramos sobre el resumen global antiguo para devolver la plata
-                if contrato.distribucion_cuentas_json:
-                    for item in contrato.distribucion_cuentas_json:
-                        # Necesitamos el ID de la cuenta para devolver el saldo
-                        cuenta_id = item.get('cuenta_id')
-                        if cuenta_id:
-                            cuenta = CuentaPresupuestaria.query.get(cuenta_id)
-                            if cuenta:
-                                cuenta.saldo_actual += int(item['monto'])
-                                db.session.add(cuenta) # Marcamos para update
+                # La imputación vigente se lee de la tabla de distribución (una consulta)
+                items_restitucion = [
+                    {'cuenta_id': d.cuenta_id, 'monto': d.monto} for d in contrato.distribucion
+                ]
+                LibroPresupuestarioService.acreditar(
+                    items_restitucion, concepto='RESTITUCION', contrato_id=contrato.id
+                )
                 
                 # B. LIMPIEZA DE CUOTAS ANTIGUAS
                 # Borramos todas las cuotas asociadas (Cascada borrará detalles)
@@ -215,6 +230,7 @@ class ContratosService:
                 mapa_cuentas = {c.codigo: c.id for c in programa.cuentas}
                 
                 distribucion_nueva_map = {}
+                movimientos = []
 
                 # Crear Nuevas Cuotas
                 for index, c_data in enumerate(nuevas_cuotas_data):
@@ -245,6 +261,7 @@ class ContratosService:
                                 monto_parcial=monto
                             )
                             db.session.add(detalle)
+                            movimientos.append({'cuenta_id': c_id, 'monto': monto, 'cuota_id': nueva_cuota.id})
                             
                             # Acumular para el descuento global
                             if codigo in distribucion_nueva_map:
@@ -258,11 +275,12 @@ class ContratosService:
                     for k, v in distribucion_nueva_map.items()
                 ]
                 
-                # Actualizamos el JSON de resumen en el contrato
+                # Actualizamos el JSON de resumen y su versión relacional
                 contrato.distribucion_cuentas_json = distribucion_nueva_list
+                ContratosService._sincronizar_distribucion(contrato.id, distribucion_nueva_list)
                 
-                # Aplicamos la rebaja del nuevo presupuesto
-                ProgramasService.rebajar_saldo(distribucion_nueva_list)
+                # Aplicamos la rebaja del nuevo presupuesto (misma transacción que la restitución)
+                LibroPresupuestarioService.debitar(movimientos, contrato_id=contrato.id)
 
             db.session.commit()
             return contrato
@@ -272,6 +290,74 @@ class ContratosService:
             print(f"[ContratosService] Error Actualizar: {str(e)}")
             raise e
 
+    # ==========================================================================
+    # DISTRIBUCIÓN POR CUENTA (TABLA NORMALIZADA)
+    # ==========================================================================
+
+    @staticmethod
+    def _sincronizar_distribucion(contrato_id, distribucion_list):
+        """
+        Reemplaza las filas de 'contratos_distribucion_cuentas' del contrato con la
+        distribución global [{'codigo', 'monto', 'cuenta_id'}]. No hace commit.
+        """
+        ContratoDistribucionCuenta.query.filter_by(contrato_id=contrato_id).delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(ContratoDistribucionCuenta, [
+            {'contrato_id': contrato_id, 'cuenta_id': item['cuenta_id'],
+             'codigo_cuenta': item['codigo'], 'monto': int(item['monto'])}
+            for item in distribucion_list if int(item['monto']) > 0
+        ])
+        # La colección cargada en memoria (si la hay) ya no es válida
+        contrato = db.session.identity_map.get(db.session.identity_key(ContratoHonorario, contrato_id))
+        if contrato is not None:
+            db.session.expire(contrato, ['distribucion'])
+
+    @staticmethod
+    def normalizar_distribuciones_pendientes():
+        """
+        Respaldo inicial: crea las filas de distribución de los contratos que solo
+        tienen el JSON. Si un ítem no trae 'cuenta_id', se resuelve por (programa, código).
+        Se ejecuta al iniciar la aplicación. Retorna el número de contratos migrados.
+        """
+        try:
+            pendientes = ContratoHonorario.query.filter(
+                ~ContratoHonorario.distribucion.any()
+            ).all()
+            if not pendientes:
+                return 0
+
+            mapa_cuentas = {
+                (c.programa_id, c.codigo): c.id
+                for c in CuentaPresupuestaria.query.filter(
+                    CuentaPresupuestaria.programa_id.in_({p.programa_id for p in pendientes})
+                ).all()
+            }
+
+            filas = []
+            for contrato in pendientes:
+                por_cuenta = {}
+                for item in contrato.distribucion_cuentas_json or []:
+                    cuenta_id = item.get('cuenta_id') or mapa_cuentas.get((contrato.programa_id, item.get('codigo')))
+                    monto = int(item.get('monto') or 0)
+                    if not cuenta_id or monto <= 0:
+                        continue
+                    if cuenta_id in por_cuenta:
+                        por_cuenta[cuenta_id]['monto'] += monto
+                    else:
+                        por_cuenta[cuenta_id] = {
+                            'contrato_id': contrato.id, 'cuenta_id': cuenta_id,
+                            'codigo_cuenta': item.get('codigo'), 'monto': monto
+                        }
+                filas.extend(por_cuenta.values())
+
+            db.session.bulk_insert_mappings(ContratoDistribucionCuenta, filas)
+            db.session.commit()
+            return len(pendientes)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error normalizando distribuciones de contratos: {e}")
+            return 0
+
     @staticmethod
     def generar_word_contrato(contrato_id):
         """Genera el DOCX usando la plantilla específica."""
@@ -287,15 +373,14 @@ class ContratosService:
         if not os.path.exists(plantilla_path):
              raise FileNotFoundError(f"No se encontró el archivo de plantilla: {nombre_plantilla}")
 
-        doc = DocxTemplate(plantilla_path)
         context = ContratosService._preparar_contexto_doc(contrato)
-        doc.render(context)
         
         output_filename = f"Contrato_{contrato.persona.rut.replace('.', '')}_{contrato.id}.docx"
         downloads_dir = os.path.join(root_path, 'static', 'downloads')
-        os.makedirs(downloads_dir, exist_ok=True)
         output_path = os.path.join(downloads_dir, output_filename)
-        doc.save(output_path)
+
+        # Si el mismo contrato ya se generó con la misma plantilla, se sirve desde la caché
+        CacheDocumentosService.renderizar(plantilla_path, context, output_path)
         return output_filename
 
     @staticmethod
@@ -366,94 +451,212 @@ class ContratosService:
         meses = {1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril', 5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto', 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'}
         return f"{fecha_obj.day} de {meses.get(fecha_obj.month)} de {fecha_obj.year}"
 
+    # ==========================================================================
+    # CARGA MASIVA POR LOTES
+    # ==========================================================================
+
+    # Columnas tipadas de la planilla de carga masiva
+    ESQUEMA_CARGA_MASIVA = {
+        'rut': ('texto', False),
+        'Rut Alcalde': ('texto', False),
+        'Rut Secretario': ('texto', False),
+        'programa_id': ('entero', True),
+        'tipo_id': ('entero', False),
+        'cuenta_presupuestaria': ('texto', True),
+        'Monto Total': ('entero', True),
+        'Numero de Cuotas': ('entero', True),
+        'Fecha Inicio': ('fecha', True),
+        'Fecha Termino': ('fecha', True),
+        'Fecha Contrato': ('fecha', False),
+        'fecha decreto': ('fecha', False),
+        'numero decreto': ('texto', False),
+        'Horas semanales': ('entero', False),
+    }
+
     @staticmethod
-    def procesar_carga_masiva(lector_csv):
+    def procesar_carga_masiva(archivo, progreso=None):
         """
-        Versión final compatible con planilla de 12 columnas.
+        Versión final compatible con planilla de 12 columnas (CSV o XLSX).
         Incluye búsqueda inteligente de autoridades por RUT y Cargo.
+
+        Motor por lotes:
+        1. Autoridades y tipos de contrato se cargan UNA vez; las cuentas de cada
+           programa se cargan la primera vez que aparece el programa.
+        2. Cada fila se valida contra un libro de saldos en memoria.
+        3. Contratos, cuotas y detalles se insertan en bloque, y el libro
+           presupuestario rebaja cada cuenta una vez por lote (fila bloqueada),
+           dejando un movimiento por cuota.
+        'progreso' (opcional): función (actual, total) para informar el avance.
         """
         exitos = 0
         errores = 0
-        
-        for fila in lector_csv:
-            try:
-                # Validar que venga RUT
-                if not fila.get('rut'): continue
-
-                # 1. TRADUCCIÓN DE RUT A ID (ALCALDE Y SECRETARIO)
-                # Buscamos en cfg_autoridades_firmantes basándonos en el RUT del CSV
-                # INTENTO 1: Buscar por RUT y coincidencia de texto en el Cargo
-                rut_alcalde_csv = fila.get('Rut Alcalde', '').strip()
-                rut_secretario_csv = fila.get('Rut Secretario', '').strip()
-
-                alcalde = AutoridadFirmante.query.filter(
-                    AutoridadFirmante.rut == rut_alcalde_csv,
-                    AutoridadFirmante.cargo.ilike('%Alcalde%')
-                ).first()
-                
-                # INTENTO 2 (Fallback): Si no coincide el cargo, buscar solo por RUT
-                if not alcalde:
-                    alcalde = AutoridadFirmante.query.filter_by(rut=rut_alcalde_csv).first()
+        leidas = 0
 
-                secretario = AutoridadFirmante.query.filter(
-                    AutoridadFirmante.rut == rut_secretario_csv,
-                    AutoridadFirmante.cargo.ilike('%Secretario%')
-                ).first()
+        # 1. PRE-CARGA DE CATÁLOGOS
+        autoridades_por_rut = defaultdict(list)
+        for autoridad in AutoridadFirmante.query.all():
+            autoridades_por_rut[autoridad.rut].append(autoridad)
+        tipos_validos = {t.id for t in TipoContratoHonorario.query.all()}
 
-                if not secretario:
-                    secretario = AutoridadFirmante.query.filter_by(rut=rut_secretario_csv).first()
-                
+        # Libro de saldos en memoria: (programa_id, codigo) -> {'id', 'saldo'}
+        libro = {}
+        programas_cargados = set()
+
+        with LectorTabular(archivo, esquema=ContratosService.ESQUEMA_CARGA_MASIVA) as lector:
+            for lote, errores_lote in lector.lotes():
+                for error in errores_lote:
+                    print(f"Error de formato en carga masiva: {error}")
+
+                ok, fallidos = ContratosService._crear_contratos_lote(
+                    lote, autoridades_por_rut, tipos_validos, libro, programas_cargados
+                )
+                exitos += ok
+                errores += fallidos + len(errores_lote)
+
+                leidas += len(lote) + len(errores_lote)
+                if progreso: progreso(leidas, lector.total_estimado)
+
+        if exitos:
+            DashboardService.invalidar()  # bulk_* no dispara los eventos de sesión
+        if progreso: progreso(leidas, leidas)
+        return {'exitos': exitos, 'errores': errores}
+
+    @staticmethod
+    def _resolver_autoridad(autoridades_por_rut, rut, cargo):
+        """Prioriza el rol cuyo cargo coincide (ej: 'alcalde'); si no, cualquier rol del RUT."""
+        candidatas = autoridades_por_rut.get(rut or '', [])
+        for autoridad in candidatas:
+            if cargo in (autoridad.cargo or '').lower():
+                return autoridad
+        return candidatas[0] if candidatas else None
+
+    @staticmethod
+    def _crear_contratos_lote(lote, autoridades_por_rut, tipos_validos, libro, programas_cargados):
+        """
+        Valida y persiste un lote de filas. Retorna (exitos, errores).
+        Si falla la escritura, el lote completo se revierte (BD y libro en memoria).
+        """
+        filas = [f for f in lote if f.get('rut')]
+        if not filas:
+            return 0, 0
+        errores = 0
+
+        # A. Cuentas de los programas que aparecen por primera vez (una consulta)
+        nuevos_programas = {f['programa_id'] for f in filas} - programas_cargados
+        if nuevos_programas:
+            cuentas = db.session.query(
+                CuentaPresupuestaria.id, CuentaPresupuestaria.programa_id,
+                CuentaPresupuestaria.codigo, CuentaPresupuestaria.saldo_actual
+            ).filter(CuentaPresupuestaria.programa_id.in_(nuevos_programas))
+            for c in cuentas:
+                libro[(c.programa_id, c.codigo)] = {'id': c.id, 'saldo': c.saldo_actual or 0}
+            programas_cargados |= nuevos_programas
+
+        # B. Funcionarios existentes del lote (una consulta)
+        ruts_lote = {f['rut'] for f in filas}
+        ruts_validos = {r for (r,) in db.session.query(Persona.rut).filter(Persona.rut.in_(ruts_lote))}
+
+        # C. Validación de cada fila contra el libro en memoria
+        aceptados = []
+        for fila in filas:
+            try:
+                if fila['rut'] not in ruts_validos:
+                    raise ValueError("El funcionario no existe en el maestro de personas.")
+
+                alcalde = ContratosService._resolver_autoridad(autoridades_por_rut, fila.get('Rut Alcalde'), 'alcalde')
+                secretario = ContratosService._resolver_autoridad(autoridades_por_rut, fila.get('Rut Secretario'), 'secretario')
                 if not alcalde or not secretario:
-                    raise ValueError(f"No se encontró Autoridad para: {rut_alcalde_csv} o {rut_secretario_csv}")
+                    raise ValueError(f"No se encontró Autoridad para: {fila.get('Rut Alcalde')} o {fila.get('Rut Secretario')}")
+
+                tipo_id = fila.get('tipo_id') or 1
+                if tipo_id not in tipos_validos:
+                    raise ValueError(f"Tipo de contrato {tipo_id} no existe.")
+
+                monto_total = fila['Monto Total']
+                num_cuotas = fila['Numero de Cuotas']
+                if monto_total <= 0 or num_cuotas <= 0:
+                    raise ValueError("Monto total y número de cuotas deben ser mayores a cero.")
+
+                codigo = fila['cuenta_presupuestaria']
+                cuenta = libro.get((fila['programa_id'], codigo))
+                if not cuenta:
+                    raise ValueError(f"La cuenta {codigo} no pertenece al programa seleccionado (ID {fila['programa_id']}).")
+                if cuenta['saldo'] < monto_total:
+                    raise ValueError(f"La cuenta {codigo} no tiene saldo suficiente para completar la operación.")
+
+                cuenta['saldo'] -= monto_total
+                cuotas = ProgramasService.calendario_cuotas(monto_total, num_cuotas, fila['Fecha Inicio'])
+                aceptados.append((fila, alcalde, secretario, tipo_id, codigo, cuenta, cuotas))
 
-                # 2. PROCESAMIENTO FINANCIERO BASADO EN CUOTAS MANUALES
-                monto_total = int(fila['Monto Total'])
-                num_cuotas = int(fila['Numero de Cuotas']) 
-                monto_cuota = monto_total // num_cuotas
-                
-                f_inicio = datetime.strptime(fila['Fecha Inicio'], '%Y-%m-%d').date()
-                
-                # Generamos la estructura JSON para las cuotas (Niveles 2 y 3)
-                detalle_cuotas = []
-                for i in range(num_cuotas):
-                    mes_actual = (f_inicio.month + i - 1) % 12 + 1
-                    anio_actual = f_inicio.year + (f_inicio.month + i - 1) // 12
-                    
-                    detalle_cuotas.append({
-                        "mes": mes_actual,
-                        "anio": anio_actual,
-                        "monto": monto_cuota,
-                        # NOTA: No enviamos 'cuenta_id', crear_contrato lo buscará por 'codigo'
-                        "distribucion": [{"codigo": fila['cuenta_presupuestaria'], "monto": monto_cuota}]
-                    })
-
-                # 3. MAPEO DE TODOS LOS CAMPOS DE LA TABLA
-                data_contrato = {
-                    'persona_id': fila['rut'],
-                    'programa_id': int(fila['programa_id']),
-                    'tipo_contrato_id': int(fila.get('tipo_id', 1)), 
-                    'autoridad_id': alcalde.id,
-                    'secretario_id': secretario.id,
-                    'monto_total': monto_total,
-                    'fecha_inicio': fila['Fecha Inicio'],
-                    'fecha_fin': fila['Fecha Termino'],
-                    'fecha_firma': fila.get('Fecha Contrato', fila['Fecha Inicio']),
-                    'fecha_decreto': fila.get('fecha decreto'),
-                    'numero_decreto_autoriza': fila.get('numero decreto'),
-                    'horas_semanales': int(fila.get('Horas semanales', 44)),
-                    'funciones': [fila.get('Funciones', 'Labores según convenio municipal')],
-                    'json_detalle_completo': json.dumps(detalle_cuotas)
-                }
-
-                # 4. CREACIÓN CON VALIDACIÓN INTEGRAL Y REBAJA DE SALDO
-                ContratosService.crear_contrato(data_contrato)
-                exitos += 1
-                
             except Exception as e:
-                # Log del error por consola y rollback para seguridad de la DB
                 print(f"Error procesando fila de RUT {fila.get('rut', 'desc')}: {str(e)}")
-                db.session.rollback()
                 errores += 1
-                continue
-        
-        return {'exitos': exitos, 'errores': errores}
\ No newline at end of file
+
+        if not aceptados:
+            return 0, errores
+
+        # D. Escritura en bloque: contratos -> cuotas -> detalles -> saldos
+        try:
+            contratos = []
+            for fila, alcalde, secretario, tipo_id, codigo, cuenta, cuotas in aceptados:
+                f_inicio = fila['Fecha Inicio']
+                contratos.append(ContratoHonorario(
+                    persona_id=fila['rut'],
+                    programa_id=fila['programa_id'],
+                    tipo_contrato_id=tipo_id,
+                    monto_total=fila['Monto Total'],
+                    numero_cuotas=len(cuotas),
+                    valor_mensual=0,
+                    estado='BORRADOR',
+                    horas_semanales=fila.get('Horas semanales') or 44,
+                    fecha_firma=fila.get('Fecha Contrato') or f_inicio,
+                    fecha_inicio=f_inicio,
+                    fecha_fin=fila['Fecha Termino'],
+                    fecha_decreto=fila.get('fecha decreto'),
+                    numero_decreto_autoriza=fila.get('numero decreto'),
+                    autoridad_id=alcalde.id,
+                    secretario_id=secretario.id,
+                    funciones_json=[fila.get('Funciones') or 'Labores según convenio municipal'],
+                    distribucion_cuentas_json=[
+                        {'codigo': codigo, 'monto': fila['Monto Total'], 'cuenta_id': cuenta['id']}
+                    ]
+                ))
+            db.session.bulk_save_objects(contratos, return_defaults=True)
+            db.session.bulk_insert_mappings(ContratoDistribucionCuenta, [
+                {'contrato_id': contrato.id, 'cuenta_id': cuenta['id'],
+                 'codigo_cuenta': codigo, 'monto': contrato.monto_total}
+                for contrato, (_, _, _, _, codigo, cuenta, _) in zip(contratos, aceptados)
+            ])
+
+            nuevas_cuotas = []
+            codigos_cuota = []
+            cuentas_cuota = []
+            for contrato, (_, _, _, _, codigo, cuenta, cuotas) in zip(contratos, aceptados):
+                for numero, mes, anio, monto in cuotas:
+                    nuevas_cuotas.append(ContratoCuota(
+                        contrato_id=contrato.id, numero_cuota=numero,
+                        mes=mes, anio=anio, monto=monto, estado='PENDIENTE'
+                    ))
+                    codigos_cuota.append(codigo)
+                    cuentas_cuota.append(cuenta['id'])
+            db.session.bulk_save_objects(nuevas_cuotas, return_defaults=True)
+
+            db.session.bulk_insert_mappings(ContratoCuotaDetalle, [
+                {'cuota_id': cuota.id, 'codigo_cuenta': codigo, 'monto_parcial': cuota.monto}
+                for cuota, codigo in zip(nuevas_cuotas, codigos_cuota) if cuota.monto > 0
+            ])
+
+            # Rebaja en el libro: una actualización por cuenta (con bloqueo) y un movimiento por cuota
+            LibroPresupuestarioService.debitar([
+                {'cuenta_id': cuenta_id, 'monto': cuota.monto, 'contrato_id': cuota.contrato_id, 'cuota_id': cuota.id}
+                for cuota, cuenta_id in zip(nuevas_cuotas, cuentas_cuota)
+            ], concepto='CARGA_MASIVA')
+            db.session.commit()
+            return len(aceptados), errores
+
+        except Exception as e:
+            db.session.rollback()
+            for fila, _, _, _, _, cuenta, _ in aceptados:
+                cuenta['saldo'] += fila['Monto Total']
+            print(f"[ContratosService] Error al guardar lote de contratos: {str(e)}")
+            return 0, errores + len(aceptados)
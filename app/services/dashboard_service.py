@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, exists, func, select
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models.personas import Persona
+from app.models.contratos import ContratoHonorario
+from app.models.programas import Programa, CuentaPresupuestaria
+from app.models.viaticos import EscalaViaticos
+
+
+class DashboardService:
+    """
+    KPIs de la página de inicio, calculados en UNA consulta (subconsultas escalares)
+    y guardados en memoria por DASHBOARD_CACHE_TTL segundos.
+
+    La caché se invalida al confirmar una transacción que insertó, modificó o
+    eliminó objetos de los modelos involucrados. Las cargas masivas (bulk_*) no
+    pasan por esos eventos y llaman a invalidar() directamente.
+    """
+
+    MODELOS_KPI = (Persona, ContratoHonorario, Programa, CuentaPresupuestaria, EscalaViaticos)
+
+    _datos = None
+    _expira = 0.0
+    _lock = threading.Lock()
+
+    # =======================================================
+    # CÁLCULO Y CACHÉ
+    # =======================================================
+
+    @staticmethod
+    def _calcular():
+        fila = db.session.execute(select(
+            select(func.count()).select_from(Persona).scalar_subquery().label('total_funcionarios'),
+            select(func.count()).select_from(ContratoHonorario).scalar_subquery().label('total_contratos'),
+            select(func.count()).select_from(Programa).scalar_subquery().label('total_programas'),
+            select(func.coalesce(func.sum(CuentaPresupuestaria.saldo_actual), 0)).scalar_subquery().label('saldo_total_global'),
+            exists().where(EscalaViaticos.id.isnot(None)).label('sistema_ok')
+        )).one()
+
+        return {
+            'total_funcionarios': int(fila.total_funcionarios or 0),
+            'total_contratos': int(fila.total_contratos or 0),
+            'total_programas': int(fila.total_programas or 0),
+            'saldo_total_global': int(fila.saldo_total_global or 0),
+            'sistema_ok': bool(fila.sistema_ok),
+            'calculado': datetime.now().isoformat(timespec='seconds')
+        }
+
+    @staticmethod
+    def obtener_kpis(forzar=False):
+        """KPIs vigentes; se recalculan si la caché expiró o fue invalidada."""
+        ahora = time.monotonic()
+        datos = DashboardService._datos
+        if not forzar and datos is not None and ahora < DashboardService._expira:
+            return datos
+
+        datos = DashboardService._calcular()
+        ttl = float(current_app.config.get('DASHBOARD_CACHE_TTL', 30))
+        with DashboardService._lock:
+            DashboardService._datos = datos
+            DashboardService._expira = ahora + ttl
+        return datos
+
+    @staticmethod
+    def invalidar():
+        with DashboardService._lock:
+            DashboardService._datos = None
+            DashboardService._expira = 0.0
+
+    # =======================================================
+    # INVALIDACIÓN POR EVENTOS DE SESIÓN
+    # =======================================================
+
+    @staticmethod
+    def _marcar_cambios(session, flush_context):
+        modelos = DashboardService.MODELOS_KPI
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, modelos):
+                session.info['kpis_modificados'] = True
+                return
+
+    @staticmethod
+    def _al_confirmar(session):
+        if session.info.pop('kpis_modificados', False):
+            DashboardService.invalidar()
+
+    @staticmethod
+    def _al_revertir(session, transaccion_previa):
+        session.info.pop('kpis_modificados', None)
+
+    @staticmethod
+    def registrar_eventos():
+        """Conecta la invalidación a todas las sesiones (se llama una vez en create_app)."""
+        if not event.contains(Session, 'after_flush', DashboardService._marcar_cambios):
+            event.listen(Session, 'after_flush', DashboardService._marcar_cambios)
+            event.listen(Session, 'after_commit', DashboardService._al_confirmar)
+            event.listen(Session, 'after_soft_rollback', DashboardService._al_revertir)
@@ -1,5 +1,5 @@
 import os
-from docxtpl import DocxTemplate
+from app.services.cache_documentos_service import CacheDocumentosService
 from flask import current_app
 from app.models.horas_extras import HeSolicitud, HeDiario
 from datetime import datetime
@@ -43,7 +43,8 @@ class DocumentosHeService:
                 if dia.nombre_actividad:
                     tareas_unicas.add(dia.nombre_actividad)
             
-            texto_tareas = ", ".join(tareas_unicas) if tareas_unicas else "Labores impostergables inherentes al cargo."
+            # Orden alfabético: el texto (y la clave de caché) no depende del hash del set
+            texto_tareas = ", ".join(sorted(tareas_unicas)) if tareas_unicas else "Labores impostergables inherentes al cargo."
 
             # Datos del funcionario
             fila = {
@@ -65,16 +66,11 @@ class DocumentosHeService:
         if not os.path.exists(ruta_plantilla):
             raise FileNotFoundError(f"No se encontró la plantilla en: {ruta_plantilla}")
 
-        doc = DocxTemplate(ruta_plantilla)
-        
-        # 4. Renderizar y Guardar
-        doc.render(contexto)
-        
+        # 4. Renderizar (o reutilizar desde caché) y Guardar
         nombre_salida = f"Decreto_Autoriza_HE_{solicitud.mes}_{solicitud.anio}.docx"
         ruta_salida = os.path.join(current_app.root_path, 'static', 'temp', nombre_salida)
         
-        os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
-        doc.save(ruta_salida)
+        CacheDocumentosService.renderizar(ruta_plantilla, contexto, ruta_salida)
         
         return ruta_salida, nombre_salida
 
@@ -125,15 +121,11 @@ class DocumentosHeService:
         if not os.path.exists(ruta_plantilla):
             raise FileNotFoundError(f"Falta la plantilla: {ruta_plantilla}")
 
-        doc = DocxTemplate(ruta_plantilla)
-        doc.render(contexto)
-
-        # 5. Guardar temporal
+        # 5. Guardar temporal (reutilizando la caché si el contenido no cambió)
         nombre_limpio = f"OT_{dia.id}_{resumen.rut_funcionario}.docx"
         ruta_salida = os.path.join(current_app.root_path, 'static', 'temp', nombre_limpio)
         
-        os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
-        doc.save(ruta_salida)
+        CacheDocumentosService.renderizar(ruta_plantilla, contexto, ruta_salida)
         
         return ruta_salida, nombre_limpio
 
@@ -207,14 +199,10 @@ class DocumentosHeService:
         if not os.path.exists(ruta_plantilla):
             raise FileNotFoundError(f"Falta plantilla: {ruta_plantilla}")
 
-        doc = DocxTemplate(ruta_plantilla)
-        doc.render(contexto)
-
-        # 5. Guardar
+        # 5. Guardar (reutilizando la caché si el contenido no cambió)
         nombre_archivo = f"OT_Grupal_{primer_resumen.rut_funcionario}_{len(dias)}dias.docx"
         ruta_salida = os.path.join(current_app.root_path, 'static', 'temp', nombre_archivo)
         
-        os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
-        doc.save(ruta_salida)
+        CacheDocumentosService.renderizar(ruta_plantilla, contexto, ruta_salida)
         
         return ruta_salida, nombre_archivo
\ No newline at end of file
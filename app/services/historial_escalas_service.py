@@ -0,0 +1,229 @@
+import numpy as np
+from datetime import datetime
+from app.extensions import db
+from app.models.remuneraciones import EscalaRemuneraciones, EscalaRemuneracionesHistorial
+from app.services.simulacion_remuneraciones_service import SimulacionRemuneracionesService
+
+
+class HistorialEscalasService:
+    """
+    Mantiene 'escala_remuneraciones_historial', la escala ya calculada de cada
+    periodo en formato largo (una fila por fecha, estamento, grado y haber).
+
+    - Al guardar un periodo se reescriben solo sus filas: una carga masiva con
+      cargar_periodo, una evaluación vectorizada y un bulk insert.
+    - Las series de varios años (gráficos, comparaciones) se leen con una sola
+      consulta por índice, sin recalcular fórmulas periodo a periodo.
+    - Se escribe en la MISMA transacción que el cambio de escala o de haberes
+      (escribir_periodo / escribir_todo antes del commit del llamador): si el
+      cálculo falla, el cambio completo se revierte y el historial nunca queda
+      desfasado de la escala.
+    - Al iniciar, asegurar_historial() recalcula los periodos sin historial o
+      cuyos grados no coinciden con la escala (cambios hechos fuera de la app).
+    """
+
+    TOTAL_FIJO = 'TOTAL_FIJO'
+
+    @staticmethod
+    def _fecha(valor):
+        """Las rutas entregan la vigencia como 'YYYY-MM-DD'; el historial la guarda como date."""
+        if isinstance(valor, str):
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        return valor
+
+    # =======================================================
+    # CÁLCULO DEL PERIODO
+    # =======================================================
+
+    @staticmethod
+    def _filas_periodo(fecha_vigencia):
+        """Mappings listos para bulk_insert_mappings con los montos finales del periodo."""
+        periodo = SimulacionRemuneracionesService.cargar_periodo(fecha_vigencia)
+        claves = sorted(periodo['base'])
+        if not claves:
+            return []
+
+        estamentos = [e for e, _ in claves]
+        variables = SimulacionRemuneracionesService.evaluar(periodo, [g for _, g in claves], estamentos, {})
+        _, _, total = SimulacionRemuneracionesService.totales_fijos(periodo, variables, estamentos)
+
+        # Columnas (codigo, haber_id, es_calculado, montos[K])
+        columnas = [('SUELDO_BASE', None, False, variables['SUELDO_BASE'])]
+        for h in periodo['haberes']:
+            if h.codigo == 'SUELDO_BASE':
+                continue
+            if h.es_manual:
+                montos = np.array([periodo['filas'].get(k, {}).get(h.codigo, 0) for k in claves], dtype=np.int64)
+            else:
+                montos = variables.get(h.codigo, np.zeros(len(claves), dtype=np.int64))
+            columnas.append((h.codigo, h.id, not h.es_manual, montos))
+        columnas.append((HistorialEscalasService.TOTAL_FIJO, None, True, total))
+
+        ahora = datetime.now()
+        filas = []
+        for codigo, haber_id, es_calculado, montos in columnas:
+            siempre = codigo in ('SUELDO_BASE', HistorialEscalasService.TOTAL_FIJO)
+            indices = range(len(claves)) if siempre else np.flatnonzero(montos).tolist()
+            for i in indices:
+                estamento_id, grado = claves[i]
+                filas.append({
+                    'fecha_vigencia': fecha_vigencia,
+                    'estamento_id': estamento_id,
+                    'grado': grado,
+                    'codigo': codigo,
+                    'haber_id': haber_id,
+                    'monto': int(montos[i]),
+                    'es_calculado': es_calculado,
+                    'actualizado': ahora
+                })
+        return filas
+
+    # =======================================================
+    # REFRESCO INCREMENTAL
+    # =======================================================
+
+    @staticmethod
+    def borrar_periodo(fecha_vigencia):
+        """Borra las filas del periodo sin confirmar (transacción del llamador)."""
+        fecha_vigencia = HistorialEscalasService._fecha(fecha_vigencia)
+        EscalaRemuneracionesHistorial.query \
+            .filter(EscalaRemuneracionesHistorial.fecha_vigencia == fecha_vigencia) \
+            .delete(synchronize_session=False)
+
+    @staticmethod
+    def escribir_periodo(fecha_vigencia):
+        """
+        Reescribe las filas del periodo sin confirmar: el llamador hace commit junto
+        con el cambio de escala (o rollback si algo falla). Retorna las filas escritas.
+        """
+        fecha_vigencia = HistorialEscalasService._fecha(fecha_vigencia)
+        db.session.flush()  # El cálculo debe ver los cambios pendientes de la escala
+        filas = HistorialEscalasService._filas_periodo(fecha_vigencia)
+        HistorialEscalasService.borrar_periodo(fecha_vigencia)
+        if filas:
+            db.session.bulk_insert_mappings(EscalaRemuneracionesHistorial, filas)
+        return len(filas)
+
+    @staticmethod
+    def refrescar_periodo(fecha_vigencia):
+        """escribir_periodo en su propia transacción (reparaciones al iniciar)."""
+        try:
+            total = HistorialEscalasService.escribir_periodo(fecha_vigencia)
+            db.session.commit()
+            return total
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error actualizando el historial de escalas ({fecha_vigencia}): {e}")
+            return 0
+
+    @staticmethod
+    def _fechas_registradas():
+        return [f for (f,) in db.session.query(EscalaRemuneraciones.fecha_vigencia)
+                .distinct().order_by(EscalaRemuneraciones.fecha_vigencia).all()]
+
+    @staticmethod
+    def escribir_todo():
+        """
+        Recalcula todos los periodos sin confirmar (p. ej. al cambiar una fórmula o
+        un haber, dentro de la transacción que guarda el haber).
+        """
+        total = 0
+        for fecha in HistorialEscalasService._fechas_registradas():
+            total += HistorialEscalasService.escribir_periodo(fecha)
+        return total
+
+    @staticmethod
+    def _grados_por_periodo(modelo, *filtros):
+        """{fecha_vigencia: {(estamento_id, grado)}} de la escala o del historial."""
+        grados = {}
+        filas = db.session.query(modelo.fecha_vigencia, modelo.estamento_id, modelo.grado) \
+            .filter(*filtros).distinct().all()
+        for fecha, estamento_id, grado in filas:
+            grados.setdefault(fecha, set()).add((estamento_id, grado))
+        return grados
+
+    @staticmethod
+    def asegurar_historial():
+        """
+        Al iniciar: recalcula los periodos cuyo historial falta o no tiene los mismos
+        (estamento, grado) que la escala, y borra el de periodos que ya no existen.
+        Cubre cambios hechos fuera de la aplicación; los de la app ya escriben el
+        historial en su propia transacción.
+        """
+        H = EscalaRemuneracionesHistorial
+        try:
+            escala = HistorialEscalasService._grados_por_periodo(EscalaRemuneraciones)
+            historial = HistorialEscalasService._grados_por_periodo(H, H.codigo == HistorialEscalasService.TOTAL_FIJO)
+            huerfanos = {f for (f,) in db.session.query(H.fecha_vigencia).distinct().all()} - set(escala)
+            for fecha in huerfanos:
+                HistorialEscalasService.borrar_periodo(fecha)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error verificando el historial de escalas: {e}")
+            return 0
+
+        total = 0
+        for fecha in sorted(escala):
+            if historial.get(fecha) != escala[fecha]:
+                total += HistorialEscalasService.refrescar_periodo(fecha)
+        return total
+
+    # =======================================================
+    # CONSULTAS DE SERIE
+    # =======================================================
+
+    @staticmethod
+    def totales_fijos(fecha_vigencia, claves):
+        """
+        {(estamento_id, grado): sueldo base + haberes fijos} del periodo, leído de
+        las filas TOTAL_FIJO. Las claves sin historial se calculan con el motor
+        (mismo resultado que la matriz unificada y la proyección anual).
+        """
+        fecha_vigencia = HistorialEscalasService._fecha(fecha_vigencia)
+        claves = set(claves)
+        if not claves:
+            return {}
+
+        H = EscalaRemuneracionesHistorial
+        filas = db.session.query(H.estamento_id, H.grado, H.monto).filter(
+            H.fecha_vigencia == fecha_vigencia, H.codigo == HistorialEscalasService.TOTAL_FIJO,
+            H.estamento_id.in_({e for e, _ in claves})
+        ).all()
+        totales = {(e, g): int(m) for e, g, m in filas if (e, g) in claves}
+
+        faltantes = sorted(claves - set(totales))
+        if faltantes:
+            periodo = SimulacionRemuneracionesService.cargar_periodo(fecha_vigencia)
+            faltantes = [k for k in faltantes if k in periodo['base']]
+            if faltantes:
+                estamentos = [e for e, _ in faltantes]
+                variables = SimulacionRemuneracionesService.evaluar(
+                    periodo, [g for _, g in faltantes], estamentos, {}
+                )
+                _, _, total = SimulacionRemuneracionesService.totales_fijos(periodo, variables, estamentos)
+                totales.update(zip(faltantes, (int(t) for t in total)))
+        return totales
+
+    @staticmethod
+    def serie(codigo, estamento_id=None, grado=None, desde=None, hasta=None):
+        """
+        Evolución de un haber (o 'TOTAL_FIJO') en el tiempo. Retorna
+        [{'estamento_id', 'grado', 'puntos': [{'fecha', 'monto'}]}] ordenado por fecha.
+        """
+        H = EscalaRemuneracionesHistorial
+        query = db.session.query(H.estamento_id, H.grado, H.fecha_vigencia, H.monto) \
+            .filter(H.codigo == codigo)
+        if estamento_id is not None:
+            query = query.filter(H.estamento_id == estamento_id)
+        if grado is not None:
+            query = query.filter(H.grado == grado)
+        if desde:
+            query = query.filter(H.fecha_vigencia >= desde)
+        if hasta:
+            query = query.filter(H.fecha_vigencia <= hasta)
+
+        series = {}
+        for est, g, fecha, monto in query.order_by(H.estamento_id, H.grado, H.fecha_vigencia).all():
+            series.setdefault((est, g), []).append({'fecha': fecha.isoformat(), 'monto': int(monto)})
+        return [{'estamento_id': est, 'grado': g, 'puntos': puntos} for (est, g), puntos in series.items()]
@@ -1,10 +1,14 @@
+import os
+import calendar
 from app.extensions import db
 from app.models.horas_extras import HeOrdenServicio, HePlanificacionDiaria, HeDecreto, HeConsolidadoMensual
 from app.models.turnos import HeJornadaBase, HeJornadaDetalle, HeCalendarioEspecial
-from app.models.nombramientos import Nombramiento
+from app.services.nombramientos_service import NombramientosService
 from app.services.turnos_service import TurnosService
-from datetime import datetime, timedelta, time
+from app.services.report_service import ReportService
+from datetime import date, datetime, timedelta, time
 from sqlalchemy import extract
+from sqlalchemy.orm import joinedload
 
 class HorasExtrasService:
 
@@ -216,7 +220,10 @@ class HorasExtrasService:
         """
         try:
             # 1. Obtener Datos del Funcionario (Grado y Estamento)
-            nombramiento = Nombramiento.query.filter_by(persona_id=rut_funcionario, estado='VIGENTE').first()
+            # Vigente al cierre del mes (o al inicio, si terminó durante el mes)
+            ultimo_dia = calendar.monthrange(anio, mes)[1]
+            nombramiento = NombramientosService.nombramiento_vigente(rut_funcionario, date(anio, mes, ultimo_dia)) \
+                or NombramientosService.nombramiento_vigente(rut_funcionario, date(anio, mes, 1))
             if not nombramiento:
                 return False, "Funcionario sin nombramiento vigente."
 
@@ -294,4 +301,52 @@ class HorasExtrasService:
 
         except Exception as e:
             db.session.rollback()
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)
+    # ==========================================================================
+    # DECRETO MASIVO DE PAGO
+    # ==========================================================================
+
+    @staticmethod
+    def generar_decreto_pago(anio, mes, numero_decreto, fecha_decreto, id_alcalde, id_secretario):
+        """
+        Crea el decreto de PAGO del mes, vincula los consolidados con monto a pagar
+        y genera el documento Word. Retorna (decreto, ruta_archivo).
+        Lanza ValueError si no hay registros a pagar.
+        """
+        try:
+            consolidados = HeConsolidadoMensual.query.filter(
+                HeConsolidadoMensual.anio == anio,
+                HeConsolidadoMensual.mes == mes,
+                HeConsolidadoMensual.monto_total_pagar > 0,
+                HeConsolidadoMensual.estado.in_(['CALCULADO', 'REVISADO', 'EN_DECRETO'])
+            ).options(joinedload(HeConsolidadoMensual.funcionario)).all()
+
+            if not consolidados:
+                raise ValueError("No hay registros calculados con monto a pagar.")
+
+            nuevo_decreto = HeDecreto(
+                tipo_decreto='PAGO',
+                numero_decreto=numero_decreto,
+                fecha_decreto=fecha_decreto,
+                descripcion=f"PAGO HORAS EXTRAS {mes}/{anio}",
+                id_firmante_alcalde=id_alcalde,
+                id_firmante_secretario=id_secretario,
+                estado='BORRADOR'
+            )
+            db.session.add(nuevo_decreto)
+            db.session.flush()
+
+            for item in consolidados:
+                item.id_decreto_pago = nuevo_decreto.id
+                item.estado = 'EN_DECRETO'
+
+            # Generar Word Físico y guardar el nombre para el historial
+            path_archivo = ReportService.generar_nomina_pago_word(anio, mes, consolidados, nuevo_decreto)
+            nuevo_decreto.archivo_digital = os.path.basename(path_archivo)
+
+            db.session.commit()
+            return nuevo_decreto, path_archivo
+
+        except Exception as e:
+            db.session.rollback()
+            raise e
@@ -0,0 +1,300 @@
+import codecs
+import csv
+import io
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+from openpyxl import load_workbook
+
+
+class LectorTabular:
+    """
+    Lector en streaming para las cargas masivas (CSV o XLSX), con memoria constante.
+
+    - El formato se decide por la firma del contenido (ZIP = XLSX) y la extensión;
+      .xls (Excel 97-2003) y extensiones desconocidas se rechazan con ValueError.
+    - CSV: valida la codificación sobre el archivo completo (UTF-8 con/sin BOM, si no
+      Latin-1), detecta el separador (; , tab |) con una muestra del inicio y luego
+      recorre el archivo línea a línea con decodificación estricta.
+    - XLSX: usa openpyxl en modo 'read_only', que itera las filas sin cargar la hoja.
+    - Entrega registros tipados y validados según un 'esquema', en lotes de tamaño fijo.
+
+    Uso:
+        with LectorTabular(archivo, esquema={'rut': ('texto', True)}) as lector:
+            for registros, errores in lector.lotes():
+                ...
+    Cada registro es un dict {columna: valor} más '_fila' (número de fila en el archivo).
+    """
+
+    TAMANO_MUESTRA = 64 * 1024
+    FIRMA_ZIP = b'PK\x03\x04'
+    FIRMA_OLE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    EXTENSIONES_XLSX = ('.xlsx', '.xlsm')
+    EXTENSIONES_CSV = ('.csv', '.txt')
+    SEPARADORES = ';,\t|'
+    FORMATOS_FECHA = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d']
+    FORMATOS_HORA = ['%H:%M', '%H:%M:%S']
+    VALORES_VERDADEROS = {'si', 'sí', 'yes', '1', 'true', 's', 'x'}
+
+    def __init__(self, archivo, nombre=None, esquema=None, normalizar_columnas=None, tamano_lote=1000):
+        """
+        Args:
+            archivo: ruta, FileStorage de Flask u objeto binario abierto.
+            nombre: nombre original (para detectar el formato por extensión).
+            esquema (dict): {columna: (tipo, requerido)}; tipos: texto, entero, decimal,
+                            fecha, hora, bool. Las columnas fuera del esquema pasan sin cambios.
+            normalizar_columnas: función aplicada a cada encabezado (ej: minúsculas).
+        """
+        self.esquema = esquema or {}
+        self.normalizar_columnas = normalizar_columnas
+        self.tamano_lote = tamano_lote
+        self.columnas = []
+        self.total_estimado = None
+
+        self._propio = False
+        if isinstance(archivo, str):
+            nombre = nombre or archivo
+            archivo = open(archivo, 'rb')
+            self._propio = True
+        else:
+            nombre = nombre or getattr(archivo, 'filename', None) or getattr(archivo, 'name', '') or ''
+            archivo = getattr(archivo, 'stream', archivo)  # FileStorage -> stream binario
+
+        self._binario = archivo
+        self._libro = None
+        try:
+            self.formato = self._detectar_formato(str(nombre))
+        except ValueError:
+            self.cerrar()
+            raise
+
+    # =======================================================
+    # CONTEXTO
+    # =======================================================
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+    def cerrar(self):
+        if self._libro is not None:
+            self._libro.close()
+            self._libro = None
+        if self._propio:
+            self._binario.close()
+
+    # =======================================================
+    # DETECCIÓN DE FORMATO Y CODIFICACIÓN
+    # =======================================================
+
+    def _detectar_formato(self, nombre):
+        """'xlsx' o 'csv' según la firma del contenido y la extensión."""
+        self._binario.seek(0)
+        cabecera = self._binario.read(len(self.FIRMA_OLE))
+        self._binario.seek(0)
+
+        nombre = nombre.lower()
+        extension = nombre[nombre.rfind('.'):] if '.' in nombre else ''
+        if cabecera.startswith(self.FIRMA_ZIP):
+            return 'xlsx'
+        if cabecera.startswith(self.FIRMA_OLE) or extension == '.xls':
+            raise ValueError("Formato Excel 97-2003 (.xls) no soportado. Guarde el archivo como .xlsx o .csv.")
+        if extension in self.EXTENSIONES_XLSX:
+            raise ValueError("El archivo no es un Excel (.xlsx) válido.")
+        if extension and extension not in self.EXTENSIONES_CSV:
+            raise ValueError(f"Extensión '{extension}' no soportada. Use .csv o .xlsx.")
+        return 'csv'
+
+    def _detectar_codificacion(self):
+        """
+        Recorre el archivo completo con un decodificador UTF-8 incremental (memoria
+        constante): si algún byte no es UTF-8 válido se usa Latin-1, que decodifica
+        cualquier byte. Con BOM UTF-8 el contenido debe ser UTF-8 válido.
+        """
+        self._binario.seek(0)
+        con_bom = self._binario.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8
+        self._binario.seek(0)
+
+        decodificador = codecs.getincrementaldecoder('utf-8')()
+        leidos = 0
+        try:
+            while True:
+                bloque = self._binario.read(self.TAMANO_MUESTRA)
+                decodificador.decode(bloque, final=not bloque)
+                if not bloque:
+                    break
+                leidos += len(bloque)
+        except UnicodeDecodeError as e:
+            if con_bom:
+                raise ValueError(f"El archivo declara UTF-8 pero tiene bytes inválidos (posición {leidos + e.start}).")
+            return 'latin-1'
+        finally:
+            self._binario.seek(0)
+        return 'utf-8-sig' if con_bom else 'utf-8'
+
+    # =======================================================
+    # LECTURA DE FILAS CRUDAS
+    # =======================================================
+
+    def _filas_csv(self):
+        codificacion = self._detectar_codificacion()
+        muestra = self._binario.read(self.TAMANO_MUESTRA)
+        self._binario.seek(0)
+
+        # La muestra puede cortar un carácter multibyte al final: solo ahí se ignora
+        texto_muestra = muestra.decode(codificacion, errors='ignore')
+        try:
+            separador = csv.Sniffer().sniff(texto_muestra, delimiters=self.SEPARADORES).delimiter
+        except csv.Error:
+            separador = ';'  # Estándar de Excel configurado para Chile
+
+        # Estimación del total a partir del tamaño del archivo y las líneas de la muestra
+        lineas_muestra = texto_muestra.count('\n')
+        try:
+            self._binario.seek(0, io.SEEK_END)
+            tamano = self._binario.tell()
+            self._binario.seek(0)
+        except (AttributeError, OSError):
+            tamano = None
+        if tamano and lineas_muestra and muestra:
+            self.total_estimado = max(0, int(tamano * lineas_muestra / len(muestra)) - 1)
+
+        # Decodificación incremental y estricta (la codificación ya se validó completa)
+        texto = codecs.getreader(codificacion)(self._binario)
+        lector = csv.reader(texto, delimiter=separador)
+        for fila in lector:
+            yield fila
+
+    def _filas_xlsx(self):
+        self._libro = load_workbook(self._binario, read_only=True, data_only=True)
+        hoja = self._libro.active
+        if hoja.max_row:
+            self.total_estimado = max(0, hoja.max_row - 1)
+        for fila in hoja.iter_rows(values_only=True):
+            yield fila
+
+    def filas(self):
+        """Itera (numero_fila, dict) sin tipar, omitiendo filas completamente vacías."""
+        origen = self._filas_xlsx() if self.formato == 'xlsx' else self._filas_csv()
+
+        encabezado = next(origen, None)
+        if encabezado is None:
+            return
+        columnas = [str(c).strip() if c is not None else '' for c in encabezado]
+        if self.normalizar_columnas:
+            columnas = [self.normalizar_columnas(c) for c in columnas]
+        self.columnas = columnas
+
+        for n, valores in enumerate(origen, start=2):
+            if not any(v not in (None, '') for v in valores):
+                continue
+            yield n, dict(zip(columnas, valores))
+
+    # =======================================================
+    # CONVERSIÓN DE TIPOS
+    # =======================================================
+
+    @staticmethod
+    def _vacio(valor):
+        return valor is None or (isinstance(valor, str) and valor.strip() == '')
+
+    @classmethod
+    def convertir(cls, valor, tipo):
+        """Convierte un valor de celda al tipo indicado. Lanza ValueError si no es válido."""
+        if cls._vacio(valor):
+            return None
+
+        if tipo == 'texto':
+            if isinstance(valor, float) and valor.is_integer():
+                valor = int(valor)  # Excel guarda '12345678' como 12345678.0
+            return str(valor).strip()
+
+        if tipo == 'entero':
+            if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+                return int(valor)
+            texto = str(valor).strip().replace('$', '').replace('.', '').replace(' ', '')
+            try:
+                return int(texto.split(',')[0])
+            except ValueError:
+                raise ValueError(f"'{valor}' no es un número entero")
+
+        if tipo == 'decimal':
+            if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+                return Decimal(str(valor))
+            texto = str(valor).strip().replace(' ', '')
+            if ',' in texto:
+                texto = texto.replace('.', '').replace(',', '.')
+            try:
+                return Decimal(texto)
+            except InvalidOperation:
+                raise ValueError(f"'{valor}' no es un número")
+
+        if tipo == 'fecha':
+            if isinstance(valor, datetime):
+                return valor.date()
+            if isinstance(valor, date):
+                return valor
+            texto = str(valor).strip()
+            for formato in cls.FORMATOS_FECHA:
+                try:
+                    return datetime.strptime(texto, formato).date()
+                except ValueError:
+                    continue
+            raise ValueError(f"'{valor}' no es una fecha válida")
+
+        if tipo == 'hora':
+            if isinstance(valor, datetime):
+                return valor.time()
+            if isinstance(valor, time):
+                return valor
+            texto = str(valor).strip()
+            for formato in cls.FORMATOS_HORA:
+                try:
+                    return datetime.strptime(texto, formato).time()
+                except ValueError:
+                    continue
+            raise ValueError(f"'{valor}' no es una hora válida")
+
+        if tipo == 'bool':
+            return str(valor).strip().lower() in cls.VALORES_VERDADEROS
+
+        raise ValueError(f"Tipo de columna desconocido: {tipo}")
+
+    def _tipar(self, n, fila):
+        """Aplica el esquema a una fila. Retorna (registro, error)."""
+        registro = dict(fila)
+        registro['_fila'] = n
+        for columna, (tipo, requerido) in self.esquema.items():
+            try:
+                valor = self.convertir(fila.get(columna), tipo)
+            except (ValueError, TypeError) as e:
+                return None, f"Fila {n}: Columna '{columna}' inválida ({e})."
+            if valor is None and requerido:
+                return None, f"Fila {n}: Columna '{columna}' vacía."
+            registro[columna] = valor
+        return registro, None
+
+    # =======================================================
+    # LOTES
+    # =======================================================
+
+    def lotes(self):
+        """Itera (registros, errores) en bloques de 'tamano_lote' filas."""
+        registros, errores = [], []
+        leidas = 0
+        for n, fila in self.filas():
+            registro, error = self._tipar(n, fila)
+            if error:
+                errores.append(error)
+            else:
+                registros.append(registro)
+            leidas += 1
+
+            if leidas >= self.tamano_lote:
+                yield registros, errores
+                registros, errores = [], []
+                leidas = 0
+
+        if leidas:
+            yield registros, errores
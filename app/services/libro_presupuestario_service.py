@@ -0,0 +1,363 @@
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import case, exists, func
+from sqlalchemy.orm import joinedload
+from app.extensions import db
+from app.models.programas import CuentaPresupuestaria, MovimientoPresupuestario, CortePresupuestario
+from app.models.contratos import ContratoHonorario
+
+
+class LibroPresupuestarioService:
+    """
+    Libro de saldos presupuestarios seguro ante concurrencia.
+
+    Toda rebaja o restitución de 'saldo_actual' pasa por aquí:
+    1. Las cuentas involucradas se bloquean con SELECT ... FOR UPDATE, siempre en
+       orden ascendente de id (dos procesos nunca se bloquean en orden cruzado).
+    2. El saldo se valida y actualiza con el valor bloqueado, no con uno leído antes.
+    3. Cada variación queda como un movimiento en 'movimientos_presupuestarios'.
+
+    Los métodos NO hacen commit: el llamador confirma todo en su transacción
+    (contrato + cuotas + saldos), y el bloqueo dura hasta ese commit.
+
+    Cada CORTE_CADA movimientos de una cuenta se guarda un corte (saldo y totales
+    acumulados), así los totales de un periodo nunca suman más de CORTE_CADA filas.
+    """
+
+    CORTE_CADA = 200
+
+    # =======================================================
+    # BLOQUEO Y CONSULTA
+    # =======================================================
+
+    @staticmethod
+    def _bloquear_cuentas(cuenta_ids):
+        """Bloquea las cuentas (orden por id) y retorna {id: CuentaPresupuestaria} con el saldo vigente."""
+        if not cuenta_ids:
+            return {}
+        # Los cambios pendientes se envían antes: populate_existing no debe descartarlos
+        db.session.flush()
+        cuentas = CuentaPresupuestaria.query \
+            .filter(CuentaPresupuestaria.id.in_(sorted(set(cuenta_ids)))) \
+            .order_by(CuentaPresupuestaria.id) \
+            .populate_existing() \
+            .with_for_update() \
+            .all()
+        return {c.id: c for c in cuentas}
+
+    @staticmethod
+    def saldo_disponible(cuenta_id, bloquear=False):
+        """
+        Saldo vigente de la cuenta leído desde la BD (no desde objetos en memoria).
+        Con bloquear=True la fila queda reservada hasta el fin de la transacción.
+        """
+        query = db.session.query(CuentaPresupuestaria.saldo_actual).filter(CuentaPresupuestaria.id == cuenta_id)
+        if bloquear:
+            query = query.with_for_update()
+        saldo = query.scalar()
+        return int(saldo or 0)
+
+    # =======================================================
+    # MOVIMIENTOS
+    # =======================================================
+
+    @staticmethod
+    def _normalizar(items):
+        """
+        Acepta dicts {'cuenta_id', 'monto', ['contrato_id', 'cuota_id', 'glosa']} o tuplas (cuenta_id, monto).
+        Descarta montos en cero.
+        """
+        normalizados = []
+        for item in items:
+            if isinstance(item, dict):
+                cuenta_id, monto = item.get('cuenta_id'), int(item.get('monto') or 0)
+                extra = {'contrato_id': item.get('contrato_id'), 'cuota_id': item.get('cuota_id'),
+                         'glosa': item.get('glosa')}
+            else:
+                cuenta_id, monto = item[0], int(item[1] or 0)
+                extra = {'contrato_id': None, 'cuota_id': None, 'glosa': None}
+            if not cuenta_id:
+                raise ValueError("Movimiento presupuestario sin cuenta asociada.")
+            if monto < 0:
+                raise ValueError("El monto de un movimiento no puede ser negativo.")
+            if monto > 0:
+                normalizados.append((int(cuenta_id), monto, extra))
+        return normalizados
+
+    @staticmethod
+    def _registrar(tipo, items, concepto, contrato_id=None, glosa=None):
+        movimientos = LibroPresupuestarioService._normalizar(items)
+        if not movimientos:
+            return []
+
+        # Total por cuenta (una sola actualización por cuenta)
+        totales = OrderedDict()
+        for cuenta_id, monto, _ in movimientos:
+            totales[cuenta_id] = totales.get(cuenta_id, 0) + monto
+
+        cuentas = LibroPresupuestarioService._bloquear_cuentas(totales.keys())
+        faltantes = [cid for cid in totales if cid not in cuentas]
+        if faltantes:
+            raise ValueError(f"Cuenta(s) presupuestaria(s) inexistente(s): {faltantes}")
+
+        if tipo == 'DEBITO':
+            for cuenta_id, total in totales.items():
+                cuenta = cuentas[cuenta_id]
+                if (cuenta.saldo_actual or 0) < total:
+                    raise ValueError(
+                        f"La cuenta {cuenta.codigo} no tiene saldo suficiente para completar la operación "
+                        f"(Disponible: ${cuenta.saldo_actual or 0:,.0f} | Requerido: ${total:,.0f})."
+                    )
+
+        # Aplicación y asiento de cada movimiento (saldo resultante secuencial)
+        ahora = datetime.now()
+        signo = -1 if tipo == 'DEBITO' else 1
+        registros = []
+        for cuenta_id, monto, extra in movimientos:
+            cuenta = cuentas[cuenta_id]
+            cuenta.saldo_actual = (cuenta.saldo_actual or 0) + signo * monto
+            registros.append({
+                'cuenta_id': cuenta_id,
+                'tipo': tipo,
+                'concepto': concepto,
+                'monto': monto,
+                'saldo_resultante': cuenta.saldo_actual,
+                'contrato_id': extra['contrato_id'] or contrato_id,
+                'cuota_id': extra['cuota_id'],
+                'glosa': extra['glosa'] or glosa,
+                'fecha': ahora
+            })
+
+        db.session.flush()
+        db.session.bulk_insert_mappings(MovimientoPresupuestario, registros)
+        LibroPresupuestarioService._actualizar_cortes(totales.keys())
+        return registros
+
+    @staticmethod
+    def debitar(items, concepto='CONTRATO', contrato_id=None, glosa=None):
+        """
+        Rebaja saldo. Valida (con la fila bloqueada) que ninguna cuenta quede negativa;
+        si alguna no alcanza, lanza ValueError y no se aplica nada.
+        """
+        return LibroPresupuestarioService._registrar('DEBITO', items, concepto, contrato_id, glosa)
+
+    @staticmethod
+    def acreditar(items, concepto='RESTITUCION', contrato_id=None, glosa=None):
+        """Restituye o suplementa saldo."""
+        return LibroPresupuestarioService._registrar('CREDITO', items, concepto, contrato_id, glosa)
+
+    # =======================================================
+    # CORTES DE SALDO (CADA CORTE_CADA MOVIMIENTOS)
+    # =======================================================
+
+    @staticmethod
+    def _ultimo_corte(cuenta_id, limite=None):
+        """Último corte de la cuenta (opcionalmente anterior a 'limite')."""
+        query = CortePresupuestario.query.filter(CortePresupuestario.cuenta_id == cuenta_id)
+        if limite is not None:
+            query = query.filter(CortePresupuestario.fecha < limite)
+        return query.order_by(CortePresupuestario.fecha.desc(), CortePresupuestario.movimiento_id.desc()).first()
+
+    @staticmethod
+    def _actualizar_cortes(cuenta_ids):
+        """
+        Agrega los cortes que falten: uno por cada CORTE_CADA movimientos desde el último.
+        Se llama con las cuentas ya bloqueadas, dentro de la misma transacción.
+        """
+        M = MovimientoPresupuestario
+        cada = LibroPresupuestarioService.CORTE_CADA
+        nuevos = []
+        for cuenta_id in cuenta_ids:
+            corte = LibroPresupuestarioService._ultimo_corte(cuenta_id)
+            desde_id = corte.movimiento_id if corte else 0
+
+            pendientes = db.session.query(func.count(M.id)) \
+                .filter(M.cuenta_id == cuenta_id, M.id > desde_id).scalar()
+            if pendientes < cada:
+                continue
+
+            debitos = corte.total_debitos if corte else 0
+            creditos = corte.total_creditos if corte else 0
+            n = corte.n_movimientos if corte else 0
+            filas = db.session.query(M.id, M.tipo, M.monto, M.saldo_resultante, M.fecha) \
+                .filter(M.cuenta_id == cuenta_id, M.id > desde_id) \
+                .order_by(M.id).all()
+            for i, fila in enumerate(filas, start=1):
+                if fila.tipo == 'DEBITO':
+                    debitos += fila.monto
+                else:
+                    creditos += fila.monto
+                if i % cada == 0:
+                    nuevos.append({
+                        'cuenta_id': cuenta_id, 'movimiento_id': fila.id, 'fecha': fila.fecha,
+                        'saldo': fila.saldo_resultante, 'total_debitos': debitos,
+                        'total_creditos': creditos, 'n_movimientos': n + i
+                    })
+
+        if nuevos:
+            db.session.bulk_insert_mappings(CortePresupuestario, nuevos)
+
+    # =======================================================
+    # CONSULTAS (CARTOLA Y SALDOS POR PERIODO)
+    # =======================================================
+
+    @staticmethod
+    def _limite(fecha):
+        """Una fecha (date) incluye el día completo: el límite es el inicio del día siguiente."""
+        if isinstance(fecha, datetime):
+            return fecha
+        return datetime.combine(fecha + timedelta(days=1), time.min)
+
+    @staticmethod
+    def acumulados_antes(cuenta_id, limite):
+        """
+        Saldo y totales acumulados (débitos/créditos) de la cuenta con todos los
+        movimientos anteriores a 'limite' (datetime). Parte del último corte y
+        suma solo los movimientos posteriores a él.
+        """
+        M = MovimientoPresupuestario
+        corte = LibroPresupuestarioService._ultimo_corte(cuenta_id, limite)
+
+        query = db.session.query(
+            func.coalesce(func.sum(case((M.tipo == 'DEBITO', M.monto), else_=0)), 0),
+            func.coalesce(func.sum(case((M.tipo == 'CREDITO', M.monto), else_=0)), 0)
+        ).filter(M.cuenta_id == cuenta_id, M.fecha < limite)
+        if corte:
+            query = query.filter(M.fecha >= corte.fecha, M.id > corte.movimiento_id)
+        debitos, creditos = query.one()
+
+        ultimo = db.session.query(M.saldo_resultante) \
+            .filter(M.cuenta_id == cuenta_id, M.fecha < limite) \
+            .order_by(M.fecha.desc(), M.id.desc()).limit(1).scalar()
+
+        return {
+            'saldo': int(ultimo or 0),
+            'debitos': int(debitos) + (corte.total_debitos if corte else 0),
+            'creditos': int(creditos) + (corte.total_creditos if corte else 0)
+        }
+
+    @staticmethod
+    def saldo_al(cuenta_id, fecha):
+        """Saldo de la cuenta al cierre de 'fecha' (date) o en el instante indicado (datetime)."""
+        M = MovimientoPresupuestario
+        saldo = db.session.query(M.saldo_resultante) \
+            .filter(M.cuenta_id == cuenta_id, M.fecha < LibroPresupuestarioService._limite(fecha)) \
+            .order_by(M.fecha.desc(), M.id.desc()).limit(1).scalar()
+        return int(saldo or 0)
+
+    @staticmethod
+    def resumen_periodo(cuenta_ids, desde, hasta):
+        """
+        Por cuenta: saldo inicial, débitos, créditos y saldo final entre 'desde' y
+        'hasta' (fechas inclusive). Retorna {cuenta_id: dict}.
+        """
+        inicio = datetime.combine(desde, time.min) if not isinstance(desde, datetime) else desde
+        fin = LibroPresupuestarioService._limite(hasta)
+
+        resumen = {}
+        for cuenta_id in cuenta_ids:
+            antes = LibroPresupuestarioService.acumulados_antes(cuenta_id, inicio)
+            al_cierre = LibroPresupuestarioService.acumulados_antes(cuenta_id, fin)
+            resumen[cuenta_id] = {
+                'saldo_inicial': antes['saldo'],
+                'debitos': al_cierre['debitos'] - antes['debitos'],
+                'creditos': al_cierre['creditos'] - antes['creditos'],
+                'saldo_final': al_cierre['saldo']
+            }
+        return resumen
+
+    @staticmethod
+    def cartola(cuenta_ids, desde=None, hasta=None, limite=500):
+        """
+        Movimientos de las cuentas (más recientes primero) con contrato y persona
+        precargados. Cada cuenta se lee como un rango del índice (cuenta_id, fecha).
+        """
+        M = MovimientoPresupuestario
+        if not cuenta_ids:
+            return []
+        query = M.query.options(joinedload(M.contrato).joinedload(ContratoHonorario.persona)) \
+            .filter(M.cuenta_id.in_(list(cuenta_ids)))
+        if desde:
+            query = query.filter(M.fecha >= (desde if isinstance(desde, datetime) else datetime.combine(desde, time.min)))
+        if hasta:
+            query = query.filter(M.fecha < LibroPresupuestarioService._limite(hasta))
+        return query.order_by(M.fecha.desc(), M.id.desc()).limit(limite).all()
+
+    # =======================================================
+    # APERTURA DEL LIBRO (CUENTAS SIN MOVIMIENTOS)
+    # =======================================================
+
+    @staticmethod
+    def abrir_cuentas_pendientes():
+        """
+        Reconstruye el libro de las cuentas que aún no tienen movimientos (creadas
+        antes de existir el libro): APERTURA por el monto inicial, un DEBITO por cada
+        contrato según su 'distribucion_cuentas_json' y, si no cuadra con el saldo
+        actual, un AJUSTE final. Se ejecuta al iniciar; el JSON se lee solo esta vez.
+        """
+        M = MovimientoPresupuestario
+        try:
+            cuentas = CuentaPresupuestaria.query \
+                .options(joinedload(CuentaPresupuestaria.programa)) \
+                .filter(~exists().where(M.cuenta_id == CuentaPresupuestaria.id)) \
+                .order_by(CuentaPresupuestaria.id).all()
+            if not cuentas:
+                return 0
+
+            contratos_por_programa = defaultdict(list)
+            for contrato in ContratoHonorario.query \
+                    .filter(ContratoHonorario.programa_id.in_({c.programa_id for c in cuentas})) \
+                    .order_by(ContratoHonorario.id).all():
+                contratos_por_programa[contrato.programa_id].append(contrato)
+
+            ahora = datetime.now()
+            registros = []
+            for cuenta in cuentas:
+                decreto = cuenta.programa.fecha_decreto if cuenta.programa else None
+                apertura = datetime.combine(decreto, time.min) if isinstance(decreto, date) else ahora
+
+                debitos = []
+                for contrato in contratos_por_programa[cuenta.programa_id]:
+                    for item in contrato.distribucion_cuentas_json or []:
+                        if item.get('cuenta_id') == cuenta.id or \
+                                (not item.get('cuenta_id') and item.get('codigo') == cuenta.codigo):
+                            f_contrato = contrato.fecha_firma or contrato.fecha_inicio
+                            fecha = datetime.combine(f_contrato, time.min) if f_contrato else apertura
+                            debitos.append((max(fecha, apertura), contrato.id, int(item.get('monto') or 0)))
+                debitos.sort(key=lambda d: (d[0], d[1]))
+
+                saldo = int(cuenta.monto_inicial or 0)
+                registros.append({
+                    'cuenta_id': cuenta.id, 'tipo': 'CREDITO', 'concepto': 'APERTURA', 'monto': saldo,
+                    'saldo_resultante': saldo, 'contrato_id': None, 'cuota_id': None,
+                    'glosa': 'Apertura del libro (reconstruido)', 'fecha': apertura
+                })
+                for fecha, contrato_id, monto in debitos:
+                    if monto <= 0:
+                        continue
+                    saldo -= monto
+                    registros.append({
+                        'cuenta_id': cuenta.id, 'tipo': 'DEBITO', 'concepto': 'CONTRATO', 'monto': monto,
+                        'saldo_resultante': saldo, 'contrato_id': contrato_id, 'cuota_id': None,
+                        'glosa': None, 'fecha': fecha
+                    })
+
+                diferencia = int(cuenta.saldo_actual or 0) - saldo
+                if diferencia:
+                    saldo += diferencia
+                    registros.append({
+                        'cuenta_id': cuenta.id, 'tipo': 'CREDITO' if diferencia > 0 else 'DEBITO',
+                        'concepto': 'AJUSTE', 'monto': abs(diferencia), 'saldo_resultante': saldo,
+                        'contrato_id': None, 'cuota_id': None,
+                        'glosa': 'Cuadratura con el saldo vigente', 'fecha': ahora
+                    })
+
+            db.session.bulk_insert_mappings(M, registros)
+            LibroPresupuestarioService._actualizar_cortes([c.id for c in cuentas])
+            db.session.commit()
+            return len(cuentas)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error abriendo el libro presupuestario: {e}")
+            return 0
@@ -1,10 +1,101 @@
+from flask import g, has_app_context
+from sqlalchemy.orm import joinedload
 from app.extensions import db
 from app.models.nombramientos import Nombramiento
 from app.models.catalogos import CatEstamento 
-from datetime import datetime
+from datetime import date, datetime
 
 class NombramientosService:
 
+    # Tamaño máximo de la lista IN al resolver muchos RUT a la vez
+    LOTE_RUTS = 1000
+
+    # =======================================================
+    # RESOLUCIÓN DEL NOMBRAMIENTO VIGENTE
+    # =======================================================
+
+    @staticmethod
+    def _memo():
+        """
+        RUT -> nombramientos VIGENTES de la persona, memorizados en flask.g durante
+        la petición (o el trabajo en segundo plano). Sin contexto no se memoriza.
+        """
+        if not has_app_context():
+            return {}
+        return g.setdefault('nombramientos_vigentes', {})
+
+    @staticmethod
+    def _clave(rut):
+        return (rut or '').strip().upper()
+
+    @staticmethod
+    def _cargar(ruts):
+        """Carga en una consulta por lote los RUT que aún no están en la memoria."""
+        memo = NombramientosService._memo()
+        faltantes = list({NombramientosService._clave(r) for r in ruts} - set(memo))
+        for inicio in range(0, len(faltantes), NombramientosService.LOTE_RUTS):
+            lote = faltantes[inicio:inicio + NombramientosService.LOTE_RUTS]
+            for rut in lote:
+                memo[rut] = []
+            encontrados = Nombramiento.query.options(
+                joinedload(Nombramiento.estamento), joinedload(Nombramiento.unidad)
+            ).filter(
+                Nombramiento.persona_id.in_(lote),
+                Nombramiento.estado == 'VIGENTE'
+            ).all()
+            for n in encontrados:
+                memo.setdefault(NombramientosService._clave(n.persona_id), []).append(n)
+        return memo
+
+    @staticmethod
+    def elegir_vigente(nombramientos, fecha):
+        """
+        Entre los nombramientos dados, el VIGENTE cuyo periodo cubre 'fecha'
+        (si hay varios, el de inicio más reciente).
+        """
+        candidatos = [
+            n for n in nombramientos
+            if n.estado == 'VIGENTE' and n.fecha_inicio <= fecha
+            and (n.fecha_fin is None or n.fecha_fin >= fecha)
+        ]
+        return max(candidatos, key=lambda n: (n.fecha_inicio, n.id)) if candidatos else None
+
+    @staticmethod
+    def _fecha(fecha):
+        if fecha is None:
+            return date.today()
+        return fecha.date() if isinstance(fecha, datetime) else fecha
+
+    @staticmethod
+    def nombramiento_vigente(rut, fecha=None):
+        """Nombramiento vigente de 'rut' a 'fecha' (hoy por defecto), o None."""
+        fecha = NombramientosService._fecha(fecha)
+        memo = NombramientosService._cargar([rut])
+        return NombramientosService.elegir_vigente(memo.get(NombramientosService._clave(rut), []), fecha)
+
+    @staticmethod
+    def nombramientos_vigentes(ruts, fecha=None):
+        """Versión por lote: {rut: nombramiento o None} con una consulta cada LOTE_RUTS."""
+        fecha = NombramientosService._fecha(fecha)
+        memo = NombramientosService._cargar(ruts)
+        return {
+            rut: NombramientosService.elegir_vigente(memo.get(NombramientosService._clave(rut), []), fecha)
+            for rut in ruts
+        }
+
+    @staticmethod
+    def olvidar_vigentes(rut=None):
+        """Descarta lo memorizado (de un RUT o completo) tras modificar nombramientos."""
+        memo = NombramientosService._memo()
+        if rut is None:
+            memo.clear()
+        else:
+            memo.pop(NombramientosService._clave(rut), None)
+
+    # =======================================================
+    # CONSULTAS Y MANTENCIÓN
+    # =======================================================
+
     @staticmethod
     def listar_todos():
         """
@@ -74,6 +165,7 @@ class NombramientosService:
 
             db.session.add(nuevo_nombramiento)
             db.session.commit()
+            NombramientosService.olvidar_vigentes(rut)
             return nuevo_nombramiento
 
         except ValueError as ve:
@@ -127,6 +219,7 @@ class NombramientosService:
                 nombramiento.fecha_fin = None
 
             db.session.commit()
+            NombramientosService.olvidar_vigentes(nombramiento.persona_id)
             return nombramiento
 
         except ValueError as ve:
@@ -152,6 +245,7 @@ class NombramientosService:
                 nombramiento.fecha_fin = datetime.strptime(fecha_termino, '%Y-%m-%d').date()
             
             db.session.commit()
+            NombramientosService.olvidar_vigentes(nombramiento.persona_id)
             return nombramiento
         except Exception as e:
             db.session.rollback()
@@ -164,8 +258,10 @@ class NombramientosService:
         """
         try:
             nombramiento = Nombramiento.query.get_or_404(id)
+            rut = nombramiento.persona_id
             db.session.delete(nombramiento)
             db.session.commit()
+            NombramientosService.olvidar_vigentes(rut)
             return True
         except Exception as e:
             db.session.rollback()
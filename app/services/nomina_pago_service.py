@@ -0,0 +1,211 @@
+import csv
+import io
+import tempfile
+from xml.sax.saxutils import escape
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from openpyxl import Workbook
+from app.extensions import db
+from app.models.horas_extras import HeConsolidadoMensual
+from app.models.personas import Persona
+
+
+class NominaPagoService:
+    """
+    Nómina de pago de Horas Extras: tabla Word y exportaciones CSV/XLSX.
+
+    La tabla del decreto se arma como XML en una sola pasada a partir de plantillas
+    de fila (el formato va incrustado en la plantilla, no se aplica run por run),
+    y las exportaciones leen la BD en lotes de tuplas y escriben a medida que leen.
+    """
+
+    ENCABEZADOS = ['RUT', 'FUNCIONARIO', 'GR.', 'PAG 25%', 'PAG 50%', 'COM 25%', 'COM 50%', 'A PAGAR']
+    ANCHOS_TWIPS = [1200, 2800, 500, 800, 800, 800, 800, 1300]
+    TAMANO_LOTE = 1000
+
+    # Mismos estados que toma generar_decreto_pago: lo ya PAGADO no vuelve a la nómina
+    ESTADOS_A_PAGAR = ('CALCULADO', 'REVISADO', 'EN_DECRETO')
+
+    # Formato Arial Narrow 11 (w:sz va en medios puntos)
+    _RPR = '<w:rFonts w:ascii="Arial Narrow" w:hAnsi="Arial Narrow" w:cs="Arial Narrow"/>{negrita}<w:sz w:val="22"/>'
+    _CELDA = ('<w:tc>{tcpr}<w:p><w:pPr><w:jc w:val="{alineacion}"/></w:pPr>'
+              '<w:r><w:rPr>{rpr}</w:rPr><w:t xml:space="preserve">{texto}</w:t></w:r></w:p></w:tc>')
+    _BORDES = ''.join(
+        f'<w:{lado} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+        for lado in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV')
+    )
+
+    # =======================================================
+    # FILAS (TUPLAS PLANAS)
+    # =======================================================
+
+    @staticmethod
+    def _fmt_horas(valor):
+        return f"{(valor or 0):g}"
+
+    @staticmethod
+    def _fmt_monto(valor):
+        return f"${(valor or 0):,.0f}".replace(',', '.')
+
+    @staticmethod
+    def filas_desde_consolidados(consolidados):
+        """Convierte objetos HeConsolidadoMensual en tuplas para la tabla/exportación."""
+        for c in consolidados:
+            yield (
+                c.rut_funcionario,
+                f"{c.funcionario.nombres} {c.funcionario.apellido_paterno}",
+                c.grado_al_calculo,
+                c.horas_a_pagar_25, c.horas_a_pagar_50,
+                c.horas_compensar_25, c.horas_compensar_50,
+                c.monto_total_pagar
+            )
+
+    @staticmethod
+    def iterar_filas(anio, mes, decreto_id=None):
+        """
+        Recorre la nómina del periodo (o de un decreto): solo columnas, sin
+        instanciar objetos ORM, en lotes de TAMANO_LOTE.
+
+        stream_results pide cursor de servidor, pero mysql+mysqlconnector no lo
+        soporta (supports_server_side_cursors=False): el driver trae el resultado
+        completo y yield_per solo evita construir todas las filas de una vez. El
+        volumen queda acotado por la dotación del mes; con un driver con cursor de
+        servidor (p. ej. mysqldb/pymysql) la lectura pasa a ser por lotes reales.
+        """
+        query = db.session.query(
+            HeConsolidadoMensual.rut_funcionario,
+            (Persona.nombres + ' ' + Persona.apellido_paterno),
+            HeConsolidadoMensual.grado_al_calculo,
+            HeConsolidadoMensual.horas_a_pagar_25,
+            HeConsolidadoMensual.horas_a_pagar_50,
+            HeConsolidadoMensual.horas_compensar_25,
+            HeConsolidadoMensual.horas_compensar_50,
+            HeConsolidadoMensual.monto_total_pagar
+        ).join(Persona, Persona.rut == HeConsolidadoMensual.rut_funcionario)
+
+        if decreto_id:
+            query = query.filter(HeConsolidadoMensual.id_decreto_pago == decreto_id)
+        else:
+            query = query.filter(
+                HeConsolidadoMensual.anio == anio,
+                HeConsolidadoMensual.mes == mes,
+                HeConsolidadoMensual.monto_total_pagar > 0,
+                HeConsolidadoMensual.estado.in_(NominaPagoService.ESTADOS_A_PAGAR)
+            )
+
+        query = query.order_by(Persona.apellido_paterno, Persona.nombres) \
+                     .execution_options(stream_results=True) \
+                     .yield_per(NominaPagoService.TAMANO_LOTE)
+        for fila in query:
+            yield tuple(fila)
+
+    # =======================================================
+    # TABLA WORD (XML EN UNA PASADA)
+    # =======================================================
+
+    @staticmethod
+    def _celda(texto, alineacion='left', negrita=False, span=None):
+        tcpr = f'<w:tcPr><w:gridSpan w:val="{span}"/></w:tcPr>' if span else ''
+        rpr = NominaPagoService._RPR.format(negrita='<w:b/>' if negrita else '')
+        return NominaPagoService._CELDA.format(
+            tcpr=tcpr, alineacion=alineacion, rpr=rpr, texto=escape(str(texto))
+        )
+
+    @staticmethod
+    def construir_tabla_xml(filas):
+        """
+        Genera el elemento <w:tbl> de la nómina (encabezado, detalle y total)
+        en una sola pasada. Retorna (elemento_tbl, total_general).
+        """
+        S = NominaPagoService
+        partes = [
+            f'<w:tbl {nsdecls("w")}>',
+            '<w:tblPr><w:tblW w:w="0" w:type="auto"/>',
+            f'<w:tblBorders>{S._BORDES}</w:tblBorders>',
+            '<w:tblLayout w:type="fixed"/></w:tblPr><w:tblGrid>',
+            ''.join(f'<w:gridCol w:w="{ancho}"/>' for ancho in S.ANCHOS_TWIPS),
+            '</w:tblGrid>',
+            '<w:tr><w:trPr><w:tblHeader/></w:trPr>',
+            ''.join(S._celda(h, 'center', negrita=True) for h in S.ENCABEZADOS),
+            '</w:tr>'
+        ]
+
+        total_gral = 0
+        for rut, nombre, grado, p25, p50, c25, c50, monto in filas:
+            partes.append('<w:tr>')
+            partes.append(S._celda(rut))
+            partes.append(S._celda(nombre))
+            partes.append(S._celda(grado or 0))
+            # Alineación derecha para horas y montos
+            for horas in (p25, p50, c25, c50):
+                partes.append(S._celda(S._fmt_horas(horas), 'right'))
+            partes.append(S._celda(S._fmt_monto(monto), 'right'))
+            partes.append('</w:tr>')
+            total_gral += (monto or 0)
+
+        # Fila Total: texto combinado en las 7 primeras columnas
+        partes.append('<w:tr>')
+        partes.append(S._celda("TOTAL A PAGAR", 'right', negrita=True, span=7))
+        partes.append(S._celda(S._fmt_monto(total_gral), 'right', negrita=True))
+        partes.append('</w:tr></w:tbl>')
+
+        return parse_xml(''.join(partes)), total_gral
+
+    # =======================================================
+    # EXPORTACIONES
+    # =======================================================
+
+    @staticmethod
+    def _fila_exportable(fila):
+        rut, nombre, grado, p25, p50, c25, c50, monto = fila
+        return [rut, nombre, grado or 0, float(p25 or 0), float(p50 or 0),
+                float(c25 or 0), float(c50 or 0), int(monto or 0)]
+
+    @staticmethod
+    def exportar_csv(anio, mes, decreto_id=None):
+        """
+        Generador de texto CSV (separador ';' y BOM para Excel).
+        Emite un bloque por cada lote de filas leídas del cursor.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+
+        buffer.write('\ufeff')
+        writer.writerow(NominaPagoService.ENCABEZADOS)
+
+        for i, fila in enumerate(NominaPagoService.iterar_filas(anio, mes, decreto_id), start=1):
+            writer.writerow(NominaPagoService._fila_exportable(fila))
+            if i % NominaPagoService.TAMANO_LOTE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        yield buffer.getvalue()
+
+    @staticmethod
+    def exportar_xlsx(anio, mes, decreto_id=None):
+        """
+        Escribe la nómina en un XLSX en modo 'write_only' (las filas no quedan en memoria)
+        sobre un archivo temporal anónimo: no pasa por static/ (trae RUT y montos) y
+        el sistema lo borra al cerrarlo. Retorna (archivo posicionado al inicio, nombre).
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=f"Nomina {mes}-{anio}")
+        ws.append(NominaPagoService.ENCABEZADOS)
+
+        total = 0
+        for fila in NominaPagoService.iterar_filas(anio, mes, decreto_id):
+            datos = NominaPagoService._fila_exportable(fila)
+            total += datos[-1]
+            ws.append(datos)
+
+        ws.append([None] * 6 + ['TOTAL A PAGAR', total])
+
+        archivo = tempfile.TemporaryFile()
+        try:
+            wb.save(archivo)
+        except Exception:
+            archivo.close()
+            raise
+        archivo.seek(0)
+        return archivo, f"Nomina_Pago_HE_{mes}_{anio}.xlsx"
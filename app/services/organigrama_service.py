@@ -0,0 +1,475 @@
+import calendar
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import and_, event, func, or_, select
+from sqlalchemy.orm import Session, aliased
+from app.extensions import db
+from app.models.catalogos import CatUnidad, CatUnidadClausura, CatEstamento
+from app.models.nombramientos import Nombramiento
+from app.models.remuneraciones import EscalaRemuneraciones
+from app.models.horas_extras import HeConsolidadoMensual
+from app.models.viaticos import ViaticoDecreto
+from app.models.trabajos import VersionCache
+from app.services.historial_escalas_service import HistorialEscalasService
+
+
+class OrganigramaService:
+    """
+    Analítica de dotación y gasto por unidad organizacional, directa y acumulada
+    por el árbol de cat_unidades (padre_id).
+
+    Los acumulados se resuelven con la tabla de clausura (cat_unidades_clausura):
+    cada métrica es UNA consulta que agrupa por ancestro_id, en vez de recorrer
+    'subunidades' recursivamente en Python. La clausura se mantiene dentro de la
+    misma transacción del CRUD de unidades (ver CatalogosService).
+    """
+
+    # Caché del organigrama: su versión vive en sys_versiones_cache y se incrementa
+    # en la misma transacción que modifica unidades o nombramientos
+    MODELOS_ARBOL = (CatUnidad, Nombramiento)
+    CLAVE_VERSION = 'organigrama'
+    _arbol = None       # ((version BD, día), cuerpo JSON, etag)
+    _lock = threading.Lock()
+
+    # =======================================================
+    # TABLA DE CLAUSURA
+    # =======================================================
+
+    @staticmethod
+    def _filas_clausura(padres):
+        """
+        Pares (ancestro, descendiente, profundidad) a partir de {id: padre_id}.
+        Un ciclo en los datos corta la cadena en la unidad repetida.
+        """
+        filas = []
+        for unidad_id in padres:
+            actual, profundidad, vistos = unidad_id, 0, set()
+            while actual is not None and actual in padres and actual not in vistos:
+                vistos.add(actual)
+                filas.append({'ancestro_id': actual, 'descendiente_id': unidad_id, 'profundidad': profundidad})
+                actual = padres[actual]
+                profundidad += 1
+        return filas
+
+    @staticmethod
+    def reconstruir_clausura():
+        """Reconstruye completa la clausura desde cat_unidades. No hace commit."""
+        padres = dict(db.session.query(CatUnidad.id, CatUnidad.padre_id).all())
+        filas = OrganigramaService._filas_clausura(padres)
+        CatUnidadClausura.query.delete(synchronize_session=False)
+        if filas:
+            db.session.bulk_insert_mappings(CatUnidadClausura, filas)
+        return len(filas)
+
+    @staticmethod
+    def asegurar_clausura():
+        """
+        Al iniciar: reconstruye la clausura si no calza con cat_unidades (unidades
+        sin fila propia o aristas padre-hijo distintas), por ejemplo tras cambios
+        hechos directamente en la BD.
+        """
+        try:
+            n_unidades = db.session.query(func.count(CatUnidad.id)).scalar()
+            n_con_padre = db.session.query(func.count(CatUnidad.id)).filter(CatUnidad.padre_id.isnot(None)).scalar()
+            n_propias = db.session.query(func.count()).select_from(CatUnidadClausura) \
+                .filter(CatUnidadClausura.profundidad == 0).scalar()
+            n_aristas = db.session.query(func.count()).select_from(CatUnidadClausura) \
+                .join(CatUnidad, and_(CatUnidad.id == CatUnidadClausura.descendiente_id,
+                                      CatUnidad.padre_id == CatUnidadClausura.ancestro_id)) \
+                .filter(CatUnidadClausura.profundidad == 1).scalar()
+
+            if n_unidades == n_propias and n_con_padre == n_aristas:
+                return 0
+            filas = OrganigramaService.reconstruir_clausura()
+            db.session.commit()
+            return filas
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error reconstruyendo la clausura del organigrama: {e}")
+            return 0
+
+    # =======================================================
+    # MANTENCIÓN INCREMENTAL (dentro de la transacción del CRUD)
+    # =======================================================
+
+    @staticmethod
+    def validar_padre(unidad_id, padre_id):
+        """
+        Impide ciclos: el nuevo padre no puede ser la unidad ni una de sus
+        dependencias. Lanza ValueError.
+        """
+        if padre_id is None:
+            return
+        if int(padre_id) == int(unidad_id):
+            raise ValueError("Una unidad no puede depender de sí misma.")
+        ciclo = db.session.query(CatUnidadClausura.ancestro_id).filter(
+            CatUnidadClausura.ancestro_id == unidad_id,
+            CatUnidadClausura.descendiente_id == padre_id
+        ).first()
+        if ciclo:
+            raise ValueError("La unidad superior seleccionada depende de esta unidad (se formaría un ciclo).")
+
+    @staticmethod
+    def agregar_unidad(unidad_id, padre_id):
+        """Filas de clausura de una unidad nueva: ella misma y los ancestros de su padre."""
+        C = CatUnidadClausura
+        filas = [{'ancestro_id': unidad_id, 'descendiente_id': unidad_id, 'profundidad': 0}]
+        if padre_id is not None:
+            filas += [
+                {'ancestro_id': ancestro, 'descendiente_id': unidad_id, 'profundidad': profundidad + 1}
+                for ancestro, profundidad in db.session.query(C.ancestro_id, C.profundidad)
+                .filter(C.descendiente_id == padre_id).all()
+            ]
+        db.session.bulk_insert_mappings(C, filas)
+
+    @staticmethod
+    def mover_unidad(unidad_id, padre_id):
+        """
+        Reubica la unidad con todo su subárbol bajo 'padre_id' (None = raíz):
+        se borran los vínculos con los ancestros anteriores y se crea el producto
+        cruzado ancestros del nuevo padre x subárbol. Llamar a validar_padre antes.
+        """
+        C = CatUnidadClausura
+        subarbol = db.session.query(C.descendiente_id, C.profundidad).filter(C.ancestro_id == unidad_id).all()
+        ids = [descendiente for descendiente, _ in subarbol]
+        if not ids:
+            # Unidad sin clausura (datos previos): se arma completa
+            OrganigramaService.reconstruir_clausura()
+            return
+
+        C.query.filter(C.descendiente_id.in_(ids), ~C.ancestro_id.in_(ids)) \
+            .delete(synchronize_session=False)
+
+        if padre_id is not None:
+            ancestros = db.session.query(C.ancestro_id, C.profundidad).filter(C.descendiente_id == padre_id).all()
+            db.session.bulk_insert_mappings(C, [
+                {'ancestro_id': ancestro, 'descendiente_id': descendiente,
+                 'profundidad': prof_ancestro + prof_descendiente + 1}
+                for ancestro, prof_ancestro in ancestros
+                for descendiente, prof_descendiente in subarbol
+            ])
+
+    @staticmethod
+    def quitar_unidad(unidad_id):
+        """Borra la clausura de una unidad hoja antes de eliminarla. Lanza ValueError si tiene subunidades."""
+        if CatUnidad.query.filter_by(padre_id=unidad_id).first():
+            raise ValueError("No se puede eliminar: la unidad tiene subunidades dependientes.")
+        CatUnidadClausura.query.filter(
+            or_(CatUnidadClausura.descendiente_id == unidad_id, CatUnidadClausura.ancestro_id == unidad_id)
+        ).delete(synchronize_session=False)
+
+    # =======================================================
+    # CONSULTAS DEL ÁRBOL (una consulta indexada cada una)
+    # =======================================================
+
+    @staticmethod
+    def subarbol_ids(unidad_id):
+        """IDs de la unidad y todas sus dependencias (una consulta por rango)."""
+        return [fila[0] for fila in db.session.query(CatUnidadClausura.descendiente_id)
+                .filter(CatUnidadClausura.ancestro_id == unidad_id).all()]
+
+    @staticmethod
+    def ancestros_ids(unidad_id):
+        """IDs desde la unidad hacia la raíz (la unidad primero, luego su padre, etc.)."""
+        return [fila[0] for fila in db.session.query(CatUnidadClausura.ancestro_id)
+                .filter(CatUnidadClausura.descendiente_id == unidad_id)
+                .order_by(CatUnidadClausura.profundidad).all()]
+
+    @staticmethod
+    def subarbol(unidad_id):
+        """[(unidad, profundidad relativa)] de la unidad y sus dependencias, por nivel."""
+        C = CatUnidadClausura
+        return db.session.query(CatUnidad, C.profundidad) \
+            .join(C, C.descendiente_id == CatUnidad.id) \
+            .filter(C.ancestro_id == unidad_id) \
+            .order_by(C.profundidad, CatUnidad.nombre).all()
+
+    @staticmethod
+    def ruta(unidad_id):
+        """Unidades desde la raíz hasta 'unidad_id' (p. ej. Alcaldía > Dirección > Depto)."""
+        C = CatUnidadClausura
+        return CatUnidad.query.join(C, C.ancestro_id == CatUnidad.id) \
+            .filter(C.descendiente_id == unidad_id) \
+            .order_by(C.profundidad.desc()).all()
+
+    # =======================================================
+    # MÉTRICAS AGRUPADAS POR ANCESTRO
+    # =======================================================
+
+    @staticmethod
+    def _vigente_a(fecha, N=Nombramiento):
+        """Condición de nombramiento VIGENTE que cubre 'fecha' (columna o valor)."""
+        return and_(
+            N.estado == 'VIGENTE',
+            N.fecha_inicio <= fecha,
+            or_(N.fecha_fin.is_(None), N.fecha_fin >= fecha)
+        )
+
+    @staticmethod
+    def _asignado_a(fecha):
+        """
+        Como _vigente_a, pero con un solo nombramiento por persona: si hay varios
+        traslapados gana el de inicio más reciente (y luego el id mayor), igual
+        que NombramientosService.elegir_vigente. Evita contar dos veces el gasto.
+        """
+        N2 = aliased(Nombramiento)
+        posterior = select(N2.id).where(
+            N2.persona_id == Nombramiento.persona_id,
+            OrganigramaService._vigente_a(fecha, N2),
+            or_(N2.fecha_inicio > Nombramiento.fecha_inicio,
+                and_(N2.fecha_inicio == Nombramiento.fecha_inicio, N2.id > Nombramiento.id))
+        ).correlate_except(N2).exists()
+        return and_(OrganigramaService._vigente_a(fecha), ~posterior)
+
+    @staticmethod
+    def _dotacion(fecha):
+        """(ancestro, profundidad, estamento_id, grado, calidad, n) de los nombramientos vigentes (uno por persona)."""
+        C = CatUnidadClausura
+        return db.session.query(
+            C.ancestro_id, C.profundidad, Nombramiento.estamento_id, Nombramiento.grado,
+            Nombramiento.calidad_juridica, func.count(Nombramiento.id)
+        ).join(C, C.descendiente_id == Nombramiento.unidad_id) \
+         .filter(OrganigramaService._asignado_a(fecha)) \
+         .group_by(C.ancestro_id, C.profundidad, Nombramiento.estamento_id,
+                   Nombramiento.grado, Nombramiento.calidad_juridica).all()
+
+    @staticmethod
+    def _sueldos_grado(fecha):
+        """{(estamento_id, grado): total fijo calculado} de las escalas vigentes a 'fecha'."""
+        filas = db.session.query(
+            EscalaRemuneraciones.estamento_id, EscalaRemuneraciones.grado, EscalaRemuneraciones.fecha_vigencia
+        ).filter(
+            EscalaRemuneraciones.fecha_vigencia <= fecha,
+            or_(EscalaRemuneraciones.fecha_fin.is_(None), EscalaRemuneraciones.fecha_fin >= fecha)
+        ).order_by(EscalaRemuneraciones.fecha_vigencia).all()
+
+        # Orden ascendente: si se traslapan escalas, queda la más reciente
+        vigencia = {(e, g): f for e, g, f in filas}
+        por_periodo = defaultdict(list)
+        for clave, f in vigencia.items():
+            por_periodo[f].append(clave)
+
+        # Totales del motor (vía historial): incluye haberes por fórmula y restricciones por estamento
+        sueldos = {}
+        for f, claves in por_periodo.items():
+            sueldos.update(HistorialEscalasService.totales_fijos(f, claves))
+        return sueldos
+
+    @staticmethod
+    def _horas_extras(anio, mes, fecha):
+        """(ancestro, profundidad, monto) del consolidado del mes, por la unidad vigente al cierre."""
+        C = CatUnidadClausura
+        return db.session.query(
+            C.ancestro_id, C.profundidad, func.coalesce(func.sum(HeConsolidadoMensual.monto_total_pagar), 0)
+        ).join(Nombramiento, and_(Nombramiento.persona_id == HeConsolidadoMensual.rut_funcionario,
+                                  OrganigramaService._asignado_a(fecha))) \
+         .join(C, C.descendiente_id == Nombramiento.unidad_id) \
+         .filter(HeConsolidadoMensual.anio == anio, HeConsolidadoMensual.mes == mes) \
+         .group_by(C.ancestro_id, C.profundidad).all()
+
+    @staticmethod
+    def _viaticos(desde, hasta):
+        """(ancestro, profundidad, monto) de los cometidos del periodo, por la unidad vigente a la salida."""
+        C = CatUnidadClausura
+        return db.session.query(
+            C.ancestro_id, C.profundidad, func.coalesce(func.sum(ViaticoDecreto.monto_total_calculado), 0)
+        ).join(Nombramiento, and_(Nombramiento.persona_id == ViaticoDecreto.rut_funcionario,
+                                  OrganigramaService._asignado_a(ViaticoDecreto.fecha_salida))) \
+         .join(C, C.descendiente_id == Nombramiento.unidad_id) \
+         .filter(ViaticoDecreto.fecha_salida.between(desde, hasta), ViaticoDecreto.estado != 'ANULADO') \
+         .group_by(C.ancestro_id, C.profundidad).all()
+
+    # =======================================================
+    # ANALÍTICA
+    # =======================================================
+
+    @staticmethod
+    def _metricas_vacias():
+        return {
+            'dotacion': 0,
+            'por_estamento': defaultdict(int),
+            'por_calidad': defaultdict(int),
+            'planilla_base': 0,
+            'horas_extras': 0,
+            'viaticos': 0
+        }
+
+    @staticmethod
+    def analitica(anio, mes):
+        """
+        Métricas del mes por unidad: dotación por estamento y calidad jurídica,
+        planilla base según escala, gasto en horas extras y viáticos. Cada unidad
+        trae 'directo' (solo sus nombramientos) y 'acumulado' (con su subárbol).
+        La dotación y la planilla se miden al último día del mes.
+        """
+        desde = date(anio, mes, 1)
+        hasta = date(anio, mes, calendar.monthrange(anio, mes)[1])
+
+        unidades = CatUnidad.query.order_by(CatUnidad.nombre).all()
+        estamentos = dict(db.session.query(CatEstamento.id, CatEstamento.estamento).all())
+        sueldos = OrganigramaService._sueldos_grado(hasta)
+        niveles = dict(db.session.query(CatUnidadClausura.descendiente_id, func.max(CatUnidadClausura.profundidad))
+                       .group_by(CatUnidadClausura.descendiente_id).all())
+
+        directo = defaultdict(OrganigramaService._metricas_vacias)
+        acumulado = defaultdict(OrganigramaService._metricas_vacias)
+
+        def destinos(profundidad):
+            return (directo, acumulado) if profundidad == 0 else (acumulado,)
+
+        for ancestro, profundidad, estamento_id, grado, calidad, n in OrganigramaService._dotacion(hasta):
+            for m in destinos(profundidad):
+                metricas = m[ancestro]
+                metricas['dotacion'] += n
+                metricas['por_estamento'][estamentos.get(estamento_id, str(estamento_id))] += n
+                metricas['por_calidad'][calidad] += n
+                metricas['planilla_base'] += n * sueldos.get((estamento_id, grado), 0)
+
+        for ancestro, profundidad, monto in OrganigramaService._horas_extras(anio, mes, hasta):
+            for m in destinos(profundidad):
+                m[ancestro]['horas_extras'] += int(monto)
+
+        for ancestro, profundidad, monto in OrganigramaService._viaticos(desde, hasta):
+            for m in destinos(profundidad):
+                m[ancestro]['viaticos'] += int(monto)
+
+        def serializar(metricas):
+            return {**metricas,
+                    'por_estamento': dict(metricas['por_estamento']),
+                    'por_calidad': dict(metricas['por_calidad'])}
+
+        return [{
+            'id': u.id,
+            'nombre': u.nombre,
+            'sigla': u.sigla,
+            'tipo': u.tipo,
+            'padre_id': u.padre_id,
+            'nivel': int(niveles.get(u.id, 0)),
+            'directo': serializar(directo[u.id]),
+            'acumulado': serializar(acumulado[u.id])
+        } for u in unidades]
+
+    # =======================================================
+    # ORGANIGRAMA (árbol anidado con dotación, en caché)
+    # =======================================================
+
+    @staticmethod
+    def _construir_arbol(fecha):
+        """
+        Árbol anidado en dos consultas (unidades y dotación acumulada por ancestro)
+        y un ensamblado O(n) por padre_id. Las unidades cuyo padre no existe
+        quedan como raíces.
+        """
+        C = CatUnidadClausura
+        unidades = db.session.query(CatUnidad.id, CatUnidad.nombre, CatUnidad.sigla,
+                                    CatUnidad.tipo, CatUnidad.padre_id) \
+            .order_by(CatUnidad.nombre).all()
+        dotacion = db.session.query(C.ancestro_id, C.profundidad, func.count(Nombramiento.id)) \
+            .join(C, C.descendiente_id == Nombramiento.unidad_id) \
+            .filter(OrganigramaService._vigente_a(fecha)) \
+            .group_by(C.ancestro_id, C.profundidad).all()
+
+        directa, acumulada = defaultdict(int), defaultdict(int)
+        for ancestro, profundidad, n in dotacion:
+            acumulada[ancestro] += n
+            if profundidad == 0:
+                directa[ancestro] += n
+
+        nodos = {u.id: {
+            'id': u.id,
+            'nombre': u.nombre,
+            'sigla': u.sigla,
+            'tipo': u.tipo,
+            'dotacion': directa[u.id],
+            'dotacion_total': acumulada[u.id],
+            'hijos': []
+        } for u in unidades}
+
+        raices = []
+        for u in unidades:
+            padre = nodos.get(u.padre_id)
+            (padre['hijos'] if padre else raices).append(nodos[u.id])
+        return raices
+
+    @staticmethod
+    def asegurar_version():
+        """Al iniciar: crea la fila de versión del organigrama si no existe."""
+        try:
+            if not VersionCache.query.get(OrganigramaService.CLAVE_VERSION):
+                db.session.add(VersionCache(clave=OrganigramaService.CLAVE_VERSION, version=0))
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creando la versión del organigrama: {e}")
+
+    @staticmethod
+    def _version_bd():
+        return db.session.query(VersionCache.version) \
+            .filter(VersionCache.clave == OrganigramaService.CLAVE_VERSION).scalar() or 0
+
+    @staticmethod
+    def organigrama():
+        """
+        Retorna (cuerpo JSON, etag) del organigrama vigente. Se recalcula solo si
+        cambió la versión en la BD (escrituras en unidades o nombramientos hechas
+        por cualquier proceso) o cambió el día; el etag es el hash del contenido,
+        igual en todos los procesos.
+        """
+        hoy = date.today()
+        version = (OrganigramaService._version_bd(), hoy)
+        cache = OrganigramaService._arbol
+        if cache and cache[0] == version:
+            return cache[1], cache[2]
+
+        cuerpo = json.dumps({'fecha': hoy.isoformat(), 'unidades': OrganigramaService._construir_arbol(hoy)},
+                            ensure_ascii=False, separators=(',', ':'))
+        etag = hashlib.sha1(cuerpo.encode('utf-8')).hexdigest()
+        with OrganigramaService._lock:
+            OrganigramaService._arbol = (version, cuerpo, etag)
+        return cuerpo, etag
+
+    @staticmethod
+    def invalidar():
+        with OrganigramaService._lock:
+            OrganigramaService._arbol = None
+
+    # =======================================================
+    # INVALIDACIÓN POR EVENTOS DE SESIÓN
+    # =======================================================
+
+    @staticmethod
+    def _marcar_cambios(session, flush_context):
+        if session.info.get('organigrama_modificado'):
+            return
+        modelos = OrganigramaService.MODELOS_ARBOL
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, modelos):
+                # Una vez por transacción: se confirma o revierte junto con el cambio
+                tabla = VersionCache.__table__
+                session.connection().execute(
+                    tabla.update().where(tabla.c.clave == OrganigramaService.CLAVE_VERSION)
+                    .values(version=tabla.c.version + 1)
+                )
+                session.info['organigrama_modificado'] = True
+                return
+
+    @staticmethod
+    def _al_confirmar(session):
+        if session.info.pop('organigrama_modificado', False):
+            OrganigramaService.invalidar()
+
+    @staticmethod
+    def _al_revertir(session, transaccion_previa):
+        session.info.pop('organigrama_modificado', None)
+
+    @staticmethod
+    def registrar_eventos():
+        """Conecta la invalidación a todas las sesiones (se llama una vez en create_app)."""
+        if not event.contains(Session, 'after_flush', OrganigramaService._marcar_cambios):
+            event.listen(Session, 'after_flush', OrganigramaService._marcar_cambios)
+            event.listen(Session, 'after_commit', OrganigramaService._al_confirmar)
+            event.listen(Session, 'after_soft_rollback', OrganigramaService._al_revertir)
@@ -0,0 +1,199 @@
+from datetime import date
+from sqlalchemy import extract, func, or_
+from sqlalchemy.orm import selectinload
+from app.extensions import db
+from app.models.personas import Persona, HistorialAcademico
+from app.models.nombramientos import Nombramiento
+from app.models.contratos import ContratoHonorario
+from app.models.viaticos import ViaticoDecreto
+from app.models.horas_extras import HeOrdenServicio, HeConsolidadoMensual
+from app.models.remuneraciones import EscalaRemuneraciones
+from app.services.nombramientos_service import NombramientosService
+from app.services.historial_escalas_service import HistorialEscalasService
+
+
+class PerfilPersonaService:
+    """
+    Ficha 360 de un funcionario armada con un número fijo de consultas:
+
+    - Persona + historial académico, nombramientos y contratos con selectinload
+      (una consulta por relación, sin cargas perezosas al renderizar).
+    - Totales del año (horas extras y viáticos) agregados en la BD.
+    - Solo los últimos N registros de viáticos, horas extras y órdenes, para que
+      el tiempo de armado no crezca con la antigüedad del funcionario.
+    """
+
+    ULTIMOS = 10
+
+    # =======================================================
+    # CONSULTAS
+    # =======================================================
+
+    @staticmethod
+    def _persona(rut):
+        return Persona.query.options(
+            selectinload(Persona.sexo),
+            selectinload(Persona.historial_academico).selectinload(HistorialAcademico.nivel_detalle),
+            selectinload(Persona.nombramientos).selectinload(Nombramiento.estamento),
+            selectinload(Persona.nombramientos).selectinload(Nombramiento.unidad),
+            selectinload(Persona.contratos).selectinload(ContratoHonorario.programa),
+            selectinload(Persona.contratos).selectinload(ContratoHonorario.tipo)
+        ).filter(Persona.rut == rut).first()
+
+    @staticmethod
+    def _escala_vigente(estamento_id, grado, fecha):
+        """Escala de remuneraciones del grado vigente a la fecha."""
+        return EscalaRemuneraciones.query \
+            .filter(
+                EscalaRemuneraciones.estamento_id == estamento_id,
+                EscalaRemuneraciones.grado == grado,
+                EscalaRemuneraciones.fecha_vigencia <= fecha,
+                or_(EscalaRemuneraciones.fecha_fin.is_(None), EscalaRemuneraciones.fecha_fin >= fecha)
+            ).order_by(EscalaRemuneraciones.fecha_vigencia.desc()).first()
+
+    @staticmethod
+    def _totales_horas_extras(rut, anio):
+        fila = db.session.query(
+            func.count(HeConsolidadoMensual.id),
+            func.coalesce(func.sum(HeConsolidadoMensual.horas_a_pagar_25), 0),
+            func.coalesce(func.sum(HeConsolidadoMensual.horas_a_pagar_50), 0),
+            func.coalesce(func.sum(HeConsolidadoMensual.monto_total_pagar), 0)
+        ).filter(HeConsolidadoMensual.rut_funcionario == rut, HeConsolidadoMensual.anio == anio).one()
+        return {
+            'meses': fila[0],
+            'horas_25': float(fila[1]),
+            'horas_50': float(fila[2]),
+            'monto_total': int(fila[3])
+        }
+
+    @staticmethod
+    def _totales_viaticos(rut, anio):
+        fila = db.session.query(
+            func.count(ViaticoDecreto.id),
+            func.coalesce(func.sum(ViaticoDecreto.dias_al_100 + ViaticoDecreto.dias_al_40 + ViaticoDecreto.dias_al_20), 0),
+            func.coalesce(func.sum(ViaticoDecreto.monto_total_calculado), 0)
+        ).filter(
+            ViaticoDecreto.rut_funcionario == rut,
+            extract('year', ViaticoDecreto.fecha_salida) == anio,
+            ViaticoDecreto.estado != 'ANULADO'
+        ).one()
+        return {'cometidos': fila[0], 'dias': float(fila[1]), 'monto_total': int(fila[2])}
+
+    # =======================================================
+    # FICHA
+    # =======================================================
+
+    @staticmethod
+    def _fecha(valor):
+        return valor.isoformat() if valor else None
+
+    @staticmethod
+    def obtener_perfil(rut, fecha=None):
+        """
+        Retorna (persona, ficha) o (None, None) si no existe. 'ficha' es un dict
+        serializable con nombramiento actual, sueldo del grado, totales del año y
+        los registros recientes.
+        """
+        fecha = fecha or date.today()
+        persona = PerfilPersonaService._persona(rut)
+        if not persona:
+            return None, None
+
+        f = PerfilPersonaService._fecha
+        ultimos = PerfilPersonaService.ULTIMOS
+
+        # Nombramiento actual y sueldo de su grado
+        actual = NombramientosService.elegir_vigente(persona.nombramientos, fecha)
+        nombramiento, sueldo = None, None
+        if actual:
+            nombramiento = {
+                'id': actual.id,
+                'calidad_juridica': actual.calidad_juridica,
+                'estamento': actual.estamento.estamento if actual.estamento else None,
+                'grado': actual.grado,
+                'unidad': actual.unidad.nombre if actual.unidad else None,
+                'horas_semanales': actual.horas_semanales,
+                'fecha_inicio': f(actual.fecha_inicio),
+                'fecha_fin': f(actual.fecha_fin),
+                'numero_decreto': actual.numero_decreto
+            }
+            escala = PerfilPersonaService._escala_vigente(actual.estamento_id, actual.grado, fecha)
+            if escala:
+                # Total calculado (fórmulas incluidas, solo fijos habilitados para el estamento)
+                clave = (escala.estamento_id, escala.grado)
+                base = int(escala.sueldo_base or 0)
+                total = HistorialEscalasService.totales_fijos(escala.fecha_vigencia, [clave]).get(clave, base)
+                sueldo = {
+                    'fecha_vigencia': f(escala.fecha_vigencia),
+                    'sueldo_base': base,
+                    'haberes': total - base,
+                    'total': total
+                }
+
+        # Registros recientes (acotados)
+        viaticos = ViaticoDecreto.query.filter_by(rut_funcionario=rut) \
+            .order_by(ViaticoDecreto.fecha_salida.desc()).limit(ultimos).all()
+        consolidados = HeConsolidadoMensual.query.filter_by(rut_funcionario=rut) \
+            .order_by(HeConsolidadoMensual.anio.desc(), HeConsolidadoMensual.mes.desc()).limit(ultimos).all()
+        ordenes = HeOrdenServicio.query.filter_by(rut_funcionario=rut) \
+            .order_by(HeOrdenServicio.created_at.desc()).limit(ultimos).all()
+
+        ficha = {
+            'rut': persona.rut,
+            'nombre': f"{persona.nombres} {persona.apellido_paterno} {persona.apellido_materno}",
+            'email': persona.email,
+            'telefono': persona.telefono,
+            'sexo': persona.sexo.descripcion if persona.sexo else None,
+            'fecha_ingreso_municipio': f(persona.fecha_ingreso_municipio),
+            'nombramiento_actual': nombramiento,
+            'sueldo_grado': sueldo,
+            'historial_academico': [{
+                'nivel': h.nivel_detalle.descripcion if h.nivel_detalle else None,
+                'titulo': h.nombre_titulo,
+                'institucion': h.institucion,
+                'fecha_titulacion': f(h.fecha_titulacion),
+                'es_principal': bool(h.es_principal)
+            } for h in persona.historial_academico],
+            'nombramientos': [{
+                'id': n.id,
+                'calidad_juridica': n.calidad_juridica,
+                'grado': n.grado,
+                'estado': n.estado,
+                'fecha_inicio': f(n.fecha_inicio),
+                'fecha_fin': f(n.fecha_fin)
+            } for n in sorted(persona.nombramientos, key=lambda n: n.fecha_inicio, reverse=True)],
+            'contratos': [{
+                'id': c.id,
+                'programa': c.programa.nombre if c.programa else None,
+                'tipo': c.tipo.nombre if c.tipo else None,
+                'estado': c.estado,
+                'monto_total': c.monto_total,
+                'fecha_inicio': f(c.fecha_inicio),
+                'fecha_fin': f(c.fecha_fin)
+            } for c in sorted(persona.contratos, key=lambda c: c.fecha_inicio, reverse=True)],
+            'anio': fecha.year,
+            'horas_extras_anio': PerfilPersonaService._totales_horas_extras(rut, fecha.year),
+            'viaticos_anio': PerfilPersonaService._totales_viaticos(rut, fecha.year),
+            'viaticos_recientes': [{
+                'id': v.id,
+                'destino': v.lugar_destino,
+                'fecha_salida': f(v.fecha_salida),
+                'estado': v.estado,
+                'monto': v.monto_total_calculado
+            } for v in viaticos],
+            'horas_extras_recientes': [{
+                'anio': c.anio,
+                'mes': c.mes,
+                'horas_25': float(c.horas_a_pagar_25 or 0),
+                'horas_50': float(c.horas_a_pagar_50 or 0),
+                'monto': c.monto_total_pagar,
+                'estado': c.estado
+            } for c in consolidados],
+            'ordenes_recientes': [{
+                'id': o.id,
+                'estado': o.estado,
+                'es_emergencia': bool(o.es_emergencia),
+                'fecha': f(o.created_at)
+            } for o in ordenes]
+        }
+        return persona, ficha
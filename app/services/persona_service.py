@@ -1,9 +1,17 @@
 # app/services/persona_service.py
+from datetime import datetime
+import numpy as np
 import pandas as pd
 from app.extensions import db
-from app.models.personas import Persona
+from app.models.personas import Persona, HistorialAcademico
+from app.models.nombramientos import Nombramiento
 from app.models.catalogos import CatSexo, CatNivelEstudios
+from app.services.lector_archivos_service import LectorTabular
+from app.services.dashboard_service import DashboardService
+from app.services.busqueda_personas_service import BusquedaPersonasService
+from sqlalchemy import and_, exists
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
 class PersonaService:
     
@@ -21,6 +29,15 @@ class PersonaService:
         """Busca una persona por su RUT exacto"""
         return Persona.query.get(rut)
 
+    @staticmethod
+    def get_by_ruts(ruts):
+        """Personas de la lista de RUTs, en el mismo orden (una sola consulta)."""
+        if not ruts:
+            return []
+        por_rut = {p.rut: p for p in Persona.query.options(selectinload(Persona.sexo))
+                   .filter(Persona.rut.in_(ruts)).all()}
+        return [por_rut[r] for r in ruts if r in por_rut]
+
     @staticmethod
     def create(data):
         """
@@ -75,24 +92,115 @@ class PersonaService:
         db.session.commit()
         return True
 
+    # =======================================================
+    # CONSULTA PAGINADA (API)
+    # =======================================================
+
+    @staticmethod
+    def _consulta_api(unidad_id=None, estamento_id=None, vigente=None):
+        """
+        Personas con filtros por nombramiento VIGENTE (unidad, estamento o solo
+        la existencia del nombramiento). Las relaciones que serializa el esquema
+        se precargan por lote (selectinload) en vez de una consulta por persona.
+        """
+        query = Persona.query.options(
+            selectinload(Persona.sexo),
+            selectinload(Persona.historial_academico).selectinload(HistorialAcademico.nivel_detalle)
+        )
+
+        condiciones = [Nombramiento.persona_id == Persona.rut, Nombramiento.estado == 'VIGENTE']
+        if unidad_id:
+            condiciones.append(Nombramiento.unidad_id == unidad_id)
+        if estamento_id:
+            condiciones.append(Nombramiento.estamento_id == estamento_id)
+
+        if unidad_id or estamento_id or vigente:
+            query = query.filter(exists().where(and_(*condiciones)))
+        elif vigente is False:
+            query = query.filter(~exists().where(and_(*condiciones)))
+        return query
+
+    @staticmethod
+    def pagina_api(despues_de=None, limite=100, **filtros):
+        """
+        Página por cursor (RUT): personas con RUT mayor a 'despues_de', en orden.
+        Retorna (personas, siguiente_cursor); el cursor es None en la última página.
+        """
+        query = PersonaService._consulta_api(**filtros)
+        if despues_de:
+            query = query.filter(Persona.rut > despues_de)
+        personas = query.order_by(Persona.rut).limit(limite + 1).all()
+
+        siguiente = None
+        if len(personas) > limite:
+            personas = personas[:limite]
+            siguiente = personas[-1].rut
+        return personas, siguiente
+
+    @staticmethod
+    def iterar_api(tamano_lote=500, **filtros):
+        """
+        Recorre el conjunto completo por lotes de cursor (memoria acotada).
+        Cada lote se retira de la sesión después de entregarse.
+        """
+        cursor = None
+        while True:
+            personas, cursor = PersonaService.pagina_api(cursor, tamano_lote, **filtros)
+            for persona in personas:
+                yield persona
+            for persona in personas:
+                db.session.expunge(persona)
+            if cursor is None:
+                break
+
     # =======================================================
     # LÓGICA DE CARGA MASIVA (EXCEL)
     # =======================================================
 
+    TAMANO_LOTE = 1000
+
+    # Columna del Excel (normalizada) -> (campo en BD, largo máximo)
+    COLUMNAS_TEXTO = {
+        'nombres': ('nombres', 100),
+        'apellido_paterno': ('apellido_paterno', 100),
+        'apellido_materno': ('apellido_materno', 100),
+        'nacionalidad': ('nacionalidad', 50),
+        'email': ('email', 100),
+        'telefono': ('telefono', 20),
+        'direccion': ('direccion', 255),
+        'comuna': ('comuna_residencia', 100),
+        'titulo': ('titulo_profesional', 100),
+        'banco': ('banco_nombre', 100),
+        'tipo_cuenta': ('tipo_cuenta', 50),
+        'numero_cuenta': ('numero_cuenta', 50),
+        'tipo_discapacidad': ('tipo_discapacidad', 100),
+    }
+    COLUMNAS_BOOL = {
+        'es_discapacitado': 'es_discapacitado',
+        'tiene_credencial_compin': 'tiene_credencial_compin',
+        'pension_invalidez': 'recibe_pension_invalidez',
+    }
+    COLUMNAS_FECHA = ['fecha_nacimiento', 'fecha_ingreso_municipio', 'fecha_ingreso_sector_publico']
+
     @staticmethod
-    def procesar_carga_masiva(file):
+    def _normalizar_columna(nombre):
+        """Encabezado del Excel -> minúsculas, sin espacios (ej: 'Apellido Paterno' -> 'apellido_paterno')."""
+        return str(nombre).strip().lower().replace(' ', '_')
+
+    @staticmethod
+    def procesar_carga_masiva(file, progreso=None):
         """
-        Lee un Excel y guarda/actualiza personas masivamente.
+        Lee un Excel (o CSV) y guarda/actualiza personas masivamente.
         Soporta todos los campos de la BD, incluyendo bancarios e inclusión.
+
+        El archivo se lee en streaming por lotes (LectorTabular); en cada lote la
+        limpieza se hace por columnas completas (pandas), los RUT existentes se
+        consultan con un solo IN y la escritura usa bulk insert/update.
+        Si un RUT se repite en el archivo, prevalece la última fila.
+        'progreso' (opcional): función (actual, total) para informar el avance.
         """
         try:
-            # 1. Leer Excel
-            df = pd.read_excel(file)
-            
-            # Normalizar columnas (minúsculas, sin espacios)
-            df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
-
-            # 2. Cargar Catálogos para mapeo rápido (Evita N queries)
+            # 1. Cargar Catálogos para mapeo rápido (Evita N queries)
             try:
                 map_sexo = {s.descripcion.lower(): s.id for s in CatSexo.query.all()}
                 map_estudios = {e.descripcion.lower(): e.id for e in CatNivelEstudios.query.all()}
@@ -100,101 +208,186 @@ class PersonaService:
                 map_sexo = {}
                 map_estudios = {}
 
-            # --- HELPERS INTERNOS ---
-            def parse_bool(valor):
-                if pd.isna(valor): return 0
-                s = str(valor).strip().lower()
-                return 1 if s in ['si', 'yes', '1', 'true', 's'] else 0
+            procesados = 0
+            errores = []
 
-            def clean_str(valor, max_len=None):
-                if pd.isna(valor) or str(valor).strip() == '' or str(valor).lower() == 'nan':
-                    return None
-                texto = str(valor).strip()
-                return texto[:max_len] if max_len else texto
+            # 2. Lectura por lotes: memoria constante aunque el archivo sea grande
+            with LectorTabular(file, normalizar_columnas=PersonaService._normalizar_columna,
+                               tamano_lote=PersonaService.TAMANO_LOTE) as lector:
+                for lote, _ in lector.lotes():
+                    df = pd.DataFrame.from_records(lote)
 
-            def parse_int(valor):
-                try:
-                    return int(float(valor))
-                except:
-                    return 0
+                    # 3. Limpieza vectorizada y validación del RUT
+                    registros, errores_lote = PersonaService._preparar_registros(df, map_sexo, map_estudios)
+                    errores.extend(errores_lote)
 
-            procesados = 0
-            errores = []
+                    # 4. Persistencia del lote (las filas rechazadas por la BD se informan)
+                    guardados, errores_bd = PersonaService._guardar_registros(registros)
+                    procesados += guardados
+                    errores.extend(errores_bd)
+                    if progreso: progreso(procesados, lector.total_estimado)
 
-            for index, row in df.iterrows():
-                fila_n = index + 2 
-                
-                # RUT es la clave primaria obligatoria
-                rut_raw = row.get('rut')
-                if pd.isna(rut_raw) or str(rut_raw).strip() == '':
-                    errores.append(f"Fila {fila_n}: Columna 'RUT' vacía.")
-                    continue
-                
-                rut = str(rut_raw).strip()
-
-                try:
-                    # --- A. BUSCAR O CREAR (Upsert) ---
-                    persona = Persona.query.get(rut)
-                    es_nuevo = False
-                    if not persona:
-                        persona = Persona(rut=rut)
-                        es_nuevo = True
-
-                    # --- B. MAPEO DE DATOS ---
-                    
-                    # 1. Identificación y Contacto
-                    persona.nombres = clean_str(row.get('nombres'), 100)
-                    persona.apellido_paterno = clean_str(row.get('apellido_paterno'), 100)
-                    persona.apellido_materno = clean_str(row.get('apellido_materno'), 100)
-                    persona.nacionalidad = clean_str(row.get('nacionalidad')) or 'Chilena'
-                    persona.email = clean_str(row.get('email'), 100)
-                    persona.telefono = clean_str(row.get('telefono'), 20)
-                    persona.direccion = clean_str(row.get('direccion'), 255)
-                    persona.comuna_residencia = clean_str(row.get('comuna')) or 'Santa Juana'
-
-                    # 2. Catálogos (Sexo y Estudios)
-                    sexo_txt = str(row.get('sexo', '')).strip().lower()
-                    persona.sexo_id = map_sexo.get(sexo_txt, 3) # Default: 3 (Prefiero no decir)
-
-                    estudio_txt = str(row.get('nivel_estudios', '')).strip().lower()
-                    persona.nivel_estudios_id = map_estudios.get(estudio_txt) # Default: None
-
-                    persona.titulo_profesional = clean_str(row.get('titulo'), 100)
-
-                    # 3. Fechas (Nacimiento e Ingresos)
-                    campos_fecha = ['fecha_nacimiento', 'fecha_ingreso_municipio', 'fecha_ingreso_sector_publico']
-                    for campo in campos_fecha:
-                        val = row.get(campo)
-                        if pd.notnull(val):
-                            try:
-                                setattr(persona, campo, pd.to_datetime(val).date())
-                            except:
-                                pass # Si la fecha es inválida, se mantiene la que tenía o null
-
-                    # 4. Datos Bancarios
-                    persona.banco_nombre = clean_str(row.get('banco'), 100)
-                    persona.tipo_cuenta = clean_str(row.get('tipo_cuenta'), 50)
-                    persona.numero_cuenta = clean_str(row.get('numero_cuenta'), 50)
-
-                    # 5. Inclusión / Discapacidad
-                    persona.es_discapacitado = parse_bool(row.get('es_discapacitado'))
-                    persona.tiene_credencial_compin = parse_bool(row.get('tiene_credencial_compin'))
-                    persona.tipo_discapacidad = clean_str(row.get('tipo_discapacidad'), 100)
-                    persona.porcentaje_discapacidad = parse_int(row.get('porcentaje_discapacidad')) # Nuevo campo
-                    persona.recibe_pension_invalidez = parse_bool(row.get('pension_invalidez'))
-
-                    # --- C. GUARDAR ---
-                    if es_nuevo:
-                        db.session.add(persona)
-                    
-                    procesados += 1
-
-                except Exception as e:
-                    errores.append(f"Fila {fila_n} (RUT {rut}): {str(e)}")
-            
             db.session.commit()
+            DashboardService.invalidar()  # bulk_* no dispara los eventos de sesión
+            BusquedaPersonasService.invalidar()
+            if progreso: progreso(procesados, procesados)
             return procesados, len(errores), errores
 
         except Exception as e:
             db.session.rollback()
-            raise Exception(f"Error crítico al procesar archivo: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error crítico al procesar archivo: {str(e)}")
+
+    # --- HELPERS VECTORIZADOS (operan sobre columnas completas) ---
+
+    @staticmethod
+    def _columna(df, nombre):
+        if nombre in df.columns:
+            return df[nombre]
+        return pd.Series(np.nan, index=df.index, dtype=object)
+
+    @staticmethod
+    def _limpiar_texto(serie, max_len=None):
+        """Equivalente vectorizado de clean_str: vacíos y 'nan' pasan a None."""
+        texto = serie.astype(str).str.strip()
+        vacio = serie.isna() | (texto == '') | (texto.str.lower() == 'nan')
+        if max_len:
+            texto = texto.str.slice(0, max_len)
+        return texto.where(~vacio, None)
+
+    @staticmethod
+    def _parsear_bool(serie):
+        texto = serie.astype(str).str.strip().str.lower()
+        return texto.isin(['si', 'yes', '1', 'true', 's']).astype(int)
+
+    @staticmethod
+    def _parsear_entero(serie):
+        return pd.to_numeric(serie, errors='coerce').fillna(0).astype(int)
+
+    @staticmethod
+    def _fecha_o_none(valor):
+        if not isinstance(valor, str) and pd.isna(valor):
+            return None  # NaN / NaT de celdas vacías
+        try:
+            return LectorTabular.convertir(valor, 'fecha')
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _parsear_fecha(serie):
+        """
+        Fechas inválidas o vacías quedan en None (se conserva el valor de la BD).
+        Los textos se leen con los formatos de LectorTabular (ISO o día primero,
+        dd/mm/aaaa): pd.to_datetime interpretaría '05/03/2024' como 3 de mayo.
+        """
+        return serie.map(PersonaService._fecha_o_none).astype(object)
+
+    @staticmethod
+    def _preparar_registros(df, map_sexo, map_estudios):
+        """
+        Transforma el DataFrame del Excel en diccionarios listos para bulk insert/update.
+        Retorna (registros, errores).
+        """
+        errores = []
+
+        rut = PersonaService._limpiar_texto(PersonaService._columna(df, 'rut'))
+        sin_rut = rut.isna()
+        for fila_n in df.loc[sin_rut, '_fila']:
+            errores.append(f"Fila {fila_n}: Columna 'RUT' vacía.")
+
+        largo = rut.str.len() > 12  # personas.rut es VARCHAR(12)
+        for fila_n, valor in zip(df.loc[largo, '_fila'], rut[largo]):
+            errores.append(f"Fila {fila_n} (RUT {valor}): RUT demasiado largo.")
+
+        validos = ~sin_rut & ~largo
+        df = df.loc[validos]
+        salida = pd.DataFrame({'rut': rut[validos], '_fila': df['_fila']}, index=df.index)
+
+        # 1. Identificación, contacto, bancarios y textos libres
+        for col_excel, (campo, max_len) in PersonaService.COLUMNAS_TEXTO.items():
+            salida[campo] = PersonaService._limpiar_texto(PersonaService._columna(df, col_excel), max_len)
+        salida['nacionalidad'] = salida['nacionalidad'].fillna('Chilena')
+        salida['comuna_residencia'] = salida['comuna_residencia'].fillna('Santa Juana')
+
+        # 2. Catálogos (Sexo y Estudios)
+        sexo_txt = PersonaService._columna(df, 'sexo').astype(str).str.strip().str.lower()
+        salida['sexo_id'] = sexo_txt.map(map_sexo).fillna(3).astype(int)  # Default: 3 (Prefiero no decir)
+
+        estudio_txt = PersonaService._columna(df, 'nivel_estudios').astype(str).str.strip().str.lower()
+        estudios = estudio_txt.map(map_estudios)
+        salida['nivel_estudios_id'] = estudios.astype(object).where(estudios.notna(), None)
+
+        # 3. Inclusión / Discapacidad
+        for col_excel, campo in PersonaService.COLUMNAS_BOOL.items():
+            salida[campo] = PersonaService._parsear_bool(PersonaService._columna(df, col_excel))
+        salida['porcentaje_discapacidad'] = PersonaService._parsear_entero(
+            PersonaService._columna(df, 'porcentaje_discapacidad')
+        )
+
+        # 4. Fechas
+        for campo in PersonaService.COLUMNAS_FECHA:
+            salida[campo] = PersonaService._parsear_fecha(PersonaService._columna(df, campo))
+
+        # RUT repetido en el archivo: prevalece la última fila
+        salida = salida.drop_duplicates(subset='rut', keep='last')
+
+        # Conversión a tipos nativos de Python para el driver
+        registros = []
+        for fila in salida.to_dict('records'):
+            registros.append({k: (int(v) if isinstance(v, np.integer) else v) for k, v in fila.items()})
+        return registros, errores
+
+    @staticmethod
+    def _guardar_registros(registros):
+        """
+        Guarda un lote dentro de un SAVEPOINT. Si la BD rechaza el lote (largo,
+        llave foránea, columna obligatoria), se revierte solo ese savepoint y el
+        lote se reintenta fila a fila para informar cada error.
+        Retorna (guardados, errores).
+        """
+        if not registros:
+            return 0, []
+        try:
+            with db.session.begin_nested():
+                PersonaService._escribir_registros(registros)
+            return len(registros), []
+        except Exception:
+            pass
+
+        guardados, errores = 0, []
+        for r in registros:
+            try:
+                with db.session.begin_nested():
+                    PersonaService._escribir_registros([r])
+                guardados += 1
+            except Exception as e:
+                causa = getattr(e, 'orig', e)
+                errores.append(f"Fila {r.get('_fila')} (RUT {r['rut']}): {causa}")
+        return guardados, errores
+
+    @staticmethod
+    def _escribir_registros(registros):
+        """Inserta los RUT nuevos y actualiza los existentes (una consulta IN + bulk)."""
+        registros = [{k: v for k, v in r.items() if k != '_fila'} for r in registros]
+        ruts = [r['rut'] for r in registros]
+        existentes = {
+            fila.rut for fila in db.session.query(Persona.rut).filter(Persona.rut.in_(ruts))
+        }
+
+        nuevos = [r for r in registros if r['rut'] not in existentes]
+        actualizados = []
+        ahora = datetime.utcnow()
+        for r in registros:
+            if r['rut'] in existentes:
+                # Una fecha vacía o inválida no borra la que ya existe en la BD
+                fila = {
+                    k: v for k, v in r.items()
+                    if not (k in PersonaService.COLUMNAS_FECHA and v is None)
+                }
+                # bulk_update no aplica 'onupdate': el sello del buscador depende de updated_at
+                fila['updated_at'] = ahora
+                actualizados.append(fila)
+
+        if nuevos:
+            db.session.bulk_insert_mappings(Persona, nuevos)
+        if actualizados:
+            db.session.bulk_update_mappings(Persona, actualizados)
@@ -0,0 +1,194 @@
+import copy
+import re
+from docx.oxml.ns import qn
+from docx.shared import Pt, RGBColor
+from docx.text.run import Run
+
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+
+class PlantillaDocx:
+    """
+    Motor de reemplazo de marcadores {{CLAVE}} sobre un documento python-docx.
+
+    1. Al construirse, recorre UNA sola vez el XML del documento (cuerpo, tablas,
+       encabezados y pies) e indexa cada marcador con su posición exacta, aunque
+       Word lo haya partido en varios 'runs' (ej: "{{NUM" + "ERO_DECRETO}}").
+    2. 'reemplazar' sustituye todos los valores en una sola pasada sobre el índice,
+       editando solo el texto de los runs: negritas, fuentes y colores de la
+       plantilla se conservan.
+
+    Costo: O(texto del documento + marcadores), en vez de O(párrafos × claves).
+    """
+
+    PATRON = re.compile(r'\{\{\s*([A-Za-z0-9_]+)\s*\}\}')
+
+    def __init__(self, documento):
+        self.documento = documento
+        # Lista de (parrafo_xml, nodos_w_t, [(inicio, fin, clave), ...])
+        self._indice = []
+        self._indexar()
+
+    # =======================================================
+    # INDEXACIÓN (UNA PASADA)
+    # =======================================================
+
+    def _raices(self):
+        """Elementos XML donde puede haber texto: cuerpo + encabezados/pies de cada sección."""
+        raices = [self.documento.element.body]
+        vistos = set()
+        for seccion in self.documento.sections:
+            for parte in (seccion.header, seccion.first_page_header, seccion.even_page_header,
+                          seccion.footer, seccion.first_page_footer, seccion.even_page_footer):
+                if parte.is_linked_to_previous:
+                    continue
+                elemento = parte._element
+                if id(elemento) not in vistos:
+                    vistos.add(id(elemento))
+                    raices.append(elemento)
+        return raices
+
+    @staticmethod
+    def _parrafo_contenedor(nodo):
+        padre = nodo.getparent()
+        while padre is not None and padre.tag != qn('w:p'):
+            padre = padre.getparent()
+        return padre
+
+    def _indexar(self):
+        for raiz in self._raices():
+            for p in raiz.iter(qn('w:p')):
+                # Solo los w:t de este párrafo (no los de cuadros de texto anidados)
+                nodos = [t for t in p.iter(qn('w:t')) if self._parrafo_contenedor(t) is p]
+                if not nodos:
+                    continue
+
+                texto = ''.join(t.text or '' for t in nodos)
+                if '{{' not in texto:
+                    continue
+
+                marcas = [(m.start(), m.end(), m.group(1)) for m in self.PATRON.finditer(texto)]
+                if marcas:
+                    self._indice.append((p, nodos, marcas))
+
+    @property
+    def claves(self):
+        """Conjunto de claves presentes en la plantilla."""
+        return {clave for _, _, marcas in self._indice for _, _, clave in marcas}
+
+    def parrafos_con(self, clave):
+        """Elementos <w:p> que contienen el marcador indicado (ej: 'TABLA_DETALLE')."""
+        return [p for p, _, marcas in self._indice if any(c == clave for _, _, c in marcas)]
+
+    # =======================================================
+    # SUSTITUCIÓN (UNA PASADA)
+    # =======================================================
+
+    def reemplazar(self, valores, estilos=None):
+        """
+        Sustituye los marcadores cuyas claves estén en 'valores'.
+        Los que no tengan valor quedan intactos en el documento.
+
+        Args:
+            valores (dict): {'NUMERO_DECRETO': '123', ...}
+            estilos (dict): Formato forzado opcional por clave, ej:
+                {'NUMERO_DECRETO': {'fuente': 'Arial Narrow', 'tamano': 12, 'negrita': True,
+                                    'color': (112, 48, 160)}}
+                El valor se aísla en su propio run para no alterar el texto vecino.
+        Returns:
+            int: cantidad de marcadores reemplazados.
+        """
+        estilos = estilos or {}
+        total = 0
+
+        for _, nodos, marcas in self._indice:
+            # Posición inicial de cada w:t dentro del texto concatenado del párrafo
+            inicios = []
+            acumulado = 0
+            for t in nodos:
+                inicios.append(acumulado)
+                acumulado += len(t.text or '')
+
+            # De derecha a izquierda: así los offsets de las marcas anteriores siguen válidos
+            for inicio, fin, clave in reversed(marcas):
+                if clave not in valores:
+                    continue
+                valor = '' if valores[clave] is None else str(valores[clave])
+                nodo_valor = self._sustituir(nodos, inicios, inicio, fin, valor)
+
+                if clave in estilos and nodo_valor is not None:
+                    self._aplicar_estilo(nodo_valor, valor, estilos[clave])
+                total += 1
+
+        return total
+
+    @staticmethod
+    def _ubicar(inicios, posicion):
+        """Índice del w:t que contiene el carácter 'posicion'."""
+        idx = 0
+        for i, ini in enumerate(inicios):
+            if ini <= posicion:
+                idx = i
+            else:
+                break
+        return idx
+
+    def _sustituir(self, nodos, inicios, inicio, fin, valor):
+        i = self._ubicar(inicios, inicio)
+        j = self._ubicar(inicios, fin - 1)
+
+        t_ini = nodos[i]
+        texto_ini = t_ini.text or ''
+        local_ini = inicio - inicios[i]
+
+        if i == j:
+            local_fin = fin - inicios[i]
+            prefijo, sufijo = texto_ini[:local_ini], texto_ini[local_fin:]
+            t_ini.text = prefijo + valor + sufijo
+        else:
+            prefijo, sufijo = texto_ini[:local_ini], ''
+            t_ini.text = prefijo + valor
+            # Los fragmentos intermedios del marcador desaparecen
+            for k in range(i + 1, j):
+                nodos[k].text = ''
+            t_fin = nodos[j]
+            t_fin.text = (t_fin.text or '')[fin - inicios[j]:]
+            t_fin.set(XML_SPACE, 'preserve')
+
+        t_ini.set(XML_SPACE, 'preserve')
+        return (t_ini, prefijo, sufijo)
+
+    @staticmethod
+    def _aplicar_estilo(nodo_valor, valor, estilo):
+        t, prefijo, sufijo = nodo_valor
+        r = t.getparent()
+        if r is None or r.tag != qn('w:r'):
+            return
+
+        objetivo = r
+        # Si el run tiene un único w:t, se separa en [prefijo][valor][sufijo]
+        # para que el formato forzado afecte solo al valor reemplazado.
+        if len(r.findall(qn('w:t'))) == 1 and (prefijo or sufijo):
+            objetivo = copy.deepcopy(r)
+            objetivo.find(qn('w:t')).text = valor
+            r.addnext(objetivo)
+
+            if sufijo:
+                r_sufijo = copy.deepcopy(r)
+                r_sufijo.find(qn('w:t')).text = sufijo
+                objetivo.addnext(r_sufijo)
+
+            if prefijo:
+                t.text = prefijo
+            else:
+                r.getparent().remove(r)
+
+        fuente = Run(objetivo, None).font
+        if 'fuente' in estilo:
+            fuente.name = estilo['fuente']
+        if 'tamano' in estilo:
+            fuente.size = Pt(estilo['tamano'])
+        if 'negrita' in estilo:
+            fuente.bold = estilo['negrita']
+        if 'color' in estilo:
+            fuente.color.rgb = RGBColor(*estilo['color'])
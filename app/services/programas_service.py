@@ -1,5 +1,8 @@
 from app.extensions import db
+from sqlalchemy import func
 from app.models.programas import Programa, CuentaPresupuestaria
+from app.models.contratos import ContratoHonorario, ContratoCuota, ContratoCuotaDetalle, ContratoDistribucionCuenta
+from app.services.libro_presupuestario_service import LibroPresupuestarioService
 from datetime import datetime
 
 class ProgramasService:
@@ -32,14 +35,22 @@ class ProgramasService:
             db.session.flush() # Esto genera el ID del programa sin cerrar la transacción
 
             # 3. Crear las Cuentas asociadas (Details)
+            nuevas_cuentas = []
             for c in lista_cuentas:
                 nueva_cuenta = CuentaPresupuestaria(
                     programa_id=nuevo_prog.id,
                     codigo=c['codigo'],
                     monto_inicial=int(c['monto']),
-                    saldo_actual=int(c['monto']) # Al inicio, el saldo es igual al inicial
+                    saldo_actual=0 # El saldo inicial entra por el libro (APERTURA)
                 )
                 db.session.add(nueva_cuenta)
+                nuevas_cuentas.append(nueva_cuenta)
+            db.session.flush()
+
+            LibroPresupuestarioService.acreditar(
+                [(c.id, c.monto_inicial) for c in nuevas_cuentas], concepto='APERTURA',
+                glosa=f"Decreto N° {nuevo_prog.numero_decreto}"
+            )
             
             # 4. Si todo salió bien, guardamos todo junto
             db.session.commit()
@@ -50,18 +61,70 @@ class ProgramasService:
             db.session.rollback()
             raise e
 
+    # =======================================================
+    # MOTOR DE ASIGNACIÓN (MAYOR RESTO CON TOPES)
+    # =======================================================
+
     @staticmethod
-    def calcular_distribucion_automatica(programa_id, monto_total_contrato):
+    def repartir_mayor_resto(total, pesos, topes=None):
         """
-        Distribuye el costo total de un contrato entre las cuentas del programa
-        proporcionalmente al saldo que tiene cada una.
+        Reparte 'total' (entero) en proporción a 'pesos' sin superar 'topes'.
+        Método del mayor resto: cada parte recibe la parte entera de su cuota exacta
+        y los pesos sobrantes van, de a uno, a los mayores restos. Si una parte
+        excede su tope, queda en el tope y el resto se reparte entre las demás.
+        Retorna una lista de enteros que suma exactamente 'total'.
         """
+        n = len(pesos)
+        topes = list(topes) if topes is not None else [None] * n
+        asignado = [0] * n
+        activos = [i for i in range(n) if pesos[i] > 0 and (topes[i] is None or topes[i] > 0)]
+        restante = int(total)
+
+        while restante > 0 and activos:
+            suma = sum(pesos[i] for i in activos)
+
+            # Partes cuya cuota exacta supera el tope: se fijan en el tope
+            excedidos = [
+                i for i in activos
+                if topes[i] is not None and restante * pesos[i] > (topes[i] - asignado[i]) * suma
+            ]
+            if excedidos:
+                for i in excedidos:
+                    restante -= topes[i] - asignado[i]
+                    asignado[i] = topes[i]
+                activos = [i for i in activos if i not in excedidos]
+                continue
+
+            base = {i: restante * pesos[i] // suma for i in activos}
+            resto = {i: restante * pesos[i] % suma for i in activos}
+            faltan = restante - sum(base.values())
+            for i in activos:
+                asignado[i] += base[i]
+            for i in sorted(activos, key=lambda k: (-resto[k], k))[:faltan]:
+                asignado[i] += 1
+            restante = 0
+
+        if restante > 0:
+            raise ValueError(f"No es posible asignar ${total:,.0f}: faltan ${restante:,.0f} de capacidad.")
+        return asignado
+
+    @staticmethod
+    def _cuentas_con_saldo(programa_id):
         programa = Programa.query.get(programa_id)
         if not programa or not programa.cuentas:
             raise ValueError("El programa seleccionado no tiene cuentas presupuestarias.")
+        return programa.cuentas
+
+    @staticmethod
+    def calcular_distribucion_automatica(programa_id, monto_total_contrato):
+        """
+        Distribuye el costo total de un contrato entre las cuentas del programa
+        proporcionalmente al saldo que tiene cada una, sin superar el saldo de ninguna.
+        """
+        cuentas = ProgramasService._cuentas_con_saldo(programa_id)
 
         # 1. Filtramos SOLO las cuentas que tienen dinero (evita división por cero)
-        cuentas_validas = [c for c in programa.cuentas if c.saldo_actual > 0]
+        cuentas_validas = [c for c in cuentas if c.saldo_actual > 0]
         
         if not cuentas_validas:
              raise ValueError("El programa no tiene ninguna cuenta con saldo disponible.")
@@ -72,53 +135,175 @@ class ProgramasService:
         if saldo_global < monto_total_contrato:
             raise ValueError(f"Saldo insuficiente en el programa. (Disponible: ${saldo_global:,.0f} | Requerido: ${monto_total_contrato:,.0f})")
 
-        distribucion = []
-        monto_acumulado = 0
-        total_cuentas = len(cuentas_validas)
-        
-        # 3. Distribuir proporcionalmente (Regla de Tres)
-        for i, cuenta in enumerate(cuentas_validas):
-            
-            # Si es la última cuenta de la lista válida, le asignamos la diferencia exacta
-            # Esto corrige cualquier error de redondeo de los anteriores
-            if i == total_cuentas - 1:
-                monto_asignado = monto_total_contrato - monto_acumulado
-            else:
-                # Cálculo: (SaldoCuenta / SaldoTotal) * CostoContrato
-                peso = cuenta.saldo_actual / saldo_global
-                monto_asignado = int(monto_total_contrato * peso)
-            
-            # Solo agregamos si hay monto (por seguridad)
-            if monto_asignado > 0:
-                distribucion.append({
-                    'cuenta_id': cuenta.id,
-                    'codigo': cuenta.codigo,
-                    'monto': monto_asignado
-                })
-                monto_acumulado += monto_asignado
+        # 3. Mayor resto, con el saldo de cada cuenta como tope
+        saldos = [c.saldo_actual for c in cuentas_validas]
+        montos = ProgramasService.repartir_mayor_resto(monto_total_contrato, saldos, saldos)
+
+        return [
+            {'cuenta_id': cuenta.id, 'codigo': cuenta.codigo, 'monto': monto}
+            for cuenta, monto in zip(cuentas_validas, montos) if monto > 0
+        ]
+
+    @staticmethod
+    def calendario_cuotas(monto_total, num_cuotas, f_inicio):
+        """
+        Cuotas mensuales consecutivas desde f_inicio.
+        La última cuota absorbe el resto de la división para que la suma sea exacta.
+        Retorna [(numero, mes, anio, monto), ...].
+        """
+        base = monto_total // num_cuotas
+        resto = monto_total - base * num_cuotas
+
+        cuotas = []
+        for i in range(num_cuotas):
+            mes = (f_inicio.month + i - 1) % 12 + 1
+            anio = f_inicio.year + (f_inicio.month + i - 1) // 12
+            monto = base + (resto if i == num_cuotas - 1 else 0)
+            cuotas.append((i + 1, mes, anio, monto))
+        return cuotas
 
-        return distribucion
+    @staticmethod
+    def calcular_matriz_cuotas(programa_id, monto_total, num_cuotas, f_inicio):
+        """
+        Matriz completa cuota x cuenta en una llamada, con el mismo formato que
+        'json_detalle_completo': [{'mes', 'anio', 'monto', 'distribucion': [...]}].
+
+        El total por cuenta sale de calcular_distribucion_automatica; cada cuota se
+        reparte en proporción a lo que aún falta imputar a cada cuenta (con ese
+        faltante como tope), así filas y columnas cuadran exactamente.
+        """
+        cuentas = ProgramasService._cuentas_con_saldo(programa_id)
+        por_cuenta = {d['cuenta_id']: d['monto'] for d in
+                      ProgramasService.calcular_distribucion_automatica(programa_id, monto_total)}
+        pendiente = [por_cuenta.get(c.id, 0) for c in cuentas]
+
+        matriz = []
+        for _, mes, anio, monto in ProgramasService.calendario_cuotas(monto_total, num_cuotas, f_inicio):
+            fila = ProgramasService.repartir_mayor_resto(monto, pendiente, pendiente)
+            pendiente = [p - f for p, f in zip(pendiente, fila)]
+            matriz.append({
+                'mes': mes,
+                'anio': anio,
+                'monto': monto,
+                'distribucion': [
+                    {'cuenta_id': c.id, 'codigo': c.codigo, 'nombre': getattr(c, 'descripcion', None) or 'Cuenta Presupuestaria', 'monto': m}
+                    for c, m in zip(cuentas, fila)
+                ]
+            })
+        return matriz
 
     @staticmethod
     def rebajar_saldo(distribucion_json):
         """
         Descuenta el dinero de las cuentas una vez que el contrato se aprueba/guarda.
         Recibe el JSON de distribución generado arriba.
+        Compatibilidad: delega en el libro presupuestario (bloqueo de filas + movimientos)
+        y confirma la transacción.
         """
         try:
-            for item in distribucion_json:
-                cuenta = CuentaPresupuestaria.query.get(item['cuenta_id'])
-                if cuenta:
-                    monto_a_descontar = int(item['monto'])
-                    
-                    # Verificación de seguridad final
-                    if cuenta.saldo_actual < monto_a_descontar:
-                        raise ValueError(f"La cuenta {cuenta.codigo} no tiene saldo suficiente para completar la operación.")
-                    
-                    cuenta.saldo_actual -= monto_a_descontar
-            
+            LibroPresupuestarioService.debitar(distribucion_json, concepto='CONTRATO')
             db.session.commit()
             return True
         except Exception as e:
             db.session.rollback()
-            raise e
\ No newline at end of file
+            raise e
+
+    # =======================================================
+    # EJECUCIÓN PRESUPUESTARIA (AGREGADA EN LA BD)
+    # =======================================================
+
+    @staticmethod
+    def ejecucion_por_cuenta(programa_id=None):
+        """
+        Por cuenta: presupuesto inicial, comprometido en contratos, saldo y número
+        de contratos. Un solo GROUP BY sobre 'contratos_distribucion_cuentas'.
+        """
+        comprometido = func.coalesce(func.sum(ContratoDistribucionCuenta.monto), 0)
+        query = db.session.query(
+            Programa.id.label('programa_id'),
+            Programa.nombre.label('programa'),
+            CuentaPresupuestaria.id.label('cuenta_id'),
+            CuentaPresupuestaria.codigo,
+            CuentaPresupuestaria.monto_inicial,
+            CuentaPresupuestaria.saldo_actual,
+            comprometido.label('comprometido'),
+            func.count(func.distinct(ContratoDistribucionCuenta.contrato_id)).label('contratos')
+        ).join(Programa, CuentaPresupuestaria.programa_id == Programa.id) \
+         .outerjoin(ContratoDistribucionCuenta, ContratoDistribucionCuenta.cuenta_id == CuentaPresupuestaria.id)
+
+        if programa_id:
+            query = query.filter(CuentaPresupuestaria.programa_id == programa_id)
+
+        filas = query.group_by(
+            Programa.id, Programa.nombre, CuentaPresupuestaria.id, CuentaPresupuestaria.codigo,
+            CuentaPresupuestaria.monto_inicial, CuentaPresupuestaria.saldo_actual
+        ).order_by(Programa.nombre, CuentaPresupuestaria.codigo).all()
+
+        return [{
+            'programa_id': f.programa_id,
+            'programa': f.programa,
+            'cuenta_id': f.cuenta_id,
+            'codigo': f.codigo,
+            'monto_inicial': int(f.monto_inicial or 0),
+            'comprometido': int(f.comprometido or 0),
+            'saldo_actual': int(f.saldo_actual or 0),
+            'porcentaje_ejecucion': round(int(f.comprometido or 0) * 100 / f.monto_inicial, 2) if f.monto_inicial else 0,
+            'contratos': f.contratos
+        } for f in filas]
+
+    @staticmethod
+    def ejecucion_por_programa():
+        """Totales por programa (inicial, comprometido, saldo) agregados en SQL."""
+        comprometido = db.session.query(
+            ContratoDistribucionCuenta.cuenta_id,
+            func.sum(ContratoDistribucionCuenta.monto).label('monto')
+        ).group_by(ContratoDistribucionCuenta.cuenta_id).subquery()
+
+        filas = db.session.query(
+            Programa.id, Programa.nombre,
+            func.coalesce(func.sum(CuentaPresupuestaria.monto_inicial), 0).label('inicial'),
+            func.coalesce(func.sum(comprometido.c.monto), 0).label('comprometido'),
+            func.coalesce(func.sum(CuentaPresupuestaria.saldo_actual), 0).label('saldo')
+        ).join(CuentaPresupuestaria, CuentaPresupuestaria.programa_id == Programa.id) \
+         .outerjoin(comprometido, comprometido.c.cuenta_id == CuentaPresupuestaria.id) \
+         .group_by(Programa.id, Programa.nombre) \
+         .order_by(Programa.nombre).all()
+
+        return [{
+            'programa_id': f.id,
+            'programa': f.nombre,
+            'monto_inicial': int(f.inicial),
+            'comprometido': int(f.comprometido),
+            'saldo_actual': int(f.saldo)
+        } for f in filas]
+
+    @staticmethod
+    def ejecucion_mensual(anio, programa_id=None):
+        """
+        Devengo mensual por programa y cuenta según el calendario de cuotas
+        (detalle de imputación por cuota).
+        """
+        query = db.session.query(
+            ContratoHonorario.programa_id,
+            ContratoCuotaDetalle.codigo_cuenta,
+            ContratoCuota.mes,
+            func.sum(ContratoCuotaDetalle.monto_parcial).label('devengado'),
+            func.count(func.distinct(ContratoHonorario.id)).label('contratos')
+        ).join(ContratoCuota, ContratoCuotaDetalle.cuota_id == ContratoCuota.id) \
+         .join(ContratoHonorario, ContratoCuota.contrato_id == ContratoHonorario.id) \
+         .filter(ContratoCuota.anio == anio)
+
+        if programa_id:
+            query = query.filter(ContratoHonorario.programa_id == programa_id)
+
+        filas = query.group_by(
+            ContratoHonorario.programa_id, ContratoCuotaDetalle.codigo_cuenta, ContratoCuota.mes
+        ).order_by(ContratoHonorario.programa_id, ContratoCuotaDetalle.codigo_cuenta, ContratoCuota.mes).all()
+
+        return [{
+            'programa_id': f.programa_id,
+            'codigo': f.codigo_cuenta,
+            'mes': f.mes,
+            'devengado': int(f.devengado or 0),
+            'contratos': f.contratos
+        } for f in filas]
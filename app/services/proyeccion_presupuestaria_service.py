@@ -0,0 +1,165 @@
+import numpy as np
+from datetime import date
+from sqlalchemy import func, case
+from app.extensions import db
+from app.models.programas import Programa, CuentaPresupuestaria, MovimientoPresupuestario
+from app.models.contratos import ContratoHonorario, ContratoCuota, ContratoCuotaDetalle
+
+
+class ProyeccionPresupuestariaService:
+    """
+    Proyección de cobertura de las cuotas pendientes de honorarios, para todo el
+    municipio, en tres consultas agrupadas + álgebra con NumPy:
+
+    1. Cuotas PENDIENTES de contratos no anulados, sumadas por (programa, cuenta, año, mes).
+    2. Cuentas presupuestarias con su saldo actual (fondos libres).
+    3. Reserva de cada cuenta en el libro: débitos menos créditos de los
+       movimientos asociados a contratos no anulados.
+
+    Los contratos rebajan el saldo al guardarse, así que sus cuotas ya están
+    respaldadas por esa reserva; solo lo que exceda la reserva (cuotas editadas,
+    imputadas a otra cuenta o cargadas sin su débito) debe salir del saldo libre.
+    Columnas por cuenta y mes:
+
+    - pendiente: cuotas del mes.
+    - sin_respaldo: cuotas acumuladas hasta el mes que la reserva no cubre
+      (las cuotas consumen la reserva en orden cronológico).
+    - saldo_proyectado: saldo_actual - sin_respaldo; negativo = déficit.
+    """
+
+    # =======================================================
+    # CONSULTAS
+    # =======================================================
+
+    @staticmethod
+    def _pendientes_agrupados(programa_id=None):
+        query = db.session.query(
+            ContratoHonorario.programa_id,
+            ContratoCuotaDetalle.codigo_cuenta,
+            ContratoCuota.anio,
+            ContratoCuota.mes,
+            func.sum(ContratoCuotaDetalle.monto_parcial)
+        ).join(ContratoCuota, ContratoCuotaDetalle.cuota_id == ContratoCuota.id) \
+         .join(ContratoHonorario, ContratoCuota.contrato_id == ContratoHonorario.id) \
+         .filter(ContratoCuota.estado == 'PENDIENTE', ContratoHonorario.estado != 'ANULADO')
+        if programa_id:
+            query = query.filter(ContratoHonorario.programa_id == programa_id)
+        return query.group_by(
+            ContratoHonorario.programa_id, ContratoCuotaDetalle.codigo_cuenta,
+            ContratoCuota.anio, ContratoCuota.mes
+        ).all()
+
+    @staticmethod
+    def _reservas(programa_id=None):
+        """{cuenta_id: reserva} = débitos - créditos de contratos no anulados en el libro."""
+        M = MovimientoPresupuestario
+        query = db.session.query(
+            M.cuenta_id,
+            func.sum(case((M.tipo == 'DEBITO', M.monto), else_=-M.monto))
+        ).join(ContratoHonorario, M.contrato_id == ContratoHonorario.id) \
+         .filter(ContratoHonorario.estado != 'ANULADO')
+        if programa_id:
+            query = query.filter(ContratoHonorario.programa_id == programa_id)
+        return {cuenta_id: int(reserva or 0) for cuenta_id, reserva in query.group_by(M.cuenta_id).all()}
+
+    @staticmethod
+    def _cuentas(programa_id=None):
+        query = db.session.query(
+            CuentaPresupuestaria.id, CuentaPresupuestaria.programa_id,
+            CuentaPresupuestaria.codigo, CuentaPresupuestaria.saldo_actual,
+            Programa.nombre
+        ).join(Programa, CuentaPresupuestaria.programa_id == Programa.id)
+        if programa_id:
+            query = query.filter(CuentaPresupuestaria.programa_id == programa_id)
+        return query.order_by(Programa.nombre, CuentaPresupuestaria.codigo).all()
+
+    # =======================================================
+    # PROYECCIÓN
+    # =======================================================
+
+    @staticmethod
+    def proyectar(desde=None, programa_id=None):
+        """
+        Matriz programa x mes desde el mes de 'desde' (por defecto, el actual)
+        hasta el último mes con cuotas pendientes. Las cuotas pendientes de meses
+        anteriores se suman al primer mes (vencidas).
+
+        Retorna {'meses': [(anio, mes)], 'programas': [...]} donde cada programa trae
+        'pendiente', 'sin_respaldo' y 'saldo_proyectado' por mes (ver la
+        docstring de la clase), 'primer_deficit' y sus cuentas.
+        """
+        desde = desde or date.today()
+        origen = desde.year * 12 + (desde.month - 1)
+
+        cuentas = ProyeccionPresupuestariaService._cuentas(programa_id)
+        pendientes = ProyeccionPresupuestariaService._pendientes_agrupados(programa_id)
+        reservas = ProyeccionPresupuestariaService._reservas(programa_id)
+        if not cuentas:
+            return {'meses': [], 'programas': []}
+
+        fila_cuenta = {(c.programa_id, c.codigo): i for i, c in enumerate(cuentas)}
+        programa_ids = list(dict.fromkeys(c.programa_id for c in cuentas))
+        fila_programa = {pid: i for i, pid in enumerate(programa_ids)}
+
+        # 1. Vectores de índices (fila de cuenta, columna de mes, monto)
+        filas, columnas, montos = [], [], []
+        for programa, codigo, anio, mes, monto in pendientes:
+            fila = fila_cuenta.get((programa, codigo))
+            if fila is None:
+                continue  # Imputación a un código que ya no existe en el programa
+            filas.append(fila)
+            columnas.append(max(0, anio * 12 + (mes - 1) - origen))
+            montos.append(int(monto or 0))
+
+        n_meses = (max(columnas) + 1) if columnas else 1
+        pendiente = np.zeros((len(cuentas), n_meses), dtype=np.int64)
+        if filas:
+            np.add.at(pendiente, (np.array(filas), np.array(columnas)), np.array(montos, dtype=np.int64))
+
+        # 2. Saldo proyectado por cuenta: saldo libre - cuotas acumuladas sin reserva
+        saldo = np.array([int(c.saldo_actual or 0) for c in cuentas], dtype=np.int64)
+        reserva = np.array([reservas.get(c.id, 0) for c in cuentas], dtype=np.int64)
+        sin_respaldo = np.maximum(np.cumsum(pendiente, axis=1) - reserva[:, None], 0)
+        proyectado = saldo[:, None] - sin_respaldo
+
+        # 3. Agregación por programa
+        programa_de_fila = np.array([fila_programa[c.programa_id] for c in cuentas])
+        pendiente_prog = np.zeros((len(programa_ids), n_meses), dtype=np.int64)
+        sin_respaldo_prog = np.zeros((len(programa_ids), n_meses), dtype=np.int64)
+        proyectado_prog = np.zeros((len(programa_ids), n_meses), dtype=np.int64)
+        np.add.at(pendiente_prog, programa_de_fila, pendiente)
+        np.add.at(sin_respaldo_prog, programa_de_fila, sin_respaldo)
+        np.add.at(proyectado_prog, programa_de_fila, proyectado)
+
+        # Primer mes con déficit en alguna cuenta del programa (-1 si no hay)
+        deficit_cuenta = proyectado < 0
+        primer_deficit_cuenta = np.where(deficit_cuenta.any(axis=1), deficit_cuenta.argmax(axis=1), -1)
+
+        meses = [((origen + k) // 12, (origen + k) % 12 + 1) for k in range(n_meses)]
+        nombres = {c.programa_id: c.nombre for c in cuentas}
+
+        resultado = []
+        for pid in programa_ids:
+            p = fila_programa[pid]
+            idx_cuentas = np.nonzero(programa_de_fila == p)[0]
+            deficits = [int(primer_deficit_cuenta[i]) for i in idx_cuentas if primer_deficit_cuenta[i] >= 0]
+            resultado.append({
+                'programa_id': pid,
+                'programa': nombres[pid],
+                'pendiente': pendiente_prog[p].tolist(),
+                'sin_respaldo': sin_respaldo_prog[p].tolist(),
+                'saldo_proyectado': proyectado_prog[p].tolist(),
+                'primer_deficit': meses[min(deficits)] if deficits else None,
+                'cuentas': [{
+                    'cuenta_id': cuentas[i].id,
+                    'codigo': cuentas[i].codigo,
+                    'saldo_actual': int(saldo[i]),
+                    'reserva': int(reserva[i]),
+                    'pendiente': pendiente[i].tolist(),
+                    'sin_respaldo': sin_respaldo[i].tolist(),
+                    'saldo_proyectado': proyectado[i].tolist(),
+                    'primer_deficit': meses[primer_deficit_cuenta[i]] if primer_deficit_cuenta[i] >= 0 else None
+                } for i in idx_cuentas]
+            })
+
+        return {'meses': meses, 'programas': resultado}
@@ -0,0 +1,158 @@
+import calendar
+import numpy as np
+from datetime import date
+from sqlalchemy import func, or_
+from app.extensions import db
+from app.models.nombramientos import Nombramiento
+from app.models.remuneraciones import EscalaRemuneraciones
+from app.models.catalogos import CatEstamento, CatUnidad
+from app.services.simulacion_remuneraciones_service import SimulacionRemuneracionesService
+
+
+class ProyeccionRemuneracionesService:
+    """
+    Proyección del costo anual de la planilla base (sueldo base + haberes fijos
+    permanentes) de los nombramientos VIGENTES.
+
+    1. Una consulta trae los nombramientos que se traslapan con el año.
+    2. Para cada mes se elige la escala en vigor al día 1 (o la que empieza en
+       el mes, si ninguna estaba vigente) y se evalúa una vez con el motor
+       vectorizado de SimulacionRemuneracionesService.
+    3. Con NumPy se arma la matriz nombramiento x mes: sueldo mensual x fracción
+       de días del mes cubierta por fecha_inicio/fecha_fin, y se agrega por
+       unidad, estamento y calidad jurídica con np.add.at.
+    """
+
+    SIN_UNIDAD = 'Sin unidad'
+
+    # =======================================================
+    # CONSULTAS
+    # =======================================================
+
+    @staticmethod
+    def _nombramientos(anio):
+        inicio, fin = date(anio, 1, 1), date(anio, 12, 31)
+        return db.session.query(
+            Nombramiento.estamento_id, Nombramiento.grado, Nombramiento.unidad_id,
+            Nombramiento.calidad_juridica, Nombramiento.fecha_inicio, Nombramiento.fecha_fin
+        ).filter(
+            Nombramiento.estado == 'VIGENTE',
+            Nombramiento.fecha_inicio <= fin,
+            or_(Nombramiento.fecha_fin.is_(None), Nombramiento.fecha_fin >= inicio)
+        ).all()
+
+    @staticmethod
+    def _periodos():
+        """[(fecha_vigencia, fecha_fin o None si sigue abierta)] de las escalas registradas."""
+        filas = db.session.query(
+            EscalaRemuneraciones.fecha_vigencia,
+            func.max(EscalaRemuneraciones.fecha_fin),
+            func.count(EscalaRemuneraciones.id),
+            func.count(EscalaRemuneraciones.fecha_fin)
+        ).group_by(EscalaRemuneraciones.fecha_vigencia) \
+         .order_by(EscalaRemuneraciones.fecha_vigencia).all()
+        return [(vigencia, fin if n_fin == n else None) for vigencia, fin, n, n_fin in filas]
+
+    @staticmethod
+    def _escala_del_mes(periodos, anio, mes):
+        primero = date(anio, mes, 1)
+        ultimo = date(anio, mes, calendar.monthrange(anio, mes)[1])
+        vigentes = [v for v, fin in periodos if v <= primero and (fin is None or fin >= primero)]
+        if vigentes:
+            return vigentes[-1]
+        en_el_mes = [v for v, _ in periodos if primero < v <= ultimo]
+        return en_el_mes[0] if en_el_mes else None
+
+    @staticmethod
+    def _sueldos_periodo(fecha_vigencia):
+        """{(estamento_id, grado): sueldo base + fijos} de toda la escala, en una pasada."""
+        periodo = SimulacionRemuneracionesService.cargar_periodo(fecha_vigencia)
+        claves = sorted(periodo['base'])
+        if not claves:
+            return {}
+        estamentos = [e for e, _ in claves]
+        variables = SimulacionRemuneracionesService.evaluar(periodo, [g for _, g in claves], estamentos, {})
+        _, _, total = SimulacionRemuneracionesService.totales_fijos(periodo, variables, estamentos)
+        return dict(zip(claves, total.tolist()))
+
+    # =======================================================
+    # PROYECCIÓN
+    # =======================================================
+
+    @staticmethod
+    def _agrupar(costo, etiquetas):
+        """Suma las filas de 'costo' (n x 12) por etiqueta. Retorna [(etiqueta, arreglo[12])]."""
+        valores, indices = np.unique(np.array(etiquetas, dtype=object).astype(str), return_inverse=True)
+        suma = np.zeros((len(valores), costo.shape[1]), dtype=np.float64)
+        np.add.at(suma, indices, costo)
+        return list(zip(valores.tolist(), suma))
+
+    @staticmethod
+    def proyectar(anio):
+        """
+        Costo mensual proyectado del año: total y por unidad, estamento y calidad
+        jurídica. Los meses sin escala aplicable se informan en 'meses_sin_escala'.
+        """
+        nombramientos = ProyeccionRemuneracionesService._nombramientos(anio)
+        periodos = ProyeccionRemuneracionesService._periodos()
+
+        escala_mes = [ProyeccionRemuneracionesService._escala_del_mes(periodos, anio, m) for m in range(1, 13)]
+        resultado = {
+            'anio': anio,
+            'nombramientos': len(nombramientos),
+            'escalas': sorted({str(v) for v in escala_mes if v}),
+            'meses_sin_escala': [m + 1 for m, v in enumerate(escala_mes) if v is None],
+            'total_mensual': [0] * 12,
+            'total_anual': 0,
+            'por_unidad': [],
+            'por_estamento': [],
+            'por_calidad': []
+        }
+        if not nombramientos:
+            return resultado
+
+        # 1. Fracción de cada mes cubierta por cada nombramiento (n x 12)
+        abierto = date(anio, 12, 31).toordinal()
+        inicio = np.array([n.fecha_inicio.toordinal() for n in nombramientos], dtype=np.int64)
+        fin = np.array([n.fecha_fin.toordinal() if n.fecha_fin else abierto for n in nombramientos], dtype=np.int64)
+        desde_mes = np.array([date(anio, m, 1).toordinal() for m in range(1, 13)], dtype=np.int64)
+        dias_mes = np.array([calendar.monthrange(anio, m)[1] for m in range(1, 13)], dtype=np.int64)
+        hasta_mes = desde_mes + dias_mes - 1
+        dias = np.minimum(fin[:, None], hasta_mes[None, :]) - np.maximum(inicio[:, None], desde_mes[None, :]) + 1
+        fraccion = np.clip(dias, 0, None) / dias_mes[None, :]
+
+        # 2. Sueldo mensual de cada nombramiento según la escala de cada mes (n x 12)
+        claves = [(n.estamento_id, n.grado) for n in nombramientos]
+        sueldo = np.zeros((len(nombramientos), 12), dtype=np.float64)
+        for vigencia in set(v for v in escala_mes if v):
+            tabla = ProyeccionRemuneracionesService._sueldos_periodo(vigencia)
+            columna = np.array([tabla.get(k, 0) for k in claves], dtype=np.float64)
+            meses = [m for m, v in enumerate(escala_mes) if v == vigencia]
+            sueldo[:, meses] = columna[:, None]
+
+        costo = np.rint(sueldo * fraccion)
+
+        # 3. Agregaciones
+        unidades = dict(db.session.query(CatUnidad.id, CatUnidad.nombre).all())
+        estamentos = dict(db.session.query(CatEstamento.id, CatEstamento.estamento).all())
+
+        def serializar(grupos):
+            return sorted([
+                {'nombre': nombre, 'mensual': [int(x) for x in suma], 'anual': int(suma.sum())}
+                for nombre, suma in grupos
+            ], key=lambda g: -g['anual'])
+
+        agrupar = ProyeccionRemuneracionesService._agrupar
+        total = costo.sum(axis=0)
+        resultado.update({
+            'total_mensual': [int(x) for x in total],
+            'total_anual': int(total.sum()),
+            'por_unidad': serializar(agrupar(costo, [
+                unidades.get(n.unidad_id, ProyeccionRemuneracionesService.SIN_UNIDAD) for n in nombramientos
+            ])),
+            'por_estamento': serializar(agrupar(costo, [
+                estamentos.get(n.estamento_id, str(n.estamento_id)) for n in nombramientos
+            ])),
+            'por_calidad': serializar(agrupar(costo, [n.calidad_juridica for n in nombramientos]))
+        })
+        return resultado
@@ -4,6 +4,8 @@ from app.models.remuneraciones import EscalaRemuneraciones, EscalaRemuneraciones
 # CORRECCIÓN: Importar CatEstamento (Singular)
 from app.models.catalogos import CatEstamento
 from sqlalchemy import desc
+from app.services.simulacion_remuneraciones_service import SimulacionRemuneracionesService
+from app.services.historial_escalas_service import HistorialEscalasService
 
 class RemuneracionesService:
     
@@ -50,6 +52,7 @@ class RemuneracionesService:
                     )
                     db.session.add(detalle)
             
+            HistorialEscalasService.escribir_periodo(nueva_escala.fecha_vigencia)
             db.session.commit()
             return nueva_escala
         except Exception as e:
@@ -130,6 +133,7 @@ class RemuneracionesService:
     @staticmethod
     def guardar_matriz(form_data):
         try:
+            escalas_ids = set()
             for key, valor in form_data.items():
                 if not valor: continue
                 try:
@@ -142,18 +146,25 @@ class RemuneracionesService:
                     escala = EscalaRemuneraciones.query.get(escala_id)
                     if escala:
                         escala.sueldo_base = valor_int
+                        escalas_ids.add(escala.id)
 
                 elif key.startswith('haber_'):
                     partes = key.split('_')
                     if len(partes) == 3:
                         escala_id = partes[1]
                         haber_id = partes[2]
+                        escalas_ids.add(int(escala_id))
                         detalle = EscalaRemuneracionesDetalle.query.filter_by(escala_id=escala_id, haber_id=haber_id).first()
                         if detalle:
                             detalle.monto = valor_int
                         else:
                             nuevo_detalle = EscalaRemuneracionesDetalle(escala_id=escala_id, haber_id=haber_id, monto=valor_int)
                             db.session.add(nuevo_detalle)
+            if escalas_ids:
+                fechas = db.session.query(EscalaRemuneraciones.fecha_vigencia) \
+                    .filter(EscalaRemuneraciones.id.in_(escalas_ids)).distinct().all()
+                for (fecha,) in fechas:
+                    HistorialEscalasService.escribir_periodo(fecha)
             db.session.commit()
             return True
         except Exception as e:
@@ -220,8 +231,9 @@ class RemuneracionesService:
                 
                 if formula:
                     try:
-                        # Evaluamos la expresión matemática
-                        resultado = eval(formula, {"__builtins__": None}, variables)
+                        # Evaluamos la expresión matemática (compilada una sola vez por texto)
+                        codigo = SimulacionRemuneracionesService.compilar(formula)
+                        resultado = eval(codigo if codigo is not None else formula, {"__builtins__": None}, variables)
                         
                         # Redondear y guardar como entero
                         resultado_final = int(round(resultado))
@@ -301,6 +313,7 @@ class RemuneracionesService:
                                     )
                                     db.session.add(nuevo)
             
+            HistorialEscalasService.escribir_periodo(fecha_vigencia)
             db.session.commit()
             return True
         except Exception as e:
@@ -342,6 +355,7 @@ class RemuneracionesService:
                 db.session.add(nueva)
                 count += 1
         
+        HistorialEscalasService.escribir_periodo(fecha)
         db.session.commit()
         return count
 
@@ -405,6 +419,7 @@ class RemuneracionesService:
             
             contador += 1
 
+        HistorialEscalasService.escribir_periodo(fecha_destino)
         db.session.commit()
         return contador
     
@@ -428,6 +443,7 @@ class RemuneracionesService:
             for reg in registros:
                 db.session.delete(reg)
             
+            HistorialEscalasService.borrar_periodo(fecha_vigencia)
             db.session.commit()
             return count
         except Exception as e:
@@ -471,6 +487,7 @@ class RemuneracionesService:
                             detalle.monto = int(detalle.monto * factor)
                 count += 1
 
+            HistorialEscalasService.escribir_periodo(fecha_vigencia)
             db.session.commit()
             return count 
 
@@ -478,6 +495,44 @@ class RemuneracionesService:
             db.session.rollback()
             raise e
     
+    @staticmethod
+    def confirmar_reajuste(fecha_vigencia, tramos, firma=None):
+        """
+        Persiste los tramos previsualizados con
+        SimulacionRemuneracionesService.previsualizar_reajuste. Si se entrega la
+        'firma' y la escala cambió desde la previsualización, no se aplica nada.
+        """
+        try:
+            tramos = SimulacionRemuneracionesService.normalizar_tramos(tramos)
+            periodo = SimulacionRemuneracionesService.cargar_periodo(fecha_vigencia)
+            if firma and firma != SimulacionRemuneracionesService.firma(periodo, tramos):
+                raise ValueError("La escala cambió desde la previsualización. Vuelva a previsualizar el reajuste.")
+
+            escalas = EscalaRemuneraciones.query.filter_by(fecha_vigencia=fecha_vigencia).all()
+            if not escalas:
+                return 0
+
+            factores = SimulacionRemuneracionesService.factores_reajuste(
+                periodo, [esc.grado for esc in escalas], tramos
+            )
+            codigo_de = {h.id: h.codigo for h in periodo['haberes']}
+
+            for i, esc in enumerate(escalas):
+                if 'SUELDO_BASE' in factores:
+                    esc.sueldo_base = int(esc.sueldo_base * factores['SUELDO_BASE'][i])
+                for detalle in esc.detalles:
+                    codigo = codigo_de.get(detalle.haber_id)
+                    if codigo in factores and detalle.monto > 0:
+                        detalle.monto = int(detalle.monto * factores[codigo][i])
+
+            HistorialEscalasService.escribir_periodo(fecha_vigencia)
+            db.session.commit()
+            return len(escalas)
+
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
     @staticmethod
     def actualizar_fecha_masiva(fecha_anterior, fecha_nueva, nueva_fecha_fin=None):
         """
@@ -506,6 +561,9 @@ class RemuneracionesService:
                 reg.fecha_fin = fecha_fin_val
                 count += 1
             
+            if fecha_anterior != fecha_nueva:
+                HistorialEscalasService.borrar_periodo(fecha_anterior)
+            HistorialEscalasService.escribir_periodo(fecha_nueva)
             db.session.commit()
             return count
 
@@ -0,0 +1,432 @@
+import hashlib
+import itertools
+import json
+import numpy as np
+from datetime import date
+from sqlalchemy import func, or_
+from sqlalchemy.orm import selectinload
+from app.extensions import db
+from app.models.remuneraciones import EscalaRemuneraciones, EscalaRemuneracionesDetalle, ConfigTipoHaberes
+from app.models.catalogos import CatEstamento
+from app.models.nombramientos import Nombramiento
+
+
+class SimulacionRemuneracionesService:
+    """
+    Motor vectorizado de la escala de remuneraciones.
+
+    - Las fórmulas de los haberes calculados se compilan una vez por texto y se
+      evalúan con arreglos NumPy como variables: una sola pasada calcula todos
+      los escenarios (grado x estamento x reajuste) a la vez.
+    - El periodo (escalas + detalles + catálogo de haberes) se carga con tres
+      consultas en vez de recalcular la matriz unificada por cada consulta.
+
+    Reglas iguales al motor de la matriz (obtener_matriz_unificada): los haberes
+    manuales se toman por grado, las fórmulas se aplican en el orden del
+    catálogo y cada resultado se redondea a entero; si una fórmula falla, el
+    haber vale 0. El reajuste afecta al sueldo base y a los manuales visibles en
+    la matriz, como aplicar_reajuste_diferenciado.
+    """
+
+    CODIGOS_HE = ('HE_25', 'HE_50')
+    MAX_ESCENARIOS = 20000
+
+    _compiladas = {}  # texto de fórmula -> código compilado (None si no compila)
+
+    # =======================================================
+    # FÓRMULAS COMPILADAS
+    # =======================================================
+
+    @staticmethod
+    def compilar(formula):
+        """Código compilado de una fórmula, memorizado por su texto."""
+        cache = SimulacionRemuneracionesService._compiladas
+        if formula not in cache:
+            try:
+                cache[formula] = compile(formula, '<formula>', 'eval')
+            except (SyntaxError, ValueError):
+                cache[formula] = None
+        return cache[formula]
+
+    @staticmethod
+    def _evaluar_escalar(codigo, variables, i):
+        """Evalúa la fila i con enteros de Python, igual que obtener_matriz_unificada."""
+        fila = {k: (v[i].item() if isinstance(v, np.ndarray) else v) for k, v in variables.items()}
+        try:
+            return int(round(eval(codigo, {"__builtins__": None}, fila)))
+        except Exception:
+            return 0
+
+    @staticmethod
+    def _evaluar_formula(codigo, variables, n):
+        """
+        Evalúa sobre arreglos; los errores y valores no finitos quedan en 0.
+        Las fórmulas escritas para escalares ('x if cond else y', and/or,
+        comparaciones encadenadas) fallan con arreglos de más de una fila: en
+        ese caso se evalúan fila a fila, para que el resultado no dependa del
+        tamaño del lote.
+        """
+        if codigo is None:
+            return np.zeros(n, dtype=np.int64)
+        try:
+            with np.errstate(all='ignore'):
+                resultado = np.asarray(eval(codigo, {"__builtins__": None}, variables), dtype=np.float64)
+            resultado = np.broadcast_to(resultado, (n,))
+            return np.where(np.isfinite(resultado), np.rint(resultado), 0).astype(np.int64)
+        except Exception:
+            evaluar = SimulacionRemuneracionesService._evaluar_escalar
+            return np.array([evaluar(codigo, variables, i) for i in range(n)], dtype=np.int64)
+
+    # =======================================================
+    # CARGA DEL PERIODO
+    # =======================================================
+
+    @staticmethod
+    def cargar_periodo(fecha_vigencia):
+        """
+        Datos de una escala vigente en tres consultas: catálogo de haberes (con sus
+        estamentos habilitados), cabeceras y detalles del periodo.
+        """
+        haberes = ConfigTipoHaberes.query.options(selectinload(ConfigTipoHaberes.estamentos_habilitados)) \
+            .order_by(ConfigTipoHaberes.id).all()
+        cabeceras = db.session.query(
+            EscalaRemuneraciones.id, EscalaRemuneraciones.estamento_id,
+            EscalaRemuneraciones.grado, EscalaRemuneraciones.sueldo_base
+        ).filter(EscalaRemuneraciones.fecha_vigencia == fecha_vigencia) \
+         .order_by(EscalaRemuneraciones.id).all()
+        detalles = db.session.query(
+            EscalaRemuneracionesDetalle.escala_id, EscalaRemuneracionesDetalle.haber_id,
+            EscalaRemuneracionesDetalle.monto
+        ).join(EscalaRemuneraciones, EscalaRemuneracionesDetalle.escala_id == EscalaRemuneraciones.id) \
+         .filter(EscalaRemuneraciones.fecha_vigencia == fecha_vigencia) \
+         .order_by(EscalaRemuneracionesDetalle.escala_id, EscalaRemuneracionesDetalle.id).all()
+
+        codigo_de = {h.id: h.codigo for h in haberes}
+        grado_de = {c.id: c.grado for c in cabeceras}
+        clave_de = {c.id: (c.estamento_id, c.grado) for c in cabeceras}
+
+        # Manuales por grado (se mezclan los estamentos, como en la matriz unificada)
+        # y montos guardados tal cual por (estamento, grado)
+        manuales, filas = {}, {}
+        for escala_id, haber_id, monto in detalles:
+            if monto and monto > 0 and haber_id in codigo_de:
+                manuales.setdefault(grado_de[escala_id], {})[codigo_de[haber_id]] = monto
+                filas.setdefault(clave_de[escala_id], {})[codigo_de[haber_id]] = monto
+
+        permitidos = {}
+        for h in haberes:
+            for est in h.estamentos_habilitados:
+                permitidos.setdefault(est.id, set()).add(h.codigo)
+
+        return {
+            'fecha': fecha_vigencia,
+            'haberes': haberes,
+            'base': {(c.estamento_id, c.grado): int(c.sueldo_base or 0) for c in cabeceras},
+            'manuales': manuales,
+            'filas': filas,
+            'permitidos': permitidos,
+            'estamentos': {e.id: e for e in CatEstamento.query.all()}
+        }
+
+    # =======================================================
+    # EVALUACIÓN VECTORIZADA
+    # =======================================================
+
+    @staticmethod
+    def _factor(factores, codigo, visible):
+        """Factor de un haber: por código si 'factores' es dict; si no, solo base y manuales visibles."""
+        if isinstance(factores, dict):
+            return factores.get(codigo)
+        return factores if visible else None
+
+    @staticmethod
+    def evaluar(periodo, grados, estamentos, factores):
+        """
+        Evalúa S escenarios a la vez. 'grados' y 'estamentos' son secuencias de
+        largo S; 'factores' (1 + %/100) es un arreglo[S] que se aplica al sueldo
+        base y a los manuales visibles, o un dict {codigo: arreglo[S]} por haber.
+        Retorna {codigo: arreglo[S]} con SUELDO_BASE y todos los haberes.
+        """
+        grados = np.asarray(grados, dtype=np.int64)
+        if not isinstance(factores, dict):
+            factores = np.asarray(factores, dtype=np.float64)
+        n = len(grados)
+        factor_de = SimulacionRemuneracionesService._factor
+
+        base = np.array([periodo['base'].get((e, g), 0) for e, g in zip(estamentos, grados.tolist())],
+                        dtype=np.float64)
+        factor = factor_de(factores, 'SUELDO_BASE', True)
+        variables = {'SUELDO_BASE': (np.trunc(base * factor) if factor is not None else base).astype(np.int64)}
+
+        manuales = periodo['manuales']
+        for h in periodo['haberes']:
+            if not h.es_manual or h.codigo == 'SUELDO_BASE':
+                continue
+            columna = np.array([manuales.get(g, {}).get(h.codigo, 0) for g in grados.tolist()], dtype=np.float64)
+            factor = factor_de(factores, h.codigo, h.es_visible_matriz)
+            if factor is not None:
+                columna = np.trunc(columna * factor)
+            variables[h.codigo] = columna.astype(np.int64)
+
+        for h in periodo['haberes']:
+            if not h.es_manual and h.formula:
+                codigo = SimulacionRemuneracionesService.compilar(h.formula)
+                variables[h.codigo] = SimulacionRemuneracionesService._evaluar_formula(codigo, variables, n)
+            elif not h.es_manual:
+                variables[h.codigo] = np.zeros(n, dtype=np.int64)
+
+        return variables
+
+    @staticmethod
+    def _completar_horas_extras(periodo, variables, estamentos):
+        """Valor hora por defecto (base/190 x 1,25 y 1,50) donde el estamento tiene HE y la escala no."""
+        base = variables['SUELDO_BASE']
+        permite = np.array([
+            any(c in periodo['permitidos'].get(e, ()) for c in SimulacionRemuneracionesService.CODIGOS_HE)
+            for e in estamentos
+        ], dtype=bool)
+        valor_hora = base / 190.0
+        for codigo, recargo in (('HE_25', 1.25), ('HE_50', 1.50)):
+            actual = variables.get(codigo, np.zeros(len(base), dtype=np.int64))
+            defecto = np.trunc(valor_hora * recargo).astype(np.int64)
+            variables[codigo] = np.where(permite & (base > 0) & (actual == 0), defecto, actual)
+
+    @staticmethod
+    def totales_fijos(periodo, variables, estamentos):
+        """
+        Haberes fijos (permanentes y habilitados para el estamento) como matriz
+        S x H y total mensual fijo (base + fijos) por escenario.
+        """
+        fijos = [h.codigo for h in periodo['haberes']
+                 if h.es_permanente and h.codigo != 'SUELDO_BASE'
+                 and h.codigo not in SimulacionRemuneracionesService.CODIGOS_HE]
+        if fijos:
+            montos = np.column_stack([variables[c] for c in fijos])
+            habilitado = np.array([[c in periodo['permitidos'].get(e, ()) for c in fijos] for e in estamentos],
+                                  dtype=bool)
+            montos = np.where(habilitado, montos, 0)
+        else:
+            montos = np.zeros((len(estamentos), 0), dtype=np.int64)
+        return fijos, montos, variables['SUELDO_BASE'] + montos.sum(axis=1)
+
+    # =======================================================
+    # SIMULACIÓN POR LOTE
+    # =======================================================
+
+    @staticmethod
+    def expandir_escenarios(data):
+        """
+        Escenarios explícitos ('escenarios': [{grado, estamento_id, reajuste, adicionales}])
+        o producto cruzado de 'grados' x 'estamentos' x 'reajustes' con
+        'adicionales' comunes. Un reajuste negativo se rechaza (ValueError), igual
+        que en normalizar_tramos.
+        """
+        if data.get('escenarios'):
+            escenarios = [{
+                'grado': int(e['grado']),
+                'estamento_id': int(e['estamento_id']),
+                'reajuste': float(e.get('reajuste') or 0),
+                'adicionales': e.get('adicionales') or {}
+            } for e in data['escenarios']]
+        else:
+            adicionales = data.get('adicionales') or {}
+            reajustes = data.get('reajustes') or [0]
+            escenarios = [{
+                'grado': int(g), 'estamento_id': int(e), 'reajuste': float(r), 'adicionales': adicionales
+            } for e, g, r in itertools.product(data.get('estamentos') or [], data.get('grados') or [], reajustes)]
+
+        if any(esc['reajuste'] < 0 for esc in escenarios):
+            raise ValueError("El porcentaje de reajuste no puede ser negativo.")
+        return escenarios
+
+    @staticmethod
+    def simular_lote(fecha_vigencia, escenarios):
+        """
+        Sueldo de cada escenario: base reajustada, haberes fijos permanentes
+        habilitados para el estamento y adicionales ({codigo: monto}; monto nulo
+        = valor calculado por la escala). Los escenarios con grado fuera del rango
+        del estamento se informan con 'error'.
+        """
+        if len(escenarios) > SimulacionRemuneracionesService.MAX_ESCENARIOS:
+            raise ValueError(f"Máximo {SimulacionRemuneracionesService.MAX_ESCENARIOS} escenarios por consulta.")
+
+        periodo = SimulacionRemuneracionesService.cargar_periodo(fecha_vigencia)
+        catalogo_est = periodo['estamentos']
+
+        validos, resultado = [], [None] * len(escenarios)
+        for i, esc in enumerate(escenarios):
+            est = catalogo_est.get(esc['estamento_id'])
+            if not est:
+                resultado[i] = {**esc, 'error': 'Estamento no encontrado'}
+            elif not (est.grado_min <= esc['grado'] <= est.grado_max):
+                resultado[i] = {**esc, 'error': f"El Grado {esc['grado']} no es válido para {est.estamento}."}
+            else:
+                validos.append(i)
+
+        if not validos:
+            return resultado
+
+        estamentos = [escenarios[i]['estamento_id'] for i in validos]
+        variables = SimulacionRemuneracionesService.evaluar(
+            periodo,
+            [escenarios[i]['grado'] for i in validos],
+            estamentos,
+            [1 + escenarios[i]['reajuste'] / 100.0 for i in validos]
+        )
+        SimulacionRemuneracionesService._completar_horas_extras(periodo, variables, estamentos)
+
+        fijos, montos, total_fijo = SimulacionRemuneracionesService.totales_fijos(periodo, variables, estamentos)
+
+        for k, i in enumerate(validos):
+            esc = escenarios[i]
+            adicionales = {
+                codigo: int(monto) if monto is not None else int(variables.get(codigo, [0] * len(validos))[k])
+                for codigo, monto in esc['adicionales'].items()
+            }
+            total_adicionales = sum(adicionales.values())
+            resultado[i] = {
+                **esc,
+                'sueldo_base': int(variables['SUELDO_BASE'][k]),
+                'haberes_fijos': {c: int(montos[k, j]) for j, c in enumerate(fijos) if montos[k, j]},
+                'adicionales': adicionales,
+                'valor_he_25': int(variables['HE_25'][k]),
+                'valor_he_50': int(variables['HE_50'][k]),
+                'total_fijo': int(total_fijo[k]),
+                'total': int(total_fijo[k]) + total_adicionales
+            }
+        return resultado
+
+    # =======================================================
+    # REAJUSTE EN MEMORIA (PREVISUALIZACIÓN)
+    # =======================================================
+
+    @staticmethod
+    def normalizar_tramos(tramos):
+        """
+        Tramos [{porcentaje, grado_min, grado_max, haberes}] validados. 'haberes'
+        es una lista de códigos; si se omite, el tramo reajusta el sueldo base y
+        los manuales visibles en la matriz.
+        """
+        resultado = []
+        for t in tramos or []:
+            porcentaje = float(t.get('porcentaje') or 0)
+            if porcentaje < 0:
+                raise ValueError("El porcentaje de reajuste no puede ser negativo.")
+            grado_min = int(t.get('grado_min') or 1)
+            grado_max = int(t.get('grado_max') or 99)
+            if grado_min > grado_max:
+                raise ValueError(f"Rango de grados inválido: {grado_min} a {grado_max}.")
+            resultado.append({
+                'porcentaje': porcentaje,
+                'grado_min': grado_min,
+                'grado_max': grado_max,
+                'haberes': sorted(set(t['haberes'])) if t.get('haberes') else None
+            })
+        if not resultado:
+            raise ValueError("Debe indicar al menos un tramo de reajuste.")
+        return resultado
+
+    @staticmethod
+    def factores_reajuste(periodo, grados, tramos):
+        """
+        {codigo: arreglo[S]} con el factor de cada haber manual (y el sueldo base)
+        por grado. Si varios tramos alcanzan al mismo grado y haber, se componen.
+        Los haberes calculados no se reajustan: se recalculan con sus fórmulas.
+        """
+        grados = np.asarray(grados, dtype=np.int64)
+        manuales = {h.codigo for h in periodo['haberes'] if h.es_manual} | {'SUELDO_BASE'}
+        por_defecto = ['SUELDO_BASE'] + [h.codigo for h in periodo['haberes']
+                                         if h.es_manual and h.es_visible_matriz and h.codigo != 'SUELDO_BASE']
+        factores = {}
+        for t in tramos:
+            en_rango = (grados >= t['grado_min']) & (grados <= t['grado_max'])
+            factor = np.where(en_rango, 1 + t['porcentaje'] / 100.0, 1.0)
+            for codigo in (t['haberes'] or por_defecto):
+                if codigo in manuales:
+                    factores[codigo] = factores.get(codigo, 1.0) * factor
+        return factores
+
+    @staticmethod
+    def firma(periodo, tramos):
+        """Huella de (escala, tramos): la confirmación exige que la escala no haya cambiado."""
+        contenido = json.dumps([
+            str(periodo['fecha']),
+            tramos,
+            sorted([e, g, b] for (e, g), b in periodo['base'].items()),
+            sorted([g, sorted(m.items())] for g, m in periodo['manuales'].items())
+        ], default=str)
+        return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _dotacion_por_grado(fecha):
+        """{(estamento_id, grado): n} de los nombramientos vigentes a 'fecha'."""
+        filas = db.session.query(Nombramiento.estamento_id, Nombramiento.grado, func.count(Nombramiento.id)) \
+            .filter(
+                Nombramiento.estado == 'VIGENTE',
+                Nombramiento.fecha_inicio <= fecha,
+                or_(Nombramiento.fecha_fin.is_(None), Nombramiento.fecha_fin >= fecha)
+            ).group_by(Nombramiento.estamento_id, Nombramiento.grado).all()
+        return {(e, g): n for e, g, n in filas}
+
+    @staticmethod
+    def previsualizar_reajuste(fecha_vigencia, tramos):
+        """
+        Aplica los tramos en memoria sobre la escala de 'fecha_vigencia', recalcula
+        los haberes con fórmula y compara contra la escala actual. No escribe en
+        la BD. Retorna el diff por (estamento, grado), el costo mensual sobre los
+        nombramientos vigentes hoy y la 'firma' que exige la confirmación.
+        """
+        tramos = SimulacionRemuneracionesService.normalizar_tramos(tramos)
+        periodo = SimulacionRemuneracionesService.cargar_periodo(fecha_vigencia)
+        if not periodo['base']:
+            raise ValueError("No hay escala registrada para la fecha seleccionada.")
+
+        claves = sorted(periodo['base'])
+        estamentos = [e for e, _ in claves]
+        grados = [g for _, g in claves]
+
+        antes = SimulacionRemuneracionesService.evaluar(periodo, grados, estamentos, {})
+        despues = SimulacionRemuneracionesService.evaluar(
+            periodo, grados, estamentos,
+            SimulacionRemuneracionesService.factores_reajuste(periodo, grados, tramos)
+        )
+        for variables in (antes, despues):
+            SimulacionRemuneracionesService._completar_horas_extras(periodo, variables, estamentos)
+        _, _, total_antes = SimulacionRemuneracionesService.totales_fijos(periodo, antes, estamentos)
+        _, _, total_despues = SimulacionRemuneracionesService.totales_fijos(periodo, despues, estamentos)
+
+        dotacion_grado = SimulacionRemuneracionesService._dotacion_por_grado(date.today())
+        dotacion = np.array([dotacion_grado.get(k, 0) for k in claves], dtype=np.int64)
+        delta = total_despues - total_antes
+
+        codigos = list(antes)
+        filas = []
+        for i, (estamento_id, grado) in enumerate(claves):
+            est = periodo['estamentos'].get(estamento_id)
+            filas.append({
+                'estamento_id': estamento_id,
+                'estamento': est.estamento if est else None,
+                'grado': grado,
+                'dotacion': int(dotacion[i]),
+                'cambios': {
+                    c: {'antes': int(antes[c][i]), 'despues': int(despues[c][i])}
+                    for c in codigos if antes[c][i] != despues[c][i]
+                },
+                'total_antes': int(total_antes[i]),
+                'total_despues': int(total_despues[i]),
+                'delta': int(delta[i]),
+                'delta_dotacion': int(delta[i] * dotacion[i])
+            })
+
+        costo_antes = int((total_antes * dotacion).sum())
+        costo_despues = int((total_despues * dotacion).sum())
+        return {
+            'fecha': str(fecha_vigencia),
+            'tramos': tramos,
+            'filas': filas,
+            'costo_mensual_antes': costo_antes,
+            'costo_mensual_despues': costo_despues,
+            'delta_mensual': costo_despues - costo_antes,
+            'delta_anual': (costo_despues - costo_antes) * 12,
+            'firma': SimulacionRemuneracionesService.firma(periodo, tramos)
+        }
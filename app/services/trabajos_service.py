@@ -0,0 +1,343 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app.extensions import db
+from app.models.trabajos import TrabajoSegundoPlano
+
+
+class TrabajosService:
+    """
+    Ejecutor de procesos largos fuera del request (cargas masivas, clonado de
+    periodos, decretos), con un pool de hilos dentro del mismo proceso.
+
+    - La tabla 'sys_trabajos' hace de cola persistida: estado, avance y resultado.
+    - Cada worker "reclama" su trabajo con un UPDATE condicional
+      (PENDIENTE -> EN_PROCESO), así un trabajo nunca se ejecuta dos veces.
+    - El avance se escribe en una conexión aparte para no confirmar a medias
+      la transacción del proceso que se está ejecutando.
+    - Mientras corre, cada trabajo registra su dueño ('host:pid') y un latido
+      periódico; al iniciar otro proceso solo se dan por muertos los trabajos
+      cuyo dueño ya no existe o cuyo latido está vencido.
+    """
+
+    _executor = None
+    _lock = threading.Lock()
+
+    # Intervalo mínimo (segundos) entre escrituras de avance en la BD
+    INTERVALO_PROGRESO = 0.5
+
+    # Latido de los trabajos EN_PROCESO (segundos) y antigüedad para darlos por muertos
+    INTERVALO_LATIDO = 15
+    LATIDO_VENCIDO = 90
+
+    # =======================================================
+    # POOL DE WORKERS
+    # =======================================================
+
+    @staticmethod
+    def _pool():
+        with TrabajosService._lock:
+            if TrabajosService._executor is None:
+                workers = int(current_app.config.get('JOBS_MAX_WORKERS', 2))
+                TrabajosService._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='trabajo'
+                )
+            return TrabajosService._executor
+
+    # =======================================================
+    # ENCOLAR / CONSULTAR
+    # =======================================================
+
+    @staticmethod
+    def encolar(tipo, parametros=None):
+        """Registra el trabajo como PENDIENTE y lo entrega al pool. Retorna el trabajo."""
+        if tipo not in TrabajosService.TAREAS:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+
+        trabajo = TrabajoSegundoPlano(
+            tipo=tipo,
+            estado='PENDIENTE',
+            parametros_json=json.dumps(parametros or {}, default=str)
+        )
+        try:
+            db.session.add(trabajo)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+        app = current_app._get_current_object()
+        TrabajosService._pool().submit(TrabajosService._ejecutar, app, trabajo.id)
+        return trabajo
+
+    @staticmethod
+    def obtener(trabajo_id):
+        return TrabajoSegundoPlano.query.get(trabajo_id)
+
+    @staticmethod
+    def guardar_archivo_subido(archivo):
+        """
+        Copia el archivo subido a disco para que el worker pueda leerlo después de
+        que termine el request. Retorna la ruta. Va en la carpeta 'instance' (no
+        publicada como static) porque trae datos personales; se borra al terminar
+        el trabajo (ver _borrar_subida).
+        """
+        carpeta = os.path.join(current_app.instance_path, 'trabajos')
+        os.makedirs(carpeta, exist_ok=True)
+
+        nombre = f"{uuid.uuid4().hex}_{secure_filename(archivo.filename or 'archivo')}"
+        ruta = os.path.join(carpeta, nombre)
+        archivo.save(ruta)
+        return ruta
+
+    @staticmethod
+    def _borrar_subida(parametros):
+        """Elimina el archivo subido del trabajo, si quedó en disco."""
+        ruta = (parametros or {}).get('ruta_archivo')
+        try:
+            if ruta and os.path.exists(ruta):
+                os.remove(ruta)
+        except OSError as e:
+            print(f"Advertencia: no se pudo eliminar {ruta}: {e}")
+
+    @staticmethod
+    def _worker_actual():
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def _worker_muerto(worker):
+        """True si el dueño corría en este host y su proceso ya no existe."""
+        host, _, pid = (worker or '').rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+            return False
+        except ProcessLookupError:
+            return True
+        except OSError:
+            return False  # Existe, pero es de otro usuario
+
+    @staticmethod
+    def recuperar_interrumpidos():
+        """
+        Al iniciar la aplicación: se marcan FALLIDO los trabajos EN_PROCESO cuyo
+        dueño murió (proceso inexistente en este host) o cuyo latido lleva más de
+        LATIDO_VENCIDO segundos sin renovarse. Los que siguen vivos en otro worker
+        no se tocan. Los PENDIENTE se vuelven a encolar (el reclamo condicional
+        evita ejecutarlos dos veces). Los archivos subidos de los interrumpidos se
+        eliminan.
+        """
+        try:
+            limite = datetime.now() - timedelta(seconds=TrabajosService.LATIDO_VENCIDO)
+            en_proceso = TrabajoSegundoPlano.query.filter_by(estado='EN_PROCESO').all()
+            muertos = [
+                t for t in en_proceso
+                if TrabajosService._worker_muerto(t.worker)
+                or (t.fecha_latido or t.fecha_inicio or t.fecha_creacion) < limite
+            ]
+            if muertos:
+                # El filtro por estado evita pisar un trabajo que terminó entretanto
+                TrabajoSegundoPlano.query.filter(
+                    TrabajoSegundoPlano.id.in_([t.id for t in muertos]),
+                    TrabajoSegundoPlano.estado == 'EN_PROCESO'
+                ).update({
+                    'estado': 'FALLIDO',
+                    'mensaje_error': 'Interrumpido: el proceso que lo ejecutaba dejó de responder.',
+                    'fecha_fin': datetime.now()
+                }, synchronize_session=False)
+                db.session.commit()
+                for t in muertos:
+                    TrabajosService._borrar_subida(t.parametros)
+
+            pendientes = [t.id for t in TrabajoSegundoPlano.query.filter_by(estado='PENDIENTE').all()]
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recuperando trabajos: {e}")
+            return 0
+
+        app = current_app._get_current_object()
+        for trabajo_id in pendientes:
+            TrabajosService._pool().submit(TrabajosService._ejecutar, app, trabajo_id)
+        return len(pendientes)
+
+    # =======================================================
+    # EJECUCIÓN (DENTRO DEL WORKER)
+    # =======================================================
+
+    @staticmethod
+    def _reclamar(trabajo_id):
+        """UPDATE condicional: solo un worker logra pasar el trabajo a EN_PROCESO."""
+        ahora = datetime.now()
+        filas = TrabajoSegundoPlano.query.filter_by(id=trabajo_id, estado='PENDIENTE').update({
+            'estado': 'EN_PROCESO',
+            'fecha_inicio': ahora,
+            'worker': TrabajosService._worker_actual(),
+            'fecha_latido': ahora
+        }, synchronize_session=False)
+        db.session.commit()
+        return filas == 1
+
+    @staticmethod
+    def _crear_reporte_progreso(trabajo_id):
+        """
+        Retorna la función progreso(actual, total) que reciben los procesos.
+        Escribe en una conexión independiente y como máximo cada INTERVALO_PROGRESO.
+        """
+        tabla = TrabajoSegundoPlano.__table__
+        ultimo = {'t': 0.0}
+
+        def progreso(actual, total=None):
+            ahora = time.monotonic()
+            final = total is not None and actual >= total
+            if not final and ahora - ultimo['t'] < TrabajosService.INTERVALO_PROGRESO:
+                return
+            ultimo['t'] = ahora
+
+            valores = {'progreso_actual': actual}
+            if total is not None:
+                valores['progreso_total'] = total
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(tabla.update().where(tabla.c.id == trabajo_id).values(**valores))
+            except Exception as e:
+                print(f"Error registrando avance del trabajo {trabajo_id}: {e}")
+
+        return progreso
+
+    @staticmethod
+    def _latir(app, trabajo_id, detener):
+        """Hilo auxiliar: renueva fecha_latido cada INTERVALO_LATIDO hasta que termine el trabajo."""
+        tabla = TrabajoSegundoPlano.__table__
+        with app.app_context():
+            while not detener.wait(TrabajosService.INTERVALO_LATIDO):
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(tabla.update()
+                                     .where(tabla.c.id == trabajo_id, tabla.c.estado == 'EN_PROCESO')
+                                     .values(fecha_latido=datetime.now()))
+                except Exception as e:
+                    print(f"Error registrando latido del trabajo {trabajo_id}: {e}")
+
+    @staticmethod
+    def _ejecutar(app, trabajo_id):
+        with app.app_context():
+            parametros = {}
+            detener = threading.Event()
+            try:
+                if not TrabajosService._reclamar(trabajo_id):
+                    return
+                threading.Thread(
+                    target=TrabajosService._latir, args=(app, trabajo_id, detener),
+                    name=f'latido-{trabajo_id}', daemon=True
+                ).start()
+
+                trabajo = TrabajoSegundoPlano.query.get(trabajo_id)
+                parametros = trabajo.parametros
+                tarea = getattr(TrabajosService, TrabajosService.TAREAS[trabajo.tipo])
+                progreso = TrabajosService._crear_reporte_progreso(trabajo_id)
+
+                resultado = tarea(parametros, progreso) or {}
+                archivo = resultado.pop('archivo', None)
+
+                db.session.expire_all()  # El avance se escribió por otra conexión
+                trabajo = TrabajoSegundoPlano.query.get(trabajo_id)
+                trabajo.estado = 'COMPLETADO'
+                trabajo.resultado_json = json.dumps(resultado, default=str)
+                trabajo.archivo_resultado = archivo
+                trabajo.progreso_actual = trabajo.progreso_total or trabajo.progreso_actual
+                trabajo.fecha_fin = datetime.now()
+                db.session.commit()
+
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error en trabajo {trabajo_id}: {e}")
+                try:
+                    TrabajoSegundoPlano.query.filter_by(id=trabajo_id).update({
+                        'estado': 'FALLIDO',
+                        'mensaje_error': str(e),
+                        'fecha_fin': datetime.now()
+                    }, synchronize_session=False)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+            finally:
+                detener.set()
+                db.session.remove()
+                # El archivo subido ya no se necesita (éxito o fallo)
+                TrabajosService._borrar_subida(parametros)
+
+    # =======================================================
+    # TAREAS REGISTRADAS
+    # =======================================================
+    # Cada tarea recibe (parametros, progreso) y retorna un dict serializable.
+    # Si el dict trae 'archivo', se guarda como artefacto descargable.
+
+    TAREAS = {
+        'CARGA_PERSONAS': '_tarea_carga_personas',
+        'CARGA_VIATICOS': '_tarea_carga_viaticos',
+        'CARGA_CONTRATOS': '_tarea_carga_contratos',
+        'CLONAR_PERIODO': '_tarea_clonar_periodo',
+        'DECRETO_PAGO_HE': '_tarea_decreto_pago_he',
+    }
+
+    @staticmethod
+    def _tarea_carga_personas(parametros, progreso):
+        from app.services.persona_service import PersonaService
+
+        procesados, n_errores, errores = PersonaService.procesar_carga_masiva(
+            parametros['ruta_archivo'], progreso=progreso
+        )
+        return {'procesados': procesados, 'n_errores': n_errores, 'errores': errores[:200]}
+
+    @staticmethod
+    def _tarea_carga_viaticos(parametros, progreso):
+        from app.services.viaticos_service import ViaticosService
+
+        exitos, errores = ViaticosService.procesar_carga_masiva(
+            parametros['ruta_archivo'], parametros['admin_id'], parametros['secretario_id'],
+            progreso=progreso
+        )
+        return {'exitos': exitos, 'n_errores': len(errores), 'errores': errores[:200]}
+
+    @staticmethod
+    def _tarea_carga_contratos(parametros, progreso):
+        from app.services.contratos_service import ContratosService
+
+        return ContratosService.procesar_carga_masiva(parametros['ruta_archivo'], progreso=progreso)
+
+    @staticmethod
+    def _tarea_clonar_periodo(parametros, progreso):
+        from app.services.remuneraciones_service import RemuneracionesService
+
+        progreso(0, 1)
+        cnt = RemuneracionesService.clonar_periodo(
+            parametros['fecha_origen'], parametros['fecha_destino'],
+            float(parametros.get('porcentaje', 0)),
+            int(parametros.get('grado_min', 1)), int(parametros.get('grado_max', 30))
+        )
+        progreso(1, 1)
+        return {'registros': cnt, 'fecha_destino': parametros['fecha_destino']}
+
+    @staticmethod
+    def _tarea_decreto_pago_he(parametros, progreso):
+        from app.services.horas_extras_service import HorasExtrasService
+
+        progreso(0, 1)
+        decreto, ruta = HorasExtrasService.generar_decreto_pago(
+            int(parametros['anio']), int(parametros['mes']),
+            parametros.get('numero_decreto'),
+            datetime.strptime(parametros['fecha_decreto'], '%Y-%m-%d').date(),
+            parametros['id_alcalde'], parametros['id_secretario']
+        )
+        progreso(1, 1)
+        return {'decreto_id': decreto.id, 'archivo': ruta}
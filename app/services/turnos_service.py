@@ -1,6 +1,7 @@
 from app.extensions import db
 from app.models.turnos import HeJornadaBase, HeJornadaDetalle, HeCalendarioEspecial
-from app.models.nombramientos import Nombramiento
+from app.services.nombramientos_service import NombramientosService
+from app.services.organigrama_service import OrganigramaService
 from datetime import datetime
 
 class TurnosService:
@@ -27,11 +28,17 @@ class TurnosService:
         ).first()
 
         if not jornada:
-            nombramiento = Nombramiento.query.filter_by(persona_id=rut_funcionario, estado='VIGENTE').first()
+            nombramiento = NombramientosService.nombramiento_vigente(rut_funcionario, fecha_consulta)
             if nombramiento and nombramiento.unidad_id:
-                jornada = HeJornadaBase.query.filter_by(
-                    tipo_ambito='ESTAMENTO', valor_ambito=str(nombramiento.unidad_id), es_vigente=True
-                ).first()
+                # Jornada de la unidad o, si no tiene, la de su dependencia más cercana
+                ancestros = [str(i) for i in OrganigramaService.ancestros_ids(nombramiento.unidad_id)] \
+                    or [str(nombramiento.unidad_id)]
+                por_unidad = {j.valor_ambito: j for j in HeJornadaBase.query.filter(
+                    HeJornadaBase.tipo_ambito == 'ESTAMENTO',
+                    HeJornadaBase.valor_ambito.in_(ancestros),
+                    HeJornadaBase.es_vigente == True
+                ).all()}
+                jornada = next((por_unidad[i] for i in ancestros if i in por_unidad), None)
 
         if not jornada:
             jornada = HeJornadaBase.query.filter_by(tipo_ambito='GENERAL', es_vigente=True).first()
@@ -3,7 +3,7 @@ from app.models.viaticos import EscalaViaticos, ViaticoDecreto
 from datetime import datetime, timedelta
 from sqlalchemy import or_, and_
 # Imports para Documentos (Word/PDF)
-from docxtpl import DocxTemplate
+from app.services.cache_documentos_service import CacheDocumentosService
 from flask import current_app
 import os
 from werkzeug.utils import secure_filename
@@ -11,8 +11,9 @@ from werkzeug.utils import secure_filename
 # Imports para Carga Masiva
 import csv
 import io
+from app.services.lector_archivos_service import LectorTabular
 from app.models.personas import Persona
-from app.models.nombramientos import Nombramiento
+from app.services.nombramientos_service import NombramientosService
 
 class ViaticosService:
 
@@ -299,13 +300,9 @@ class ViaticosService:
             'firma_secretario_cargo': decreto.secretario.firma_linea_4 or decreto.secretario.cargo,
         }
 
-        doc = DocxTemplate(plantilla_path)
-        doc.render(context)
-        
         filename = f"Decreto_Viatico_{decreto.id}.docx"
         output_dir = os.path.join(root_path, 'static', 'downloads')
-        os.makedirs(output_dir, exist_ok=True)
-        doc.save(os.path.join(output_dir, filename))
+        CacheDocumentosService.renderizar(plantilla_path, context, os.path.join(output_dir, filename))
         
         if decreto.estado == 'BORRADOR':
             decreto.estado = 'PENDIENTE_FIRMA'
@@ -357,109 +354,125 @@ class ViaticosService:
         ])
         return output.getvalue()
 
+    # Columnas tipadas de la planilla (el resto se lee como texto)
+    ESQUEMA_CARGA_MASIVA = {
+        'RUT_FUNCIONARIO': ('texto', False),
+        'FECHA_SALIDA (DD-MM-YYYY)': ('fecha', True),
+        'HORA_SALIDA (HH:MM)': ('hora', True),
+        'FECHA_REGRESO (DD-MM-YYYY)': ('fecha', True),
+        'HORA_REGRESO (HH:MM)': ('hora', True),
+    }
+
     @staticmethod
-    def procesar_carga_masiva(archivo, admin_id, secretario_id):
+    def _filas_carga_masiva(lector, errores, progreso=None):
+        """Recorre los lotes del lector acumulando errores de formato y reportando avance."""
+        leidas = 0
+        for lote, errores_lote in lector.lotes():
+            errores.extend(errores_lote)
+            for row in lote:
+                yield row
+            leidas += len(lote) + len(errores_lote)
+            if progreso: progreso(leidas, lector.total_estimado)
+
+    @staticmethod
+    def procesar_carga_masiva(archivo, admin_id, secretario_id, progreso=None):
         """
-        Procesa el CSV de carga masiva, busca datos y calcula montos automáticamente.
+        Procesa el CSV (o XLSX) de carga masiva, busca datos y calcula montos automáticamente.
+        El archivo se lee en streaming por lotes, sin cargarlo completo en memoria.
+        'progreso' (opcional): función (actual, total) para informar el avance.
         Retorna (exitos, errores).
         """
-        stream = io.StringIO(archivo.stream.read().decode("UTF-8"), newline=None)
-        csv_input = csv.DictReader(stream, delimiter=';')
-        
         exitos = 0
         errores = []
-        fila_num = 1 
-
-        for row in csv_input:
-            fila_num += 1
-            try:
-                # 1. Limpieza y Búsqueda de Persona
-                rut_raw = row.get('RUT_FUNCIONARIO', '').strip()
-                if not rut_raw: continue
+
+        with LectorTabular(archivo, esquema=ViaticosService.ESQUEMA_CARGA_MASIVA) as lector:
+            for row in ViaticosService._filas_carga_masiva(lector, errores, progreso):
+                fila_num = row['_fila']
+                try:
+                    # 1. Limpieza y Búsqueda de Persona
+                    rut_raw = row.get('RUT_FUNCIONARIO') or ''
+                    if not rut_raw: continue
                 
-                rut_limpio = rut_raw.upper().replace('.', '').replace('-', '')
-                persona = Persona.query.filter_by(rut=rut_raw).first() or Persona.query.get(rut_raw) or Persona.query.filter_by(rut=rut_limpio).first()
+                    rut_limpio = rut_raw.upper().replace('.', '').replace('-', '')
+                    persona = Persona.query.filter_by(rut=rut_raw).first() or Persona.query.get(rut_raw) or Persona.query.filter_by(rut=rut_limpio).first()
                 
-                if not persona:
-                    errores.append(f"Fila {fila_num}: RUT {rut_raw} no encontrado.")
-                    continue
-
-                # 2. Búsqueda de Nombramiento Vigente
-                nombramiento = Nombramiento.query.filter_by(persona_id=persona.rut, estado='VIGENTE').order_by(Nombramiento.fecha_inicio.desc()).first()
-                if not nombramiento:
-                    errores.append(f"Fila {fila_num}: {persona.nombres} sin nombramiento vigente.")
-                    continue
+                    if not persona:
+                        errores.append(f"Fila {fila_num}: RUT {rut_raw} no encontrado.")
+                        continue
+
+                    # 2. Búsqueda de Nombramiento Vigente a la fecha del cometido
+                    nombramiento = NombramientosService.nombramiento_vigente(persona.rut, row['FECHA_SALIDA (DD-MM-YYYY)'])
+                    if not nombramiento:
+                        errores.append(f"Fila {fila_num}: {persona.nombres} sin nombramiento vigente.")
+                        continue
                 
-                # Mapeo Estamento
-                estamento_bd = nombramiento.estamento.estamento.upper()
-                mapa_estamentos = {
-                    'ALCALDES': 'ALCALDE', 'DIRECTIVOS': 'DIRECTIVO', 'PROFESIONALES': 'PROFESIONAL',
-                    'JEFATURAS': 'JEFATURA', 'TECNICOS': 'TECNICO', 'TÉCNICOS': 'TECNICO', 
-                    'ADMINISTRATIVOS': 'ADMINISTRATIVO', 'AUXILIARES': 'AUXILIAR'
-                }
-                estamento_val = mapa_estamentos.get(estamento_bd, estamento_bd.rstrip('S'))
-
-                # 3. Fechas
-                try:
-                    f_salida = datetime.strptime(row['FECHA_SALIDA (DD-MM-YYYY)'], '%d-%m-%Y').date()
-                    h_salida = datetime.strptime(row['HORA_SALIDA (HH:MM)'], '%H:%M').time()
-                    f_regreso = datetime.strptime(row['FECHA_REGRESO (DD-MM-YYYY)'], '%d-%m-%Y').date()
-                    h_regreso = datetime.strptime(row['HORA_REGRESO (HH:MM)'], '%H:%M').time()
-                except ValueError:
-                    errores.append(f"Fila {fila_num}: Formato fecha/hora inválido.")
-                    continue
-
-                # 4. Cálculo Días Automático
-                dias_100 = 0.0
-                dias_40 = 0.0
-                delta_dias = (f_regreso - f_salida).days
-                if delta_dias == 0:
-                    dias_40 = 1.0 
-                else:
-                    dias_100 = float(delta_dias)
-                    dias_40 = 1.0
-
-                # 5. Escala
-                escala = ViaticosService.obtener_escala_para_grado(nombramiento.grado, f_salida)
-                if not escala:
-                    errores.append(f"Fila {fila_num}: Sin escala para Grado {nombramiento.grado}.")
-                    continue
-
-                # 6. Transporte
-                usa_vehiculo = row.get('USA_VEHICULO (SI/NO)', 'NO').upper() == 'SI'
-                tipo_vehiculo = row.get('TIPO_VEHICULO', 'LOCOMOCION_PUBLICA').upper()
-                patente = row.get('PATENTE', '').upper() if usa_vehiculo else None
-
-                # 7. Crear Decreto
-                nuevo = ViaticoDecreto(
-                    estado='BORRADOR',
-                    rut_funcionario=persona.rut,
-                    estamento_al_viajar=estamento_val,
-                    grado_al_viajar=nombramiento.grado,
-                    motivo_viaje=row.get('MOTIVO', 'Sin motivo'),
-                    lugar_destino=row.get('DESTINO', 'Sin destino'),
-                    fecha_salida=f_salida, hora_salida=h_salida,
-                    fecha_regreso=f_regreso, hora_regreso=h_regreso,
-                    usa_vehiculo=usa_vehiculo,
-                    tipo_vehiculo=tipo_vehiculo,
-                    placa_patente=patente,
-                    dias_al_100=dias_100,
-                    dias_al_40=dias_40,
-                    dias_al_20=0.0,
-                    admin_municipal_id=int(admin_id),
-                    secretario_municipal_id=int(secretario_id)
-                )
+                    # Mapeo Estamento
+                    estamento_bd = nombramiento.estamento.estamento.upper()
+                    mapa_estamentos = {
+                        'ALCALDES': 'ALCALDE', 'DIRECTIVOS': 'DIRECTIVO', 'PROFESIONALES': 'PROFESIONAL',
+                        'JEFATURAS': 'JEFATURA', 'TECNICOS': 'TECNICO', 'TÉCNICOS': 'TECNICO', 
+                        'ADMINISTRATIVOS': 'ADMINISTRATIVO', 'AUXILIARES': 'AUXILIAR'
+                    }
+                    estamento_val = mapa_estamentos.get(estamento_bd, estamento_bd.rstrip('S'))
+
+                    # 3. Fechas (ya validadas y tipadas por el lector)
+                    f_salida = row['FECHA_SALIDA (DD-MM-YYYY)']
+                    h_salida = row['HORA_SALIDA (HH:MM)']
+                    f_regreso = row['FECHA_REGRESO (DD-MM-YYYY)']
+                    h_regreso = row['HORA_REGRESO (HH:MM)']
+
+                    # 4. Cálculo Días Automático
+                    dias_100 = 0.0
+                    dias_40 = 0.0
+                    delta_dias = (f_regreso - f_salida).days
+                    if delta_dias == 0:
+                        dias_40 = 1.0 
+                    else:
+                        dias_100 = float(delta_dias)
+                        dias_40 = 1.0
+
+                    # 5. Escala
+                    escala = ViaticosService.obtener_escala_para_grado(nombramiento.grado, f_salida)
+                    if not escala:
+                        errores.append(f"Fila {fila_num}: Sin escala para Grado {nombramiento.grado}.")
+                        continue
+
+                    # 6. Transporte
+                    usa_vehiculo = str(row.get('USA_VEHICULO (SI/NO)') or 'NO').strip().upper() == 'SI'
+                    tipo_vehiculo = str(row.get('TIPO_VEHICULO') or 'LOCOMOCION_PUBLICA').strip().upper()
+                    patente = str(row.get('PATENTE') or '').upper() if usa_vehiculo else None
+
+                    # 7. Crear Decreto
+                    nuevo = ViaticoDecreto(
+                        estado='BORRADOR',
+                        rut_funcionario=persona.rut,
+                        estamento_al_viajar=estamento_val,
+                        grado_al_viajar=nombramiento.grado,
+                        motivo_viaje=row.get('MOTIVO', 'Sin motivo'),
+                        lugar_destino=row.get('DESTINO', 'Sin destino'),
+                        fecha_salida=f_salida, hora_salida=h_salida,
+                        fecha_regreso=f_regreso, hora_regreso=h_regreso,
+                        usa_vehiculo=usa_vehiculo,
+                        tipo_vehiculo=tipo_vehiculo,
+                        placa_patente=patente,
+                        dias_al_100=dias_100,
+                        dias_al_40=dias_40,
+                        dias_al_20=0.0,
+                        admin_municipal_id=int(admin_id),
+                        secretario_municipal_id=int(secretario_id)
+                    )
                 
-                nuevo.calcular_monto_total(escala)
-                db.session.add(nuevo)
-                exitos += 1
+                    nuevo.calcular_monto_total(escala)
+                    db.session.add(nuevo)
+                    exitos += 1
 
-            except Exception as e:
-                errores.append(f"Fila {fila_num}: Error inesperado - {str(e)}")
+                except Exception as e:
+                    errores.append(f"Fila {fila_num}: Error inesperado - {str(e)}")
 
         if exitos > 0:
             db.session.commit()
         else:
             db.session.rollback()
-            
+
+        if progreso: progreso(exitos + len(errores), exitos + len(errores))
         return exitos, errores
\ No newline at end of file
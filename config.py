@@ -14,6 +14,16 @@ class Config:
         f"{os.environ.get('DB_HOST')}/"
         f"{os.environ.get('DB_NAME')}"
     )
+    # Caché de documentos Word generados (LRU en disco, tamaño máximo en MB).
+    # Por defecto en instance/cache_docs, fuera de los archivos estáticos servidos
+    DOC_CACHE_DIR = os.environ.get('DOC_CACHE_DIR')
+    DOC_CACHE_MAX_MB = int(os.environ.get('DOC_CACHE_MAX_MB', 200))
+    # Trabajos en segundo plano (hilos del pool de ejecución)
+    JOBS_MAX_WORKERS = int(os.environ.get('JOBS_MAX_WORKERS', 2))
+    # Vigencia (segundos) de los KPIs del dashboard en memoria
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+    # Cada cuántos segundos el buscador de personas compara su índice con la BD
+    BUSQUEDA_VERIFICAR_SEGUNDOS = int(os.environ.get('BUSQUEDA_VERIFICAR_SEGUNDOS', 5))
 
 class DevelopmentConfig(Config):
     DEBUG = True